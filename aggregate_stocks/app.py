@@ -0,0 +1,271 @@
+import os
+import time
+import boto3
+from decimal import Decimal, InvalidOperation
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from stock_common.dynamo import get_table, is_condition_conflict, transact_write
+from stock_common.metrics import metered
+from stock_common.profiling import profiled
+
+AGGREGATES_TABLE = os.environ.get('AGGREGATES_TABLE_NAME', 'stock-aggregates-table')
+
+# Stock attributes that define an aggregate group
+GROUP_FIELDS = ['sector', 'exchange']
+
+MAX_CONFLICT_RETRIES = 5
+
+# Member writes per transaction (TransactWriteItems takes 100 actions), leaving
+# one for the aggregate item's update
+MAX_TRANSACTION_MEMBERS = 99
+
+# Aggregate attributes kept up to date with ADD
+AGGREGATE_COUNTERS = ('count', 'sum_volume', 'sum_change', 'change_count')
+
+deserializer = TypeDeserializer()
+
+
+# Maintain sector/exchange aggregates from the stocks table's change stream
+@profiled
+@metered
+def lambda_handler(event, context):
+
+    # ================== Sample Input ================== #
+    # event = {
+    #     "Records": [{
+    #         "eventName": "MODIFY",
+    #         "dynamodb": {
+    #             "Keys": {"ticker": {"S": "AAPL"}},
+    #             "OldImage": {"ticker": {"S": "AAPL"}, "sector": {"S": "Technology"}, ...},
+    #             "NewImage": {"ticker": {"S": "AAPL"}, "sector": {"S": "Technology"}, ...}
+    #         }
+    #     }]
+    # }
+    # ================================================== #
+
+    changes = collect_member_changes(event.get('Records', []))
+
+    table = get_table(boto3.resource, AGGREGATES_TABLE)
+    for (group_type, group_name), members in changes.items():
+        apply_to_aggregate(table, group_type, group_name, members)
+
+    return {'groups_updated': len(changes)}
+
+
+# Turn a DynamoDB stream image into a plain item
+def deserialize_image(image):
+    return {k: deserializer.deserialize(v) for k, v in (image or {}).items()}
+
+
+# Parse a change percentage such as "1.2345%" into a Decimal
+def parse_change(value):
+    if value is None:
+        return None
+    try:
+        return Decimal(str(value).strip().rstrip('%'))
+    except InvalidOperation:
+        return None
+
+
+# Parse a traded volume into a Decimal; a missing or malformed volume counts as 0
+def parse_volume(value):
+    if value is None:
+        return Decimal(0)
+    try:
+        volume = Decimal(str(value).strip())
+    except InvalidOperation:
+        return Decimal(0)
+    return volume if volume.is_finite() else Decimal(0)
+
+
+# The values a stock contributes to each of its groups
+def member_value(item):
+    return {
+        'volume': parse_volume(item.get('volume')),
+        'change': parse_change(item.get('change_percent')),
+    }
+
+
+# Fold a batch of stream records into the final member state per group.
+# A value of None means the ticker left the group.
+def collect_member_changes(records):
+    changes = {}
+    for record in records:
+        old = deserialize_image(record['dynamodb'].get('OldImage'))
+        new = deserialize_image(record['dynamodb'].get('NewImage'))
+        ticker = (new or old).get('ticker')
+        if ticker is None:
+            continue
+
+        for field in GROUP_FIELDS:
+            old_group = old.get(field)
+            new_group = new.get(field)
+            if old_group is not None and old_group != new_group:
+                changes.setdefault((field, old_group), {})[ticker] = None
+            if new_group is not None:
+                changes.setdefault((field, new_group), {})[ticker] = member_value(new)
+    return changes
+
+
+# Key of a ticker's member item in a group: the group's own partition, so
+# `?by=sector` queries of the aggregates never see members
+def member_key(group_type, group_name, ticker):
+    return {'group_type': f'{group_type}#{group_name}', 'group_name': ticker}
+
+
+# (count, volume, change sum, change count) a member item or value contributes
+def contribution(member):
+    if member is None:
+        return Decimal(0), Decimal(0), Decimal(0), Decimal(0)
+    change = member.get('change')
+    return (Decimal(1), Decimal(member.get('volume', 0)),
+            change if change is not None else Decimal(0), Decimal(0 if change is None else 1))
+
+
+def same_member(item, value):
+    if item is None or value is None:
+        return item is value
+    return item.get('volume') == value['volume'] and item.get('change') == value.get('change')
+
+
+# Write member changes and ADD their deltas to the aggregate item, in
+# transactions of at most MAX_TRANSACTION_MEMBERS members
+def apply_to_aggregate(table, group_type, group_name, member_changes):
+    tickers = list(member_changes)
+    for start in range(0, len(tickers), MAX_TRANSACTION_MEMBERS):
+        chunk = {ticker: member_changes[ticker] for ticker in tickers[start:start + MAX_TRANSACTION_MEMBERS]}
+        apply_chunk(table, group_type, group_name, chunk)
+
+
+# Each member write is conditioned on the member item read, so the deltas
+# are applied exactly once: a replayed record finds the member already
+# current and adds nothing, and a concurrent writer makes the transaction
+# fail and be retried on fresh reads.
+def apply_chunk(table, group_type, group_name, member_changes):
+    for _ in range(MAX_CONFLICT_RETRIES):
+        previous = {
+            ticker: table.get_item(Key=member_key(group_type, group_name, ticker), ConsistentRead=True).get('Item')
+            for ticker in member_changes
+        }
+        changed = {ticker: value for ticker, value in member_changes.items()
+                   if not same_member(previous[ticker], value)}
+        if not changed:
+            return
+
+        delta = [Decimal(0)] * 4
+        actions = []
+        for ticker, value in changed.items():
+            old = previous[ticker]
+            for i, (new_part, old_part) in enumerate(zip(contribution(value), contribution(old))):
+                delta[i] += new_part - old_part
+            actions.append(member_write(table.table_name, group_type, group_name, ticker, old, value))
+
+        actions.append({'Update': {
+            'TableName': table.table_name,
+            'Key': {'group_type': group_type, 'group_name': group_name},
+            'UpdateExpression': 'ADD #count :count, #sum_volume :sum_volume, #sum_change :sum_change, '
+                                '#change_count :change_count SET #updated_at = :now',
+            'ExpressionAttributeNames': {f'#{name}': name for name in AGGREGATE_COUNTERS + ('updated_at',)},
+            'ExpressionAttributeValues': dict(zip((f':{name}' for name in AGGREGATE_COUNTERS), delta),
+                                              **{':now': int(time.time())}),
+        }})
+
+        try:
+            transact_write(boto3.resource, actions)
+        except ClientError as e:
+            if not is_condition_conflict(e):
+                raise
+            # Another shard changed one of these members first; retry on fresh reads
+            continue
+
+        left = [previous[ticker]['change'] for ticker in changed
+                if previous[ticker] is not None and previous[ticker].get('change') is not None]
+        added = [value['change'] for value in changed.values() if value is not None and value.get('change') is not None]
+        update_extremes(table, group_type, group_name, left, added)
+        return
+
+    raise RuntimeError(f'Too many concurrent updates to aggregate {group_type}#{group_name}')
+
+
+# Put or delete a member item, conditioned on the version that was read
+def member_write(table_name, group_type, group_name, ticker, old, value):
+    key = member_key(group_type, group_name, ticker)
+    if old is None:
+        condition = {'ConditionExpression': 'attribute_not_exists(#version)',
+                     'ExpressionAttributeNames': {'#version': 'version'}}
+    else:
+        condition = {'ConditionExpression': '#version = :version',
+                     'ExpressionAttributeNames': {'#version': 'version'},
+                     'ExpressionAttributeValues': {':version': old['version']}}
+
+    if value is None:
+        return {'Delete': dict(condition, TableName=table_name, Key=key)}
+    item = dict(key, ticker=ticker, version=(old or {}).get('version', 0) + 1,
+                **{k: v for k, v in value.items() if v is not None})
+    return {'Put': dict(condition, TableName=table_name, Item=item)}
+
+
+# Change percentages of a group's members, read from its member partition
+def member_changes_of(table, group_type, group_name):
+    query_args = {
+        'KeyConditionExpression': Key('group_type').eq(f'{group_type}#{group_name}'),
+        'ProjectionExpression': '#change',
+        'ExpressionAttributeNames': {'#change': 'change'},
+        'ConsistentRead': True,
+    }
+    values = []
+    while True:
+        response = table.query(**query_args)
+        values.extend(item['change'] for item in response.get('Items', []) if item.get('change') is not None)
+        if 'LastEvaluatedKey' not in response:
+            return values
+        query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+# Bring min/max change up to date after member changes. `left` are the
+# changes that were replaced or removed and `added` the new ones. Only when
+# an extreme leaves are the members read again. The write is conditioned on
+# the extremes read, so a concurrent update is never overwritten.
+def update_extremes(table, group_type, group_name, left, added):
+    key = {'group_type': group_type, 'group_name': group_name}
+    names = {'#min': 'min_change', '#max': 'max_change'}
+
+    for _ in range(MAX_CONFLICT_RETRIES):
+        aggregate = table.get_item(Key=key, ConsistentRead=True, ProjectionExpression='#min, #max',
+                                   ExpressionAttributeNames=names).get('Item') or {}
+        low, high = aggregate.get('min_change'), aggregate.get('max_change')
+
+        if any(change in (low, high) for change in left):
+            values = member_changes_of(table, group_type, group_name)
+        else:
+            values = [v for v in [low, high] + added if v is not None]
+        new_low, new_high = (min(values), max(values)) if values else (None, None)
+        if (new_low, new_high) == (low, high):
+            return
+
+        values_expression = {}
+        conditions = []
+        for name, seen in (('#min', low), ('#max', high)):
+            if seen is None:
+                conditions.append(f'attribute_not_exists({name})')
+            else:
+                conditions.append(f'{name} = :seen_{name[1:]}')
+                values_expression[f':seen_{name[1:]}'] = seen
+        if new_low is None:
+            update = 'REMOVE #min, #max'
+        else:
+            update = 'SET #min = :min, #max = :max'
+            values_expression.update({':min': new_low, ':max': new_high})
+
+        try:
+            table.update_item(Key=key, UpdateExpression=update, ConditionExpression=' AND '.join(conditions),
+                              ExpressionAttributeNames=names, **({'ExpressionAttributeValues': values_expression}
+                                                                 if values_expression else {}))
+            return
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+            # Another shard moved the extremes first; recompute on its values
+
+    raise RuntimeError(f'Too many concurrent updates to aggregate {group_type}#{group_name}')
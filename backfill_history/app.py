@@ -0,0 +1,217 @@
+import datetime
+import os
+import threading
+import time
+import boto3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from stock_common import history
+from stock_common.candles import CANDLES_TABLE
+from stock_common.dynamo import get_table
+from stock_common.metrics import metered, put as put_metric
+from stock_common.profiling import profiled
+from stock_common.quotes import (BACKFILL_CALLS_PER_MINUTE, CallRateLimiter, NotFoundError, QuoteError,
+                                 QuoteProvider, RateLimitError)
+
+BACKFILL_TABLE = os.environ.get('BACKFILL_TABLE_NAME', 'stock-backfill-table')
+
+# Tickers streamed at once; each holds one response buffer and write batch
+WORKERS = int(os.environ.get('BACKFILL_WORKERS', '4'))
+
+# Upper bound on a run when there is no Lambda context to ask
+MAX_RUN_SECONDS = float(os.environ.get('BACKFILL_MAX_RUN_SECONDS', '840'))
+
+# Stop starting new tickers this long before the invocation times out; a
+# full history is a few seconds to stream and write
+DEADLINE_MARGIN_SECONDS = 60
+
+# TIME_SERIES_DAILY compact output covers the latest 100 trading days, so a
+# ticker backfilled within this many calendar days catches up from it
+COMPACT_DAYS = 140
+
+# A ticker that failed is retried after this long, doubling per failure up
+# to MAX_RETRY_SECONDS
+RETRY_SECONDS = int(os.environ.get('BACKFILL_RETRY_SECONDS', '3600'))
+MAX_RETRY_SECONDS = 7 * 24 * 3600
+
+# The backfill's share of the Alpha Vantage quota, shared by every worker thread
+quote_provider = QuoteProvider(limiter=CallRateLimiter(BACKFILL_CALLS_PER_MINUTE))
+
+
+# Backfill daily candles for tickers without complete history, resuming from
+# the per-ticker checkpoints of earlier runs
+@profiled
+@metered
+def lambda_handler(event, context):
+
+    # ================== Sample Input ================== #
+    # Scheduled EventBridge event: backfills every tracked ticker
+    # event = {"tickers": ["AAPL", "MSFT"]}  (optional, only these tickers)
+    # ================================================== #
+
+    if context is not None:
+        run_seconds = context.get_remaining_time_in_millis() / 1000.0 - DEADLINE_MARGIN_SECONDS
+    else:
+        run_seconds = MAX_RUN_SECONDS
+    deadline = time.monotonic() + run_seconds
+
+    # History runs up to yesterday; today's candle is still folded from live quotes
+    today = utc_today()
+    before = today.isoformat()
+
+    tickers = (event or {}).get('tickers') or load_tickers()
+    checkpoints = load_checkpoints()
+    queue = deque(plan(tickers, checkpoints, today))
+
+    run = BackfillRun(queue, deadline, before, checkpoints)
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        workers = [executor.submit(run.work) for _ in range(WORKERS)]
+    for worker in workers:
+        worker.result()
+
+    put_metric('backfill_history.run', 'Deferred', len(run.queue))
+
+    return {
+        'considered': len(tickers),
+        'backfilled': len(run.done),
+        'days': run.days,
+        'failed': run.failed,
+        'deferred': len(run.queue),
+    }
+
+
+def utc_today():
+    return datetime.datetime.now(datetime.timezone.utc).date()
+
+
+# Every tracked ticker
+def load_tickers():
+    table = get_table(boto3.resource)
+    scan_args = {'ProjectionExpression': 'ticker'}
+    tickers = []
+    while True:
+        response = table.scan(**scan_args)
+        tickers.extend(item['ticker'] for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return tickers
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+# {ticker: checkpoint} from the backfill table
+def load_checkpoints():
+    table = get_table(boto3.resource, BACKFILL_TABLE)
+    scan_args = {}
+    checkpoints = {}
+    while True:
+        response = table.scan(**scan_args)
+        for item in response.get('Items', []):
+            checkpoints[item['ticker']] = item
+        if 'LastEvaluatedKey' not in response:
+            return checkpoints
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+# (ticker, outputsize, first date to write) for every ticker that needs work.
+# Never-backfilled tickers come first and get the full history; tickers
+# checkpointed through a recent day only fetch the compact output from there.
+# Tickers Alpha Vantage has no history for are not retried, and tickers that
+# failed wait until their retry_after.
+def plan(tickers, checkpoints, today, now=None):
+    now = time.time() if now is None else now
+    yesterday = (today - datetime.timedelta(days=1)).isoformat()
+    compact_from = (today - datetime.timedelta(days=COMPACT_DAYS)).isoformat()
+    full, catch_up = [], []
+    for ticker in sorted(set(tickers)):
+        checkpoint = checkpoints.get(ticker) or {}
+        if checkpoint.get('status') == 'missing':
+            continue
+        if checkpoint.get('status') == 'failed' and checkpoint.get('retry_after', 0) > now:
+            continue
+        through = checkpoint.get('through')
+        if through is None or through < compact_from:
+            full.append((ticker, 'full', None))
+        elif through < yesterday:
+            catch_up.append((ticker, 'compact', through))
+    return full + catch_up
+
+
+# Worker threads take tickers off one queue until it is empty, the deadline
+# passes or Alpha Vantage reports the quota as spent
+class BackfillRun:
+
+    def __init__(self, queue, deadline, before, checkpoints=None):
+        self.queue = queue
+        self.deadline = deadline
+        self.before = before
+        self.checkpoints = checkpoints or {}
+        self.done = []
+        self.failed = []
+        self.days = 0
+        self.stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    def next_ticker(self):
+        with self._lock:
+            return self.queue.popleft() if self.queue else None
+
+    def work(self):
+        candles = get_table(boto3.resource, CANDLES_TABLE)
+        checkpoints = get_table(boto3.resource, BACKFILL_TABLE)
+        while not self.stopped.is_set() and time.monotonic() < self.deadline:
+            entry = self.next_ticker()
+            if entry is None:
+                return
+            ticker, outputsize, since = entry
+            try:
+                days, _ = history.backfill_ticker(quote_provider, candles, ticker, self.before, since, outputsize)
+            except RateLimitError as e:
+                print(str(e))
+                self.stopped.set()
+                with self._lock:
+                    self.queue.appendleft(entry)
+                return
+            except NotFoundError as e:
+                print(f'No history for {ticker}: {str(e)}')
+                self._record(checkpoints, ticker, 'missing')
+                self._finish(self.failed, ticker)
+                continue
+            except (QuoteError, ClientError) as e:
+                print(f'Error backfilling {ticker}: {str(e)}')
+                self._record_failure(checkpoints, ticker)
+                self._finish(self.failed, ticker)
+                continue
+
+            # Checkpoint only once every day is written, so a failed ticker starts over
+            self._record(checkpoints, ticker, 'done', through=self.before_day())
+            self._finish(self.done, ticker, days)
+
+    # The last day a successful backfill covers
+    def before_day(self):
+        before = datetime.date.fromisoformat(self.before)
+        return (before - datetime.timedelta(days=1)).isoformat()
+
+    # Checkpoint a failed ticker with exponential backoff. The day it was
+    # backfilled through is kept, so the retry still only catches up.
+    def _record_failure(self, table, ticker):
+        previous = self.checkpoints.get(ticker) or {}
+        attempts = int(previous.get('attempts', 0)) + 1 if previous.get('status') == 'failed' else 1
+        delay = min(RETRY_SECONDS * 2 ** (attempts - 1), MAX_RETRY_SECONDS)
+        now = int(time.time())
+        self._record(table, ticker, 'failed', through=previous.get('through'),
+                     attempts=attempts, updated_at=now, retry_after=now + delay)
+
+    def _record(self, table, ticker, status, through=None, **fields):
+        item = dict({'updated_at': int(time.time())}, **fields)
+        item.update(ticker=ticker, status=status)
+        if through is not None:
+            item['through'] = through
+        try:
+            table.put_item(Item=item)
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+
+    def _finish(self, results, ticker, days=0):
+        with self._lock:
+            results.append(ticker)
+            self.days += days
@@ -0,0 +1,82 @@
+"""asyncio path for independent I/O in the stock handlers.
+
+Handlers keep their synchronous `lambda_handler(event, context)` signature and
+hand independent calls to `gather`, which runs them concurrently on an event
+loop created once per thread and reused by every warm invocation. A request
+that needs several reads then takes about the slowest of them instead of
+their sum.
+
+The layer has no async DynamoDB or HTTP client, so each call runs its
+blocking boto3 or urllib code on the loop's thread pool (`run_in_executor`).
+boto3 clients and urllib are thread-safe, and the calls share the
+container's cached DynamoDB resource and connection pool.
+
+STOCK_ASYNC_IO=0 runs the same calls one after another, for comparison.
+"""
+import asyncio
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+ENABLED = os.environ.get('STOCK_ASYNC_IO', '1').lower() not in ('0', 'false', 'no')
+
+# Blocking calls in flight at once, per container
+WORKERS = int(os.environ.get('STOCK_ASYNC_WORKERS', '16'))
+
+_executor = ThreadPoolExecutor(max_workers=WORKERS, thread_name_prefix='stock-aio')
+_local = threading.local()
+
+
+# This thread's event loop, created on first use and kept for later invocations
+def get_loop():
+    loop = getattr(_local, 'loop', None)
+    if loop is None or loop.is_closed():
+        loop = _local.loop = asyncio.new_event_loop()
+        loop.set_default_executor(_executor)
+    return loop
+
+
+# Run a coroutine to completion on this thread's loop
+def run(coroutine):
+    return get_loop().run_until_complete(coroutine)
+
+
+# Await a blocking call on the loop's thread pool
+async def call(fn, *args, **kwargs):
+    return await asyncio.get_event_loop().run_in_executor(None, functools.partial(fn, *args, **kwargs))
+
+
+# Run zero-argument callables concurrently and return their results in order.
+# The first exception is raised, or returned in its place with return_exceptions.
+def gather(*calls, return_exceptions=False):
+    if not ENABLED:
+        results = []
+        for fn in calls:
+            try:
+                results.append(fn())
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                results.append(e)
+        return results
+
+    # The last call runs on this thread while the pool runs the others, which
+    # saves a thread handoff; the loop has nothing else to do meanwhile
+    async def gather_calls():
+        loop = asyncio.get_event_loop()
+        # run_in_executor submits straight away, so the others start before the last call
+        others = asyncio.gather(*(loop.run_in_executor(None, fn) for fn in calls[:-1]),
+                                return_exceptions=return_exceptions)
+        try:
+            last = calls[-1]()
+        except Exception as e:
+            if not return_exceptions:
+                others.cancel()
+                raise
+            last = e
+        return list(await others) + [last]
+
+    if not calls:
+        return []
+    return run(gather_calls())
@@ -0,0 +1,177 @@
+"""Price-alert rules evaluated on each quote update.
+
+Rules live in the alerts table under the stock's ticker. Their sort key
+encodes metric, direction and threshold so the rules of one ticker form a
+sorted interval index:
+
+    <metric>#<direction>#<threshold, fixed-width>#<rule_id>
+
+A rule fires when a write moves the metric across its threshold: an `above`
+rule when previous < threshold <= current, a `below` rule when
+current <= threshold < previous. Both conditions are a single key range, so
+evaluating an update is at most one Query per metric and reads only the
+rules that fired. Fired alerts are written to the outbox table for delivery.
+"""
+import os
+import time
+import uuid
+from decimal import Decimal, InvalidOperation
+
+from botocore.exceptions import ClientError
+
+from stock_common import metrics
+from stock_common.dynamo import get_table
+
+ALERTS_TABLE = os.environ.get('ALERTS_TABLE_NAME', 'stock-alerts-table')
+OUTBOX_TABLE = os.environ.get('ALERT_OUTBOX_TABLE_NAME', 'stock-alert-outbox-table')
+
+# Metric name -> stock item attribute
+METRICS = {
+    'price': 'price',
+    'change_percent': 'change_percent',
+}
+DIRECTIONS = ('above', 'below')
+
+# Thresholds are stored offset and zero-padded so string order is numeric order
+THRESHOLD_OFFSET = Decimal(10) ** 12
+THRESHOLD_QUANTUM = Decimal('0.0001')
+
+# Seconds an outbox entry is kept (DynamoDB TTL on expires_at)
+OUTBOX_TTL_SECONDS = int(os.environ.get('ALERT_OUTBOX_TTL_SECONDS', str(7 * 24 * 3600)))
+
+
+# Parse a metric value such as Decimal('150.00') or "1.2345%"
+def parse_value(value):
+    if value is None:
+        return None
+    try:
+        return Decimal(str(value).strip().rstrip('%'))
+    except InvalidOperation:
+        return None
+
+
+def encode_threshold(value):
+    value = Decimal(value).quantize(THRESHOLD_QUANTUM)
+    if abs(value) >= THRESHOLD_OFFSET:
+        raise ValueError('threshold out of range')
+    return f'{value + THRESHOLD_OFFSET:018.4f}'
+
+
+def rule_key(metric, direction, threshold, rule_id):
+    return f'{metric}#{direction}#{encode_threshold(threshold)}#{rule_id}'
+
+
+# Build a rule item, validating metric, direction and threshold
+def new_rule(ticker, metric, direction, threshold):
+    if metric not in METRICS:
+        raise ValueError(f'metric must be one of {", ".join(METRICS)}')
+    if direction not in DIRECTIONS:
+        raise ValueError(f'direction must be one of {", ".join(DIRECTIONS)}')
+    threshold = parse_value(threshold)
+    if threshold is None or not threshold.is_finite():
+        raise ValueError('threshold must be a number')
+
+    rule_id = uuid.uuid4().hex
+    return {
+        'ticker': ticker,
+        'rule_key': rule_key(metric, direction, threshold, rule_id),
+        'rule_id': rule_id,
+        'metric': metric,
+        'direction': direction,
+        'threshold': threshold,
+        'created_at': int(time.time()),
+    }
+
+
+# Sort key bounds of the rules crossed by a move from previous to current
+def crossed_range(metric, previous, current):
+    if current > previous:
+        prefix = f'{metric}#above#'
+        # previous < threshold <= current ('$' sorts just after the '#' separator)
+        return prefix + encode_threshold(previous) + '$', prefix + encode_threshold(current) + '$'
+    if current < previous:
+        prefix = f'{metric}#below#'
+        # current <= threshold < previous
+        return prefix + encode_threshold(current), prefix + encode_threshold(previous)
+    return None
+
+
+# Query the rules whose sort key falls in [low, high]
+def query_crossed(alerts_table, ticker, low, high):
+    query_args = {
+        'KeyConditionExpression': 'ticker = :ticker AND rule_key BETWEEN :low AND :high',
+        'ExpressionAttributeValues': {':ticker': ticker, ':low': low, ':high': high},
+    }
+    while True:
+        response = alerts_table.query(**query_args)
+        yield from response.get('Items', [])
+        if 'LastEvaluatedKey' not in response:
+            return
+        query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+# The rules fired by an item moving from `previous` to `current`
+def triggered_rules(alerts_table, previous, current):
+    ticker = current['ticker']
+    fired = []
+    for metric, attribute in METRICS.items():
+        old = parse_value(previous.get(attribute))
+        new = parse_value(current.get(attribute))
+        if old is None or new is None:
+            continue
+        bounds = crossed_range(metric, old, new)
+        if bounds is None:
+            continue
+        for rule in query_crossed(alerts_table, ticker, *bounds):
+            fired.append((rule, old, new))
+    return fired
+
+
+# Evaluate the ticker's rules for one write and record fired alerts in the outbox
+def evaluate(alerts_table, outbox_table, previous, current):
+    fired = triggered_rules(alerts_table, previous, current)
+    if not fired:
+        return []
+
+    now = int(time.time())
+    alerts = [
+        {
+            # One outbox entry per rule and triggering write
+            'alert_id': f'{rule["ticker"]}#{rule["rule_id"]}#{current.get("refreshed_at", now)}',
+            'ticker': rule['ticker'],
+            'rule_id': rule['rule_id'],
+            'metric': rule['metric'],
+            'direction': rule['direction'],
+            'threshold': rule['threshold'],
+            'previous_value': old,
+            'value': new,
+            'triggered_at': now,
+            'expires_at': now + OUTBOX_TTL_SECONDS,
+        }
+        for rule, old, new in fired
+    ]
+    with outbox_table.batch_writer(overwrite_by_pkeys=['alert_id']) as batch:
+        for alert in alerts:
+            batch.put_item(Item=alert)
+    return alerts
+
+
+# Evaluate alerts after a quote write. Best effort: a failure here is logged
+# and never fails the write that has already succeeded.
+def evaluate_write(resource_factory, previous, current):
+    try:
+        fired = evaluate(get_table(resource_factory, ALERTS_TABLE),
+                         get_table(resource_factory, OUTBOX_TABLE), previous, current)
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        metrics.put('alerts.evaluate', 'Errors', 1)
+        return []
+    # A metric value that cannot be encoded as a threshold (InvalidOperation
+    # is an ArithmeticError)
+    except (ArithmeticError, ValueError) as e:
+        print(f"Error evaluating alerts for {current.get('ticker')}: {e!r}")
+        metrics.put('alerts.evaluate', 'Errors', 1)
+        return []
+    if fired:
+        metrics.put('alerts.evaluate', 'AlertsTriggered', len(fired))
+    return fired
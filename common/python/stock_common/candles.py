@@ -0,0 +1,139 @@
+"""OHLCV candle rollups at fixed resolutions.
+
+Each quote is folded into one candle item per resolution, keyed by
+series (`<ticker>#<resolution>`) and bucket_start (epoch seconds). The fold
+is a single atomic UpdateItem: `if_not_exists` sets open/high/low on the
+first quote of a bucket, `close` always takes the latest price, and volume
+and tick counts are added. DynamoDB has no min/max in update expressions, so
+when the returned candle shows the price beyond its high or low, one more
+conditional update (`high < :price`) moves the extreme; concurrent writers
+cannot move it the wrong way.
+
+A candle also records the time of the last quote folded into it
+(`last_quote_at`), and the fold is conditional on that time moving forward.
+That makes replays of the same quote no-ops.
+"""
+import os
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+CANDLES_TABLE = os.environ.get('CANDLES_TABLE_NAME', 'stock-candles-table')
+
+# Resolution -> (bucket seconds, seconds to keep, or None to keep forever)
+RESOLUTIONS = {
+    '1m': (60, 2 * 24 * 3600),
+    '1h': (3600, 90 * 24 * 3600),
+    '1d': (86400, None),
+}
+
+
+def series_key(ticker, resolution):
+    return f'{ticker}#{resolution}'
+
+
+def bucket_start(at, resolution):
+    seconds = RESOLUTIONS[resolution][0]
+    return int(at) - int(at) % seconds
+
+
+def _is_conditional_failure(error):
+    return error.response['Error']['Code'] == 'ConditionalCheckFailedException'
+
+
+# Move the candle's high or low to price unless another writer got there first
+def _extend(table, key, attribute, comparison, price):
+    try:
+        table.update_item(
+            Key=key,
+            UpdateExpression='SET #extreme = :price',
+            ConditionExpression=f'#extreme {comparison} :price',
+            ExpressionAttributeNames={'#extreme': attribute},
+            ExpressionAttributeValues={':price': price}
+        )
+    except ClientError as e:
+        if not _is_conditional_failure(e):
+            raise
+
+
+# Fold one quote into its candle at every resolution. Returns the number of
+# candles updated (0 when the quote was already folded).
+def fold_quote(table, ticker, price, volume, at):
+    updated = 0
+    for resolution, (_, keep_seconds) in RESOLUTIONS.items():
+        key = {'series': series_key(ticker, resolution), 'bucket_start': bucket_start(at, resolution)}
+
+        assignments = [
+            '#open = if_not_exists(#open, :price)',
+            '#high = if_not_exists(#high, :price)',
+            '#low = if_not_exists(#low, :price)',
+            '#close = :price',
+            '#last_quote_at = :at',
+        ]
+        names = {
+            '#open': 'open', '#high': 'high', '#low': 'low', '#close': 'close',
+            '#last_quote_at': 'last_quote_at', '#volume': 'volume', '#ticks': 'ticks',
+        }
+        values = {':price': price, ':at': int(at), ':volume': volume, ':one': 1}
+        if keep_seconds is not None:
+            assignments.append('#expires_at = :expires_at')
+            names['#expires_at'] = 'expires_at'
+            values[':expires_at'] = key['bucket_start'] + keep_seconds
+
+        try:
+            response = table.update_item(
+                Key=key,
+                UpdateExpression='SET ' + ', '.join(assignments) + ' ADD #volume :volume, #ticks :one',
+                ConditionExpression='attribute_not_exists(#last_quote_at) OR #last_quote_at < :at',
+                ExpressionAttributeNames=names,
+                ExpressionAttributeValues=values,
+                ReturnValues='ALL_NEW'
+            )
+        except ClientError as e:
+            if _is_conditional_failure(e):
+                continue
+            raise
+
+        candle = response.get('Attributes', {})
+        if 'high' in candle and price > candle['high']:
+            _extend(table, key, 'high', '<', price)
+        if 'low' in candle and price < candle['low']:
+            _extend(table, key, 'low', '>', price)
+        updated += 1
+    return updated
+
+
+# Range query over one series, oldest first. Without `start` the newest
+# `limit` items are returned; `fields` projects the named attributes.
+def query_series(table, series, start=None, end=None, limit=1000, fields=None):
+    condition = Key('series').eq(series)
+    if start is not None and end is not None:
+        condition = condition & Key('bucket_start').between(start, end)
+    elif start is not None:
+        condition = condition & Key('bucket_start').gte(start)
+    elif end is not None:
+        condition = condition & Key('bucket_start').lte(end)
+
+    newest_first = start is None
+    query_args = {
+        'KeyConditionExpression': condition,
+        'ScanIndexForward': not newest_first,
+        'Limit': limit,
+    }
+    if fields:
+        query_args['ProjectionExpression'] = ', '.join(f'#{f}' for f in fields)
+        query_args['ExpressionAttributeNames'] = {f'#{f}': f for f in fields}
+
+    items = []
+    while len(items) < limit:
+        response = table.query(**query_args)
+        items.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        query_args['Limit'] = limit - len(items)
+
+    items = items[:limit]
+    if newest_first:
+        items.reverse()
+    return items
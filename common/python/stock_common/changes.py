@@ -0,0 +1,139 @@
+"""Change sequence for delta sync of the stocks table.
+
+Every write to a stock stamps it with `updated_seq`, the next value of one
+atomic counter in the sequence table, and with `sync_partition`, a constant
+that puts every stamped stock into the `updated_seq-index` GSI (partition
+sync_partition, sort updated_seq). A delete leaves a tombstone under the same
+key layout in the tombstones table. `changes_since` reads both in sequence
+order, so a client that synced up to N pays for what changed after N instead
+of the whole table.
+
+A sequence number is taken before its write lands, and the GSI is eventually
+consistent, so a change can become visible after one with a higher number.
+Changes younger than SETTLE_SECONDS are therefore held back, together with
+everything after them, so a client's next `since` never skips a change that
+was still in flight.
+"""
+import os
+import threading
+import time
+
+from boto3.dynamodb.conditions import Key
+
+from stock_common.dynamo import get_table
+
+SEQUENCE_TABLE = os.environ.get('SEQUENCE_TABLE_NAME', 'stock-sequence-table')
+TOMBSTONES_TABLE = os.environ.get('TOMBSTONES_TABLE_NAME', 'stock-tombstones-table')
+
+CHANGES_INDEX = 'updated_seq-index'
+SYNC_PARTITION = 'stocks'
+
+SETTLE_SECONDS = float(os.environ.get('CHANGES_SETTLE_SECONDS', '5'))
+
+# Attributes used for sync bookkeeping only, never returned to clients
+INTERNAL_FIELDS = ('sync_partition',)
+
+
+# Take the next sequence number
+def next_seq(resource_factory):
+    response = get_table(resource_factory, SEQUENCE_TABLE).update_item(
+        Key={'name': SYNC_PARTITION},
+        UpdateExpression='ADD #value :one',
+        ExpressionAttributeNames={'#value': 'value'},
+        ExpressionAttributeValues={':one': 1},
+        ReturnValues='UPDATED_NEW'
+    )
+    return int(response['Attributes']['value'])
+
+
+# The last sequence number taken, 0 before the first write
+def current_seq(resource_factory):
+    item = get_table(resource_factory, SEQUENCE_TABLE).get_item(Key={'name': SYNC_PARTITION}).get('Item')
+    return int(item['value']) if item else 0
+
+
+class CachedSeq:
+    """current_seq kept in the container for ttl_seconds, for hot read paths
+    that may answer up to that far behind the latest write"""
+
+    def __init__(self, ttl_seconds, clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._value = None
+        self._read_at = None
+        self._lock = threading.Lock()
+
+    def get(self, resource_factory):
+        now = self.clock()
+        with self._lock:
+            if self._value is not None and now - self._read_at < self.ttl_seconds:
+                return self._value
+        value = current_seq(resource_factory)
+        with self._lock:
+            self._value, self._read_at = value, now
+        return value
+
+
+# Attributes stamping a stock write with the next sequence number
+def stamp(resource_factory):
+    return {
+        'updated_seq': next_seq(resource_factory),
+        'updated_at': int(time.time()),
+        'sync_partition': SYNC_PARTITION,
+    }
+
+
+# The tombstone write for a deleted ticker, as a transaction action to apply
+# together with the stock's delete, so a delete that fails publishes nothing.
+# The sequence number is taken here, before the delete lands: a create that
+# lands after the delete then takes a higher number than the tombstone.
+def tombstone_put(resource_factory, ticker):
+    tombstone = dict(stamp(resource_factory), ticker=ticker, deleted=True)
+    return {'Put': {'TableName': TOMBSTONES_TABLE, 'Item': tombstone}}
+
+
+def _query(table, since, limit, projection=None, **query_args):
+    query_args.update(projection or {})
+    response = table.query(
+        KeyConditionExpression=Key('sync_partition').eq(SYNC_PARTITION) & Key('updated_seq').gt(since),
+        Limit=limit,
+        **query_args
+    )
+    return response.get('Items', []), 'LastEvaluatedKey' in response
+
+
+def _public(item):
+    return {k: v for k, v in item.items() if k not in INTERNAL_FIELDS}
+
+
+# Up to `limit` changes after sequence number `since`, oldest first. Deleted
+# tickers appear as {'ticker', 'updated_seq', 'deleted': True}. Returns
+# {'changes', 'next_since', 'has_more'}; pass next_since back as since.
+def changes_since(stocks_table, tombstones_table, since, limit, projection=None, now=None):
+    cutoff = (time.time() if now is None else now) - SETTLE_SECONDS
+
+    updates, more_updates = _query(stocks_table, since, limit, projection, IndexName=CHANGES_INDEX)
+    deletes, more_deletes = _query(tombstones_table, since, limit)
+    merged = sorted(updates + deletes, key=lambda change: change['updated_seq'])
+
+    # A source with more pages may still hold numbers below the other's last
+    # one, so stop at the lowest last number of any unfinished source
+    bounds = [items[-1]['updated_seq'] for items, more in ((updates, more_updates), (deletes, more_deletes))
+              if more and items]
+    has_more = more_updates or more_deletes or len(merged) > limit
+    if bounds:
+        merged = [change for change in merged if change['updated_seq'] <= min(bounds)]
+
+    changes = []
+    for change in merged[:limit]:
+        # The rest is too recent to be settled; the client picks it up on its next poll
+        if change.get('updated_at', 0) > cutoff:
+            has_more = False
+            break
+        changes.append(_public(change))
+
+    return {
+        'changes': changes,
+        'next_since': int(changes[-1]['updated_seq']) if changes else since,
+        'has_more': bool(has_more),
+    }
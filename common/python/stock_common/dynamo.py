@@ -0,0 +1,115 @@
+"""DynamoDB table access shared by the stock Lambda handlers.
+
+Tables are cached per container and keyed on the boto3 resource factory
+passed in by the handler, so every handler served from one container (for
+example through the combined router function) shares a single warm resource
+and connection pool. Handlers pass their own module's `boto3.resource`, which
+keeps `patch('<handler>.app.boto3.resource')` effective in the unit tests.
+
+`transact_write` applies Put/Update/Delete/ConditionCheck requests written
+with plain Python values, like the Table methods take, as one transaction.
+
+boto3 resources are not thread-safe. Work that runs on several threads at
+once, rather than overlapping calls through stock_common.aio, takes its own
+resource per thread from `new_resource`.
+
+`use_backend` swaps in a different resource (such as the in-memory tables
+of the local dev server in devtools/) for every handler at once.
+"""
+import os
+import threading
+
+from boto3.dynamodb.types import TypeSerializer
+
+from stock_common import metrics, profiling, retry
+
+STOCKS_TABLE = os.environ.get('TABLE_NAME', 'stocks-table')
+
+# resource factory -> DynamoDB service resource
+_resources = {}
+
+# (resource factory, table name) -> Table
+_tables = {}
+
+# Resource used instead of DynamoDB when set (local development)
+_backend = None
+
+# Creating a resource and its Tables, so calls overlapped by stock_common.aio
+# on a cold container share one of each
+_create_lock = threading.Lock()
+
+
+def use_backend(resource):
+    global _backend
+    _backend = resource
+    _resources.clear()
+    _tables.clear()
+
+
+# Create an uncached, instrumented DynamoDB resource for a boto3.resource factory
+def new_resource(resource_factory):
+    if _backend is not None:
+        return _backend
+    dynamodb = resource_factory('dynamodb', config=retry.CLIENT_CONFIG)
+    profiling.instrument_client(dynamodb.meta.client)
+    metrics.instrument_client(dynamodb.meta.client)
+    retry.dynamodb_policy.install(dynamodb.meta.client)
+    return dynamodb
+
+
+# Return the cached, instrumented DynamoDB resource for a boto3.resource factory
+def get_resource(resource_factory):
+    if _backend is not None:
+        return _backend
+    dynamodb = _resources.get(resource_factory)
+    if dynamodb is None:
+        with _create_lock:
+            dynamodb = _resources.get(resource_factory)
+            if dynamodb is None:
+                dynamodb = _resources[resource_factory] = new_resource(resource_factory)
+    return dynamodb
+
+
+# Return the cached DynamoDB Table for the handler's boto3.resource factory
+def get_table(resource_factory, table_name=STOCKS_TABLE):
+    key = (resource_factory, table_name)
+    table = _tables.get(key)
+    if table is None:
+        dynamodb = get_resource(resource_factory)
+        with _create_lock:
+            table = _tables.get(key)
+            if table is None:
+                table = _tables[key] = dynamodb.Table(table_name)
+    return table
+
+
+_serializer = TypeSerializer()
+
+
+def _serialize_request(request):
+    serialized = dict(request)
+    for field in ('Item', 'Key', 'ExpressionAttributeValues'):
+        if field in serialized:
+            serialized[field] = {k: _serializer.serialize(v) for k, v in serialized[field].items()}
+    return serialized
+
+
+# Apply writes to one or more tables atomically (TransactWriteItems). Each
+# action is {'Put'|'Update'|'Delete'|'ConditionCheck': {'TableName': ..., ...}}.
+# A failed condition raises ClientError TransactionCanceledException.
+def transact_write(resource_factory, actions):
+    resource = get_resource(resource_factory)
+    if _backend is not None:
+        return resource.transact_write_items(TransactItems=actions)
+    return resource.meta.client.transact_write_items(TransactItems=[
+        {action: _serialize_request(request) for action, request in entry.items()} for entry in actions
+    ])
+
+
+# Whether a cancelled transaction failed on a condition (so it may be retried
+# after re-reading) rather than on an error
+def is_condition_conflict(error):
+    if error.response['Error']['Code'] != 'TransactionCanceledException':
+        return False
+    reasons = error.response.get('CancellationReasons') or []
+    return any(reason.get('Code') in ('ConditionalCheckFailed', 'TransactionConflict') for reason in reasons)
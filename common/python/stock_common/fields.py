@@ -0,0 +1,50 @@
+"""Sparse fieldsets for the stock read endpoints.
+
+`?fields=price,volume` is turned into a DynamoDB ProjectionExpression, so
+only the requested attributes are read, returned and serialized. The key
+attribute (`ticker`) is always included, so every returned item can still
+be identified. Names go through ExpressionAttributeNames, which keeps
+reserved words such as `volume` usable.
+"""
+import re
+
+# Upper bound on requested attributes; keeps the expression well inside DynamoDB's limits
+MAX_FIELDS = 32
+
+KEY_FIELD = 'ticker'
+
+_FIELD_NAME = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+class FieldsError(ValueError):
+    pass
+
+
+# Requested attribute names from the query parameters, or None for every attribute
+def parse_fields(params):
+    value = (params or {}).get('fields')
+    if value is None:
+        return None
+
+    fields = list(dict.fromkeys(f.strip() for f in value.split(',') if f.strip()))
+    if not fields:
+        raise FieldsError('Bad Request: fields must list at least one attribute')
+    if len(fields) > MAX_FIELDS:
+        raise FieldsError(f'Bad Request: at most {MAX_FIELDS} fields may be requested')
+    invalid = [f for f in fields if not _FIELD_NAME.match(f)]
+    if invalid:
+        raise FieldsError(f'Bad Request: invalid field names: {", ".join(invalid)}')
+
+    if KEY_FIELD not in fields:
+        fields.insert(0, KEY_FIELD)
+    return fields
+
+
+# get_item/query/scan arguments reading only the given attributes
+def projection_args(fields):
+    if not fields:
+        return {}
+    return {
+        'ProjectionExpression': ', '.join(f'#{f}' for f in fields),
+        'ExpressionAttributeNames': {f'#{f}': f for f in fields},
+    }
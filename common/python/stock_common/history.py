@@ -0,0 +1,186 @@
+"""Daily price history from Alpha Vantage TIME_SERIES_DAILY.
+
+A full-history response is several megabytes of JSON. `iter_daily_bars`
+parses it incrementally from the HTTP response: only a small buffer and the
+current day's bar are held in memory at any time, so many tickers can be
+backfilled concurrently in one Lambda container. Bars are stored as `1d`
+candles (see `stock_common.candles`) with batched writes, so
+`GET /stock/{ticker}/candles?res=1d` serves the history.
+"""
+import codecs
+import datetime
+import json
+from decimal import Decimal
+
+from stock_common import packed
+from stock_common.candles import RESOLUTIONS, series_key
+from stock_common.metrics import put as put_metric
+from stock_common.quotes import NotFoundError, QuoteError, RateLimitError
+
+SERIES_FIELD = 'Time Series (Daily)'
+
+# TIME_SERIES_DAILY bar field -> candle attribute
+BAR_FIELDS = {
+    '1. open': 'open',
+    '2. high': 'high',
+    '3. low': 'low',
+    '4. close': 'close',
+    '5. volume': 'volume',
+}
+
+CHUNK_SIZE = 64 * 1024
+
+_WHITESPACE = ' \t\n\r'
+
+
+class _StreamReader:
+    """Incrementally decodes JSON values from a byte stream"""
+
+    def __init__(self, stream, chunk_size=CHUNK_SIZE):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.decoder = json.JSONDecoder()
+        self.utf8 = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.bytes_read = 0
+
+    # Read the next chunk, dropping what has been consumed; False at the end
+    def fill(self):
+        if self.eof:
+            return False
+        chunk = self.stream.read(self.chunk_size)
+        self.bytes_read += len(chunk)
+        self.eof = not chunk
+        self.buffer = self.buffer[self.pos:] + self.utf8.decode(chunk, final=self.eof)
+        self.pos = 0
+        return not self.eof or bool(self.buffer)
+
+    # The next non-whitespace character, without consuming it ('' at the end)
+    def peek(self):
+        while True:
+            while self.pos < len(self.buffer) and self.buffer[self.pos] in _WHITESPACE:
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self.fill():
+                return ''
+
+    def expect(self, char):
+        if self.peek() != char:
+            raise QuoteError(f'Malformed response: expected {char!r} at byte {self.bytes_read}')
+        self.pos += 1
+
+    # Decode one complete JSON value, reading more input until it is whole
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except json.JSONDecodeError:
+                if self.eof or not self.fill():
+                    raise QuoteError('Malformed response: truncated JSON')
+                continue
+            # A number at the end of the buffer may continue in the next chunk
+            if end == len(self.buffer) and not isinstance(value, (dict, list, str)) and not self.eof:
+                self.fill()
+                continue
+            self.pos = end
+            return value
+
+    # Iterate the (key, value) pairs of an object whose '{' is next; values
+    # are left to the caller, who must consume each one before continuing
+    def members(self):
+        self.expect('{')
+        if self.peek() == '}':
+            self.pos += 1
+            return
+        while True:
+            key = self.value()
+            self.expect(':')
+            yield key
+            if self.peek() == ',':
+                self.pos += 1
+                continue
+            self.expect('}')
+            return
+
+
+# Yield (date, bar) for every day of a TIME_SERIES_DAILY response, newest
+# first as the API sends them. API errors and rate limits raise like quotes do.
+def iter_daily_bars(stream, chunk_size=CHUNK_SIZE):
+    reader = _StreamReader(stream, chunk_size)
+    found = False
+    for key in reader.members():
+        if key != SERIES_FIELD:
+            value = reader.value()
+            if key == 'Note':
+                raise RateLimitError('API call frequency exceeded. Please wait a minute and try again.')
+            if key == 'Error Message':
+                raise NotFoundError(f'No daily history: {value}')
+            if key == 'Information':
+                raise QuoteError(str(value))
+            continue
+        found = True
+        for date in reader.members():
+            yield date, reader.value()
+    if not found:
+        raise NotFoundError('No daily history in the response')
+
+
+def day_start(date):
+    day = datetime.datetime.strptime(date, '%Y-%m-%d').replace(tzinfo=datetime.timezone.utc)
+    return int(day.timestamp())
+
+
+# The 1d candle item for one daily bar. last_quote_at closes the day, so a
+# late replay of an intraday quote cannot fold into the official bar.
+def bar_to_candle(ticker, date, bar):
+    start = day_start(date)
+    candle = {
+        'series': series_key(ticker, '1d'),
+        'bucket_start': start,
+        'last_quote_at': start + RESOLUTIONS['1d'][0] - 1,
+        'source': 'backfill',
+    }
+    for field, attribute in BAR_FIELDS.items():
+        if bar.get(field) not in (None, ''):
+            candle[attribute] = Decimal(bar[field])
+    return candle
+
+
+# Stream one ticker's daily history ('full' or the latest 100 days with
+# 'compact') into the candles table. Days on or after `before` (today, still
+# being folded from live quotes) and before `since` are skipped.
+# With `pack`, each month is also written in the packed format (see
+# stock_common.packed) as soon as the stream moves past it, so only one
+# month of bars is held. Returns (days written, oldest date written).
+def backfill_ticker(provider, table, ticker, before, since=None, outputsize='full', pack=packed.ENABLED):
+    written = 0
+    oldest = None
+    month = []
+    with provider.stream('TIME_SERIES_DAILY', ticker, outputsize=outputsize) as response, \
+            table.batch_writer(overwrite_by_pkeys=['series', 'bucket_start']) as batch:
+        for date, bar in iter_daily_bars(response):
+            if date >= before:
+                continue
+            if since is not None and date < since:
+                break
+            candle = bar_to_candle(ticker, date, bar)
+            batch.put_item(Item=candle)
+            if pack:
+                if month and date[:7] != oldest[:7]:
+                    batch.put_item(Item=packed.pack_month(ticker, month))
+                    month = []
+                month.append(candle)
+            written += 1
+            oldest = date
+        if pack and month and since is None:
+            batch.put_item(Item=packed.pack_month(ticker, month))
+
+    if pack and month and since is not None:
+        # The oldest month may have days before `since`, which are in the table
+        packed.repack_month(table, ticker, packed.month_start(month[0]['bucket_start']))
+    put_metric('history.backfill', 'Days', written)
+    return written, oldest
@@ -0,0 +1,197 @@
+"""Buffered CloudWatch Embedded Metric Format (EMF) metrics for the stock handlers.
+
+Backend calls record latency, consumed capacity, retries, payload bytes and
+cache hits into an in-memory buffer. `metered` flushes the buffer once at the
+end of each invocation as one EMF JSON log line per operation, with the
+`Function` and `Operation` dimensions. Latencies are emitted as value arrays
+so CloudWatch can build per-operation percentiles from them.
+
+Set STOCK_METRICS=0 to disable metrics entirely.
+"""
+import json
+import os
+import threading
+import time
+from functools import wraps
+
+from stock_common import profiling
+
+NAMESPACE = os.environ.get('STOCK_METRICS_NAMESPACE', 'StockTracker')
+
+# EMF accepts at most 100 values per metric in a single log line
+MAX_VALUES_PER_LINE = 100
+
+UNITS = {
+    'Latency': 'Milliseconds',
+    'ConsumedCapacity': 'Count',
+    'Retries': 'Count',
+    'RequestBytes': 'Bytes',
+    'ResponseBytes': 'Bytes',
+    'Errors': 'Count',
+    'CacheHit': 'Count',
+    'CacheMiss': 'Count',
+    'Coalesced': 'Count',
+    'Throttles': 'Count',
+    'Deferred': 'Count',
+    'AlertsTriggered': 'Count',
+    'Timeouts': 'Count',
+    'Hedged': 'Count',
+    'HedgeWins': 'Count',
+    'Fallbacks': 'Count',
+    'CircuitOpen': 'Count',
+}
+
+_enabled = os.environ.get('STOCK_METRICS', '1').lower() not in ('0', 'false', 'no')
+_lock = threading.Lock()
+
+# operation -> metric name -> list of recorded values
+_buffer = {}
+_function_name = os.environ.get('AWS_LAMBDA_FUNCTION_NAME', 'local')
+
+
+# Whether metrics are collected in this container
+def enabled():
+    return _enabled
+
+
+# Record one value for a metric of an operation
+def put(operation, name, value):
+    if not _enabled:
+        return
+    with _lock:
+        _buffer.setdefault(operation, {}).setdefault(name, []).append(value)
+
+
+# Record a cache lookup outcome for an operation
+def cache_result(operation, hit):
+    put(operation, 'CacheHit' if hit else 'CacheMiss', 1)
+
+
+# Context manager timing a backend call, e.g. `with timed('alphavantage.GLOBAL_QUOTE'):`
+class timed:
+    __slots__ = ('operation', 'started')
+
+    def __init__(self, operation):
+        self.operation = operation
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        elapsed = time.perf_counter() - self.started
+        profiling.record(self.operation, elapsed)
+        put(self.operation, 'Latency', elapsed * 1000)
+        if exc_type is not None:
+            put(self.operation, 'Errors', 1)
+        return False
+
+
+# Build the EMF documents for everything buffered so far
+def _emf_documents(function_name, buffer):
+    timestamp = int(time.time() * 1000)
+    for operation, values in sorted(buffer.items()):
+        longest = max(len(v) for v in values.values())
+        for start in range(0, longest, MAX_VALUES_PER_LINE):
+            document = {
+                '_aws': {
+                    'Timestamp': timestamp,
+                    'CloudWatchMetrics': [{
+                        'Namespace': NAMESPACE,
+                        'Dimensions': [['Function', 'Operation']],
+                        'Metrics': [],
+                    }],
+                },
+                'Function': function_name,
+                'Operation': operation,
+            }
+            definitions = document['_aws']['CloudWatchMetrics'][0]['Metrics']
+            for name, recorded in sorted(values.items()):
+                chunk = recorded[start:start + MAX_VALUES_PER_LINE]
+                if not chunk:
+                    continue
+                definitions.append({'Name': name, 'Unit': UNITS.get(name, 'None')})
+                document[name] = chunk if len(chunk) > 1 else chunk[0]
+            yield document
+
+
+# Emit everything buffered as EMF log lines and reset the buffer
+def flush():
+    global _buffer
+    with _lock:
+        buffer, _buffer = _buffer, {}
+    for document in _emf_documents(_function_name, buffer):
+        print(json.dumps(document))
+
+
+# Wrap a lambda_handler so its metrics are flushed once per invocation
+def metered(handler):
+    if not _enabled:
+        return handler
+
+    @wraps(handler)
+    def wrapper(event, context):
+        global _function_name
+        _function_name = getattr(context, 'function_name', None) or _function_name
+        try:
+            return handler(event, context)
+        finally:
+            flush()
+
+    return wrapper
+
+
+# Sum the capacity units from a single or list-valued ConsumedCapacity field
+def capacity_units(consumed):
+    if isinstance(consumed, dict):
+        consumed = [consumed]
+    return sum(float(entry.get('CapacityUnits', 0)) for entry in consumed or [])
+
+
+# Register boto3 event hooks that meter every API call made through a client
+def instrument_client(client):
+    if not _enabled:
+        return client
+
+    service = client.meta.service_model.service_name
+
+    def provide_params(params, model, context, **kwargs):
+        context['metrics_call'] = [f'{service}.{model.name}', time.perf_counter(), None]
+        # Ask DynamoDB to report consumed capacity on every call that supports it
+        if model.input_shape is not None and 'ReturnConsumedCapacity' in model.input_shape.members:
+            params.setdefault('ReturnConsumedCapacity', 'TOTAL')
+
+    def before_call(params, context, **kwargs):
+        call = context.get('metrics_call')
+        if call is not None:
+            call[2] = len(params.get('body') or b'')
+
+    def after_call(http_response, parsed, context, **kwargs):
+        call = context.pop('metrics_call', None)
+        if call is None:
+            return
+        operation, started, request_bytes = call
+        put(operation, 'Latency', (time.perf_counter() - started) * 1000)
+        if request_bytes is not None:
+            put(operation, 'RequestBytes', request_bytes)
+        content = getattr(http_response, 'content', None)
+        if content is not None:
+            put(operation, 'ResponseBytes', len(content))
+        put(operation, 'Retries', parsed.get('ResponseMetadata', {}).get('RetryAttempts', 0))
+        if 'ConsumedCapacity' in parsed:
+            put(operation, 'ConsumedCapacity', capacity_units(parsed['ConsumedCapacity']))
+        if 'Error' in parsed:
+            put(operation, 'Errors', 1)
+
+    def after_call_error(context, **kwargs):
+        call = context.pop('metrics_call', None)
+        if call is not None:
+            put(call[0], 'Latency', (time.perf_counter() - call[1]) * 1000)
+            put(call[0], 'Errors', 1)
+
+    events = client.meta.events
+    events.register(f'provide-client-params.{service}', provide_params, unique_id='stock-metrics-params')
+    events.register(f'before-call.{service}', before_call, unique_id='stock-metrics-before-call')
+    events.register(f'after-call.{service}', after_call, unique_id='stock-metrics-after-call')
+    events.register(f'after-call-error.{service}', after_call_error, unique_id='stock-metrics-after-call-error')
+    return client
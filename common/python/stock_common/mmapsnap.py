@@ -0,0 +1,214 @@
+"""Memory-mapped read snapshot of the stocks table.
+
+The hourly `ExportSnapshotFunction` run writes the whole table as one file,
+from the same scan as the columnar snapshot (format "mmap" writes only this
+file). The file has three parts:
+
+- a header: magic, version, ticker width, row count, build time, and the
+  delta-sync sequence number (`stock_common.changes`) read before the scan;
+- an index of fixed-width records sorted by ticker: the ticker NUL-padded to
+  the header's width, then the offset and length of the item in the heap;
+- a heap with each item as compact JSON.
+
+A container downloads the file to /tmp once and maps it. Lookups
+binary-search the index in place, a ticker prefix is one index range, and
+listing joins the heap slices straight into the response body. No item is
+decoded unless a caller needs its values. The snapshot is only used while it
+is younger than STOCK_SNAPSHOT_MAX_AGE_SECONDS; after that the readers go
+back to DynamoDB until a newer one has been downloaded.
+"""
+import json
+import mmap
+import os
+import shutil
+import struct
+import threading
+import time
+from decimal import Decimal
+
+import boto3
+
+from stock_common.metrics import put as put_metric, timed
+
+MAGIC = b'STKSNAP1'
+VERSION = 1
+SNAPSHOT_NAME = 'stocks.snap'
+
+# magic, version, ticker width, rows, created_at, seq
+_HEADER = struct.Struct('<8sHHIQQ')
+# heap offset and length, following the ticker in each index record
+_REF = struct.Struct('<QI')
+
+# s3://bucket/key or a local path; unset disables snapshot reads
+SNAPSHOT_URI = os.environ.get('STOCK_SNAPSHOT_URI')
+# An hour between builds plus the time a paced scan takes
+MAX_AGE_SECONDS = float(os.environ.get('STOCK_SNAPSHOT_MAX_AGE_SECONDS', '4500'))
+# How often a container looks for a newer snapshot once its copy is stale
+CHECK_SECONDS = float(os.environ.get('STOCK_SNAPSHOT_CHECK_SECONDS', '60'))
+LOCAL_PATH = os.path.join('/tmp', SNAPSHOT_NAME)
+
+
+class SnapshotError(ValueError):
+    pass
+
+
+def _item_json(item):
+    def convert(value):
+        if isinstance(value, Decimal):
+            return int(value) if value % 1 == 0 else float(value)
+        if isinstance(value, (set, frozenset)):
+            return sorted(value)
+        raise TypeError(f'Cannot encode {type(value).__name__}')
+    return json.dumps(item, separators=(',', ':'), default=convert).encode('utf-8')
+
+
+# The snapshot file for a list of stock items
+def build(items, seq, created_at=None):
+    items = sorted(items, key=lambda item: item['ticker'].encode('utf-8'))
+    tickers = [item['ticker'].encode('utf-8') for item in items]
+    width = max([8] + [len(ticker) for ticker in tickers])
+    width += -width % 8
+
+    heap = bytearray()
+    index = bytearray()
+    for ticker, item in zip(tickers, items):
+        data = _item_json(item)
+        index += struct.pack(f'<{width}s', ticker) + _REF.pack(len(heap), len(data))
+        heap += data
+
+    header = _HEADER.pack(MAGIC, VERSION, width, len(items), int(created_at or time.time()), int(seq))
+    return header + bytes(index) + bytes(heap)
+
+
+class StockSnapshot:
+    """A snapshot file mapped read-only"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as snapshot:
+            self._map = mmap.mmap(snapshot.fileno(), 0, access=mmap.ACCESS_READ)
+        if len(self._map) < _HEADER.size:
+            raise SnapshotError('Truncated snapshot')
+        magic, version, self.width, self.count, self.created_at, self.seq = _HEADER.unpack_from(self._map)
+        if magic != MAGIC or version != VERSION:
+            raise SnapshotError('Not a stock snapshot')
+        self._record = self.width + _REF.size
+        self._heap = _HEADER.size + self.count * self._record
+        self._view = memoryview(self._map)
+
+    def __len__(self):
+        return self.count
+
+    def age(self, now=None):
+        return (time.time() if now is None else now) - self.created_at
+
+    # The padded index key of record i
+    def _ticker_key(self, i):
+        offset = _HEADER.size + i * self._record
+        return self._map[offset:offset + self.width]
+
+    def ticker_at(self, i):
+        return self._ticker_key(i).rstrip(b'\0').decode('utf-8')
+
+    # First index whose ticker is not below the padded key
+    def _lower_bound(self, key):
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._ticker_key(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        return lo
+
+    # The item's JSON in the heap, without copying it
+    def item_json(self, i):
+        offset, length = _REF.unpack_from(self._map, _HEADER.size + i * self._record + self.width)
+        start = self._heap + offset
+        return self._view[start:start + length]
+
+    # The stock item for a ticker, with numbers as Decimal like DynamoDB
+    # returns them, or None
+    def get(self, ticker):
+        encoded = ticker.encode('utf-8')
+        if len(encoded) > self.width:
+            return None
+        key = encoded.ljust(self.width, b'\0')
+        i = self._lower_bound(key)
+        if i < self.count and self._ticker_key(i) == key:
+            return json.loads(bytes(self.item_json(i)), parse_float=Decimal, parse_int=Decimal)
+        return None
+
+    # Index range [start, end) of the tickers starting with prefix. UTF-8
+    # never contains 0xff, so the prefix padded with it sorts after them all.
+    def prefix_range(self, prefix):
+        encoded = prefix.encode('utf-8')
+        if len(encoded) > self.width:
+            return 0, 0
+        return (self._lower_bound(encoded.ljust(self.width, b'\0')),
+                self._lower_bound(encoded.ljust(self.width, b'\xff')))
+
+    # JSON array of the items in [start, end), joined from the heap slices
+    def items_json(self, start=0, end=None):
+        end = self.count if end is None else end
+        return b'[' + b','.join(self.item_json(i) for i in range(start, end)) + b']'
+
+
+class SnapshotSource:
+    """The newest snapshot a container has, downloaded and mapped on demand"""
+
+    def __init__(self, uri, local_path=LOCAL_PATH, max_age=MAX_AGE_SECONDS, check_seconds=CHECK_SECONDS,
+                 clock=time.time):
+        self.uri = uri
+        self.local_path = local_path
+        self.max_age = max_age
+        self.check_seconds = check_seconds
+        self.clock = clock
+        self._snapshot = None
+        self._checked_at = None
+        self._lock = threading.Lock()
+
+    # A snapshot younger than max_age, or None when DynamoDB must be read
+    def current(self):
+        snapshot = self._snapshot
+        now = self.clock()
+        if snapshot is not None and snapshot.age(now) <= self.max_age:
+            return snapshot
+        with self._lock:
+            if self._checked_at is None or now - self._checked_at >= self.check_seconds:
+                self._checked_at = now
+                try:
+                    self._snapshot = self._load()
+                except Exception as e:
+                    # Keep serving from DynamoDB until the next check
+                    print(f'Stock snapshot unavailable: {e}')
+            snapshot = self._snapshot
+        if snapshot is not None and snapshot.age(now) <= self.max_age:
+            return snapshot
+        put_metric('stocks.snapshot', 'CacheMiss', 1)
+        return None
+
+    # Fetch the snapshot to local disk (a new file, so mapped readers keep the old one) and map it
+    def _load(self):
+        if not self.uri.startswith('s3://'):
+            return StockSnapshot(self.uri)
+        bucket, _, key = self.uri[len('s3://'):].partition('/')
+        partial = f'{self.local_path}.{os.getpid()}.{threading.get_ident()}'
+        with timed('s3.GetObject'):
+            response = boto3.client('s3').get_object(Bucket=bucket, Key=key)
+            with open(partial, 'wb') as local:
+                shutil.copyfileobj(response['Body'], local, 1 << 20)
+        os.replace(partial, self.local_path)
+        return StockSnapshot(self.local_path)
+
+
+_sources = {}
+
+
+# The shared source for STOCK_SNAPSHOT_URI, or None when snapshots are off
+def default_source():
+    if not SNAPSHOT_URI:
+        return None
+    source = _sources.get(SNAPSHOT_URI)
+    if source is None:
+        source = _sources[SNAPSHOT_URI] = SnapshotSource(SNAPSHOT_URI)
+    return source
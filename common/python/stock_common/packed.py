@@ -0,0 +1,209 @@
+"""Packed monthly daily history.
+
+Daily history stored as one `1d` candle item per day costs a read unit per
+day: a year-long chart is about 250 item reads. The packed format keeps one
+item per ticker-month in the candles table instead (series
+`<ticker>#1d-packed`, bucket_start = the first of the month, UTC), holding
+the month's daily candles as binary columns:
+
+- time, volume and ticks: delta-encoded little-endian int64 (`array('q')`),
+  ticks 0 for a candle without ticks (a backfilled day);
+- open, high, low and close: delta-encoded int64 in units of 1/PRICE_SCALE.
+  Deltas of doubles do not round-trip exactly, fixed-point deltas do.
+
+A month is about 1.3 KB, one read unit, so a year is about 12 reads.
+`unpack` decodes an item with NumPy (`frombuffer` + `cumsum`) into arrays
+without creating a Python object per value. The packed months are written by
+the history backfill and lag the live `1d` candles by up to a day;
+`read_daily` tops them up from the `1d` series after the newest packed day.
+"""
+import datetime
+import os
+import sys
+from array import array
+from decimal import Decimal
+
+from stock_common.candles import query_series, series_key
+
+try:
+    import numpy as np
+except ImportError:  # Packing works without NumPy; decoding needs it
+    np = None
+
+PACKED_RESOLUTION = '1d-packed'
+# Version 2 added the ticks column; version 1 months read as 0 ticks
+FORMAT_VERSION = 2
+PRICE_SCALE = 10000
+
+PRICE_COLUMNS = ('open', 'high', 'low', 'close')
+COLUMNS = ('bucket_start',) + PRICE_COLUMNS + ('volume', 'ticks')
+
+# Item attribute holding each column's blob
+BLOB_ATTRIBUTES = {'bucket_start': 'time', 'open': 'open', 'high': 'high', 'low': 'low', 'close': 'close',
+                   'volume': 'volume', 'ticks': 'ticks'}
+
+# Write packed months alongside the daily candles, and read 1d history from them
+ENABLED = os.environ.get('PACKED_HISTORY', '1') != '0'
+
+# Trading days in the longest month, bounding how many packed days a
+# range read can discard
+MAX_MONTH_DAYS = 23
+
+
+def month_start(at):
+    day = datetime.datetime.fromtimestamp(int(at), datetime.timezone.utc)
+    return int(day.replace(day=1, hour=0, minute=0, second=0).timestamp())
+
+
+def next_month_start(start):
+    day = datetime.datetime.fromtimestamp(start, datetime.timezone.utc)
+    if day.month == 12:
+        return int(day.replace(year=day.year + 1, month=1).timestamp())
+    return int(day.replace(month=day.month + 1).timestamp())
+
+
+def _encode(values):
+    deltas = array('q', values[:1])
+    deltas.extend(current - previous for previous, current in zip(values, values[1:]))
+    if sys.byteorder == 'big':
+        deltas.byteswap()
+    return deltas.tobytes()
+
+
+def _scaled(value):
+    return int(round(Decimal(str(value)) * PRICE_SCALE))
+
+
+# The packed item for one month of daily candles (dicts with bucket_start,
+# open, high, low, close and optionally volume and ticks, as stored in the
+# 1d series)
+def pack_month(ticker, candles):
+    candles = sorted(candles, key=lambda candle: int(candle['bucket_start']))
+    start = month_start(candles[0]['bucket_start'])
+    item = {
+        'series': series_key(ticker, PACKED_RESOLUTION),
+        'bucket_start': start,
+        'format': FORMAT_VERSION,
+        'count': len(candles),
+        'time': _encode([int(candle['bucket_start']) for candle in candles]),
+        'volume': _encode([int(candle.get('volume') or 0) for candle in candles]),
+        'ticks': _encode([int(candle.get('ticks') or 0) for candle in candles]),
+    }
+    for column in PRICE_COLUMNS:
+        item[column] = _encode([_scaled(candle[column]) for candle in candles])
+    return item
+
+
+# {column: NumPy array} for a packed item: int64 bucket_start, volume and
+# ticks, float64 prices
+def unpack(item):
+    count = int(item['count'])
+    columns = {}
+    for column, attribute in BLOB_ATTRIBUTES.items():
+        if attribute not in item:
+            # A column added after the item was packed
+            columns[column] = np.zeros(count, dtype='i8')
+            continue
+        values = np.frombuffer(bytes(item[attribute]), dtype='<i8', count=count).cumsum()
+        columns[column] = values / PRICE_SCALE if column in PRICE_COLUMNS else values
+    return columns
+
+
+# Concatenate unpacked months (oldest first) into one set of columns
+def concat(parts):
+    if not parts:
+        return {column: np.array([], dtype='f8' if column in PRICE_COLUMNS else 'i8') for column in COLUMNS}
+    return {column: np.concatenate([part[column] for part in parts]) for column in COLUMNS}
+
+
+# Columns for 1d candle items, such as the unpacked tail of recent days
+def from_candles(candles):
+    columns = {}
+    for column in COLUMNS:
+        if column in PRICE_COLUMNS:
+            columns[column] = np.array([float(candle[column]) for candle in candles], dtype='f8')
+        else:
+            columns[column] = np.array([int(candle.get(column) or 0) for candle in candles], dtype='i8')
+    return columns
+
+
+# Pack every month present in `candles` and write one item per month
+def write_months(table, ticker, candles):
+    months = {}
+    for candle in candles:
+        months.setdefault(month_start(candle['bucket_start']), []).append(candle)
+    with table.batch_writer(overwrite_by_pkeys=['series', 'bucket_start']) as batch:
+        for month in months.values():
+            batch.put_item(Item=pack_month(ticker, month))
+    return len(months)
+
+
+# Rebuild one month's packed item from the 1d candles in the table
+def repack_month(table, ticker, start):
+    candles = query_series(table, series_key(ticker, '1d'), start, next_month_start(start) - 1, limit=64,
+                           fields=COLUMNS)
+    if candles:
+        table.put_item(Item=pack_month(ticker, candles))
+
+
+# Packed items overlapping [start, end], oldest first. Reading stops once
+# `limit` days are certain to be covered.
+def _query_months(table, ticker, start, end, limit):
+    series = series_key(ticker, PACKED_RESOLUTION)
+    months = (limit + MAX_MONTH_DAYS - 1) // MAX_MONTH_DAYS + 2
+    items = []
+    while True:
+        page = query_series(table, series, month_start(start) if start is not None else None, end, months)
+        if start is None:
+            items = [item for item in page if not items or item['bucket_start'] < items[0]['bucket_start']] + items
+        else:
+            items = items + [item for item in page if not items or item['bucket_start'] > items[-1]['bucket_start']]
+        days = sum(int(item['count']) for item in items)
+        if len(page) < months or days >= limit + 2 * MAX_MONTH_DAYS:
+            return items
+        # Continue past the months read so far
+        if start is None:
+            end = int(items[0]['bucket_start']) - 1
+        else:
+            start = next_month_start(int(items[-1]['bucket_start']))
+
+
+# Daily candles in [start, end] as {column: NumPy array}, oldest first and at
+# most `limit` days: the first `limit` from `start`, or the newest `limit`
+# without it. Packed months are topped up with the 1d candles after them.
+def read_daily(table, ticker, start=None, end=None, limit=1000):
+    parts = [unpack(item) for item in _query_months(table, ticker, start, end, limit)]
+    packed = concat(parts)
+    newest_packed = int(packed['bucket_start'][-1]) if len(packed['bucket_start']) else None
+    in_range = np.ones(len(packed['bucket_start']), dtype=bool)
+    if start is not None:
+        in_range &= packed['bucket_start'] >= start
+    if end is not None:
+        in_range &= packed['bucket_start'] <= end
+    packed = {column: values[in_range] for column, values in packed.items()}
+
+    daily = series_key(ticker, '1d')
+    if start is not None and len(packed['bucket_start']) >= limit:
+        # The packed days already hold the first `limit` from `start`
+        tail = []
+    elif newest_packed is not None and end is not None and newest_packed >= end:
+        # `end` falls inside a packed month, so no day after it is missing
+        tail = []
+    elif newest_packed is not None:
+        # Only days after every packed month read are missing, and from
+        # `start` only as many as the packed days leave short of `limit`
+        if start is None:
+            tail = query_series(table, daily, newest_packed + 1, end, limit, COLUMNS)
+        else:
+            tail = query_series(table, daily, max(newest_packed + 1, start), end,
+                                limit - len(packed['bucket_start']), COLUMNS)
+        if start is None and len(tail) == limit:
+            # Packing has fallen far behind; the 1d series alone has the newest days
+            packed, tail = concat([]), query_series(table, daily, None, end, limit, COLUMNS)
+    else:
+        tail = query_series(table, daily, start, end, limit, COLUMNS)
+
+    columns = concat([packed, from_candles(tail)])
+    if start is None:
+        return {column: values[-limit:] for column, values in columns.items()}
+    return {column: values[:limit] for column, values in columns.items()}
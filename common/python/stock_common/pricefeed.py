@@ -0,0 +1,101 @@
+"""In-process fan-out of quote updates to streaming subscribers.
+
+`PriceHub.publish` is fed from the stocks table's change stream (the same
+write path `update_stock` and the scheduled refresher use) and hands each
+changed quote to the subscribers of its ticker. Identical updates for a
+ticker are dropped at the hub. Each `Subscription` keeps at most one pending
+quote per ticker, so a slow consumer coalesces to the latest value instead of
+growing a backlog: memory is bounded by the subscribed tickers, and the
+writer blocked on the slow socket is the only backpressure needed.
+"""
+import threading
+from collections import OrderedDict
+
+from stock_common import metrics
+
+# Attributes that make a quote update visible to subscribers
+QUOTE_FIELDS = ('price', 'volume', 'change', 'change_percent', 'previous_close', 'latest_trading_day')
+
+
+def quote_version(quote):
+    return tuple(quote.get(field) for field in QUOTE_FIELDS)
+
+
+class Subscription:
+
+    def __init__(self, tickers):
+        self.tickers = frozenset(tickers)
+        self.closed = False
+        self._pending = OrderedDict()
+        self._condition = threading.Condition()
+
+    # Queue a quote, replacing any unsent quote for the same ticker
+    def offer(self, ticker, quote):
+        with self._condition:
+            if ticker in self._pending:
+                metrics.put('pricefeed.publish', 'Coalesced', 1)
+            self._pending[ticker] = quote
+            self._pending.move_to_end(ticker)
+            self._condition.notify()
+
+    # Wait up to timeout seconds for quotes; returns [(ticker, quote)], possibly empty
+    def next_batch(self, timeout):
+        with self._condition:
+            if not self._pending and not self.closed:
+                self._condition.wait(timeout)
+            batch = list(self._pending.items())
+            self._pending.clear()
+            return batch
+
+    def close(self):
+        with self._condition:
+            self.closed = True
+            self._condition.notify_all()
+
+
+class PriceHub:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        # ticker -> set of subscriptions
+        self._subscribers = {}
+        # ticker -> (version, quote) last published
+        self._latest = {}
+
+    # Subscribe to tickers; the latest known quote of each is queued straight away
+    def subscribe(self, tickers):
+        subscription = Subscription(tickers)
+        with self._lock:
+            for ticker in subscription.tickers:
+                self._subscribers.setdefault(ticker, set()).add(subscription)
+            latest = [(t, self._latest[t][1]) for t in subscription.tickers if t in self._latest]
+        for ticker, quote in latest:
+            subscription.offer(ticker, quote)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        subscription.close()
+        with self._lock:
+            for ticker in subscription.tickers:
+                subscribers = self._subscribers.get(ticker)
+                if subscribers is not None:
+                    subscribers.discard(subscription)
+                    if not subscribers:
+                        del self._subscribers[ticker]
+
+    # Publish a ticker's quote; returns the number of subscribers it reached
+    def publish(self, ticker, quote):
+        version = quote_version(quote)
+        with self._lock:
+            previous = self._latest.get(ticker)
+            if previous is not None and previous[0] == version:
+                return 0
+            self._latest[ticker] = (version, quote)
+            subscribers = list(self._subscribers.get(ticker, ()))
+        for subscription in subscribers:
+            subscription.offer(ticker, quote)
+        return len(subscribers)
+
+    def subscriber_count(self):
+        with self._lock:
+            return len({s for subscribers in self._subscribers.values() for s in subscribers})
@@ -0,0 +1,253 @@
+"""Opt-in per-invocation profiling for the stock Lambda handlers.
+
+Profiling is controlled through environment variables:
+
+- STOCK_PROFILE=1                   profile every invocation
+- STOCK_PROFILE_SAMPLE_RATE=0.05    profile a random fraction of invocations
+- STOCK_PROFILE_MODE=spans|cprofile|sample
+                                    spans only (default), spans plus cProfile,
+                                    or spans plus a wall-clock stack sampler
+- STOCK_PROFILE_OUTPUT=log|tmp      embed the profile summary in the log line
+                                    (default) or also write stats to /tmp
+
+When neither STOCK_PROFILE nor STOCK_PROFILE_SAMPLE_RATE is set, `profiled`
+returns the handler unchanged and `span` hands back a shared no-op context
+manager, so disabled profiling costs nothing beyond a global lookup.
+"""
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import nullcontext
+from functools import wraps
+
+_NULL_SPAN = nullcontext()
+
+# Profile of the invocation running on each thread, if sampled. Kept per
+# thread so concurrent requests on the threaded dev server never record spans
+# into each other's profile.
+_local = threading.local()
+
+
+def _active():
+    return getattr(_local, 'profile', None)
+
+
+# Read the profiling configuration from the environment
+def _load_config():
+    always = os.environ.get('STOCK_PROFILE', '').lower() in ('1', 'true', 'yes')
+    try:
+        sample_rate = float(os.environ.get('STOCK_PROFILE_SAMPLE_RATE', '0'))
+    except ValueError:
+        sample_rate = 0.0
+    return {
+        'sample_rate': 1.0 if always else max(0.0, min(sample_rate, 1.0)),
+        'mode': os.environ.get('STOCK_PROFILE_MODE', 'spans').lower(),
+        'output': os.environ.get('STOCK_PROFILE_OUTPUT', 'log').lower(),
+        'top': int(os.environ.get('STOCK_PROFILE_TOP', '15')),
+        'interval': float(os.environ.get('STOCK_PROFILE_INTERVAL_MS', '5')) / 1000.0,
+        'directory': os.environ.get('STOCK_PROFILE_DIR', '/tmp'),
+    }
+
+
+_config = _load_config()
+
+
+# Whether profiling is configured at all for this container
+def enabled():
+    return _config['sample_rate'] > 0.0
+
+
+# Wall-clock span recorder for a single invocation
+class InvocationProfile:
+
+    def __init__(self, function_name, request_id):
+        self.function_name = function_name
+        self.request_id = request_id
+        self.spans = {}
+        self.started = time.perf_counter()
+
+    def record(self, name, elapsed):
+        entry = self.spans.get(name)
+        if entry is None:
+            self.spans[name] = [1, elapsed, elapsed]
+        else:
+            entry[0] += 1
+            entry[1] += elapsed
+            if elapsed > entry[2]:
+                entry[2] = elapsed
+
+    def summary(self):
+        return {
+            'function': self.function_name,
+            'request_id': self.request_id,
+            'total_ms': round((time.perf_counter() - self.started) * 1000, 3),
+            'spans': {
+                name: {
+                    'count': count,
+                    'total_ms': round(total * 1000, 3),
+                    'max_ms': round(longest * 1000, 3),
+                }
+                for name, (count, total, longest) in self.spans.items()
+            },
+        }
+
+
+# Context manager timing one span into the active invocation profile
+class _Span:
+    __slots__ = ('profile', 'name', 'started')
+
+    def __init__(self, profile, name):
+        self.profile = profile
+        self.name = name
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profile.record(self.name, time.perf_counter() - self.started)
+        return False
+
+
+# Time a block of handler code, e.g. `with span('parse'):`
+def span(name):
+    profile = _active()
+    if profile is None:
+        return _NULL_SPAN
+    return _Span(profile, name)
+
+
+# Record an externally timed span (used by the boto3 event hooks)
+def record(name, elapsed):
+    profile = _active()
+    if profile is not None:
+        profile.record(name, elapsed)
+
+
+# Wall-clock stack sampler that runs beside the handler thread
+class _StackSampler(threading.Thread):
+
+    def __init__(self, target_thread_id, interval):
+        super().__init__(daemon=True)
+        self.target_thread_id = target_thread_id
+        self.interval = interval
+        self.samples = Counter()
+        self.total = 0
+        self._stop_event = threading.Event()
+
+    def run(self):
+        while not self._stop_event.wait(self.interval):
+            frame = sys._current_frames().get(self.target_thread_id)
+            if frame is None:
+                continue
+            code = frame.f_code
+            self.samples[f'{code.co_filename}:{frame.f_lineno}({code.co_name})'] += 1
+            self.total += 1
+
+    def stop(self):
+        self._stop_event.set()
+        self.join()
+
+    def summary(self, top):
+        return {
+            'samples': self.total,
+            'interval_ms': self.interval * 1000,
+            'top': [
+                {'frame': frame, 'samples': count, 'share': round(count / self.total, 4)}
+                for frame, count in self.samples.most_common(top)
+            ],
+        }
+
+
+# Summarise a cProfile run as the top functions by cumulative time
+def _cprofile_summary(profiler, top):
+    stream = io.StringIO()
+    stats = pstats.Stats(profiler, stream=stream)
+    stats.sort_stats('cumulative')
+    rows = []
+    for func in stats.fcn_list[:top]:
+        primitive_calls, total_calls, total_time, cumulative_time, _ = stats.stats[func]
+        filename, line, name = func
+        rows.append({
+            'function': f'{os.path.basename(filename)}:{line}({name})',
+            'calls': total_calls,
+            'tottime_ms': round(total_time * 1000, 3),
+            'cumtime_ms': round(cumulative_time * 1000, 3),
+        })
+    return rows
+
+
+# Wrap a lambda_handler with sampled per-invocation profiling
+def profiled(handler):
+    if not enabled():
+        return handler
+
+    @wraps(handler)
+    def wrapper(event, context):
+        if _active() is not None or random.random() >= _config['sample_rate']:
+            return handler(event, context)
+
+        function_name = getattr(context, 'function_name', None) \
+            or os.environ.get('AWS_LAMBDA_FUNCTION_NAME', handler.__module__)
+        request_id = getattr(context, 'aws_request_id', None)
+
+        profile = InvocationProfile(function_name, request_id)
+        profiler = None
+        sampler = None
+        if _config['mode'] == 'cprofile':
+            profiler = cProfile.Profile()
+        elif _config['mode'] == 'sample':
+            sampler = _StackSampler(threading.get_ident(), _config['interval'])
+            sampler.start()
+
+        _local.profile = profile
+        try:
+            if profiler is not None:
+                return profiler.runcall(handler, event, context)
+            return handler(event, context)
+        finally:
+            _local.profile = None
+            summary = profile.summary()
+            if sampler is not None:
+                sampler.stop()
+                summary['sampler'] = sampler.summary(_config['top'])
+            if profiler is not None:
+                summary['cprofile'] = _cprofile_summary(profiler, _config['top'])
+                if _config['output'] == 'tmp':
+                    path = os.path.join(
+                        _config['directory'],
+                        f'profile-{function_name}-{request_id or int(time.time() * 1000)}.pstats'
+                    )
+                    profiler.dump_stats(path)
+                    summary['stats_file'] = path
+            print(json.dumps({'profile': summary}))
+
+    return wrapper
+
+
+# Register boto3 event hooks that record one span per AWS API call
+def instrument_client(client):
+    if not enabled():
+        return client
+
+    service = client.meta.service_model.service_name
+
+    def provide_params(model, context, **kwargs):
+        context['profile_span'] = (f'{service}.{model.name}', time.perf_counter())
+
+    def after_call(context, **kwargs):
+        started = context.pop('profile_span', None)
+        if started is not None:
+            record(started[0], time.perf_counter() - started[1])
+
+    client.meta.events.register('provide-client-params', provide_params, unique_id='stock-profiling-params')
+    client.meta.events.register('after-call', after_call, unique_id='stock-profiling-after-call')
+    client.meta.events.register('after-call-error', after_call, unique_id='stock-profiling-after-call-error')
+    return client
@@ -0,0 +1,243 @@
+"""Fault-tolerant composition of quote providers.
+
+A quote provider is any object with `get_quote(ticker)` and
+`get_quotes(tickers)`, raising `QuoteError` on failure; `QuoteProvider` is
+the Alpha Vantage implementation. `HedgedProvider` combines a primary and a
+secondary provider:
+
+- each provider sits behind a `CircuitBreaker`, so an upstream that keeps
+  failing is skipped for a while instead of costing a timeout per call;
+- when the primary has not answered within its recent latency percentile
+  (QUOTE_HEDGE_PERCENTILE, p95 by default) the same request is sent to the
+  secondary, and the first good answer wins;
+- a primary failure falls back to the secondary straight away;
+- the whole call is bounded by QUOTE_DEADLINE_SECONDS, so a refresh takes at
+  most that long whatever the upstreams do. Calls still running when the
+  caller gives up finish in the background within their own timeout.
+
+`default_provider()` builds the provider the functions use: Alpha Vantage
+behind its breaker and the deadline, hedged with a second Alpha
+Vantage-compatible endpoint or API key when QUOTE_FALLBACK_BASE_URL or
+QUOTE_FALLBACK_API_KEY is set.
+"""
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from stock_common.metrics import put as put_metric
+from stock_common.quotes import (CallRateLimiter, DeadlineError, NotFoundError, QuoteError, QuoteProvider,
+                                  RateLimitError)
+
+DEADLINE_SECONDS = float(os.environ.get('QUOTE_DEADLINE_SECONDS', '8'))
+HEDGE_PERCENTILE = float(os.environ.get('QUOTE_HEDGE_PERCENTILE', '0.95'))
+# Hedge delay until enough primary latencies are known, and its lower bound
+HEDGE_AFTER_SECONDS = float(os.environ.get('QUOTE_HEDGE_AFTER_SECONDS', '1.5'))
+MIN_HEDGE_SECONDS = 0.05
+
+
+class CircuitBreaker:
+    """Opens after `failure_threshold` consecutive failures and lets one trial
+    call through once `reset_seconds` have passed (half-open)"""
+
+    def __init__(self, failure_threshold=5, reset_seconds=30.0, clock=time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self.opened_at is None:
+                return 'closed'
+            return 'half-open' if self.clock() - self.opened_at >= self.reset_seconds else 'open'
+
+    # Whether a call may go through now
+    def allow(self):
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self.clock() - self.opened_at < self.reset_seconds or self._trial:
+                return False
+            self._trial = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial or self.failures >= self.failure_threshold:
+                self.opened_at = self.clock()
+            self._trial = False
+
+
+class LatencyTracker:
+    """Percentiles over the most recent successful call latencies"""
+
+    def __init__(self, size=100, min_samples=20):
+        self.min_samples = min_samples
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def record(self, seconds):
+        with self._lock:
+            self._samples.append(seconds)
+
+    # The latency at fraction (0-1), or None until min_samples calls are known
+    def percentile(self, fraction):
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+class HedgedProvider:
+    """Primary and secondary provider with hedging, fallback and a deadline.
+    hedge=False only falls back on failure; deadline=None leaves each call
+    bounded by the providers' own timeouts. Without a secondary the primary
+    still gets its breaker and the deadline."""
+
+    def __init__(self, primary, secondary=None, deadline=DEADLINE_SECONDS, hedge_percentile=HEDGE_PERCENTILE,
+                 hedge_after=HEDGE_AFTER_SECONDS, hedge=True, breakers=None, workers=8):
+        self.primary = primary
+        self.secondary = secondary
+        self.deadline = deadline
+        self.hedge_percentile = hedge_percentile
+        self.hedge_after = hedge_after
+        self.hedge = hedge
+        self.breakers = breakers or {'primary': CircuitBreaker(), 'secondary': CircuitBreaker()}
+        self.latency = LatencyTracker()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='quote-hedge')
+
+    # Whether bulk quotes work, as the refresher's shard sizing asks the primary
+    @property
+    def bulk(self):
+        return self.primary.bulk
+
+    # Seconds to wait for the primary before hedging
+    def hedge_delay(self):
+        if not self.hedge:
+            return float('inf')
+        observed = self.latency.percentile(self.hedge_percentile)
+        return max(observed if observed is not None else self.hedge_after, MIN_HEDGE_SECONDS)
+
+    # `deadline` bounds the wait for a rate-limiter slot, see CallRateLimiter
+    def get_quote(self, ticker, deadline=None):
+        return self._call('get_quote', ticker, deadline)
+
+    def get_quotes(self, tickers, deadline=None):
+        return self._call('get_quotes', tickers, deadline)
+
+    # Run one provider call, recording the outcome on its breaker
+    def _attempt(self, role, method, argument, slot_deadline):
+        provider = getattr(self, role)
+        started = time.monotonic()
+        try:
+            result = getattr(provider, method)(argument, slot_deadline)
+        except NotFoundError:
+            # The upstream answered; the ticker just has no quote
+            self.breakers[role].record_success()
+            raise
+        except DeadlineError:
+            # The upstream was never called
+            raise
+        except Exception:
+            self.breakers[role].record_failure()
+            raise
+        self.breakers[role].record_success()
+        if role == 'primary':
+            self.latency.record(time.monotonic() - started)
+        return result
+
+    def _start(self, role, method, argument, slot_deadline, running):
+        if getattr(self, role) is None:
+            return False
+        if not self.breakers[role].allow():
+            put_metric(f'quotes.{role}', 'CircuitOpen', 1)
+            return False
+        running[self._executor.submit(self._attempt, role, method, argument, slot_deadline)] = role
+        return True
+
+    def _call(self, method, argument, slot_deadline=None):
+        deadline = time.monotonic() + (self.deadline if self.deadline is not None else float('inf'))
+        running = {}
+        errors = []
+
+        secondary_tried = not self._start('primary', method, argument, slot_deadline, running)
+        if secondary_tried:
+            self._start('secondary', method, argument, slot_deadline, running)
+        hedge_at = time.monotonic() + self.hedge_delay()
+
+        while running:
+            now = time.monotonic()
+            if now >= deadline:
+                break
+            wake = deadline if secondary_tried else min(hedge_at, deadline)
+            timeout = wake - now if wake != float('inf') else None
+            done, _ = wait(list(running), timeout=timeout, return_when=FIRST_COMPLETED)
+
+            for future in done:
+                role = running.pop(future)
+                try:
+                    result = future.result()
+                except NotFoundError:
+                    raise
+                except QuoteError as e:
+                    errors.append(e)
+                    continue
+                except Exception as e:
+                    errors.append(QuoteError(f'{role} provider failed: {e}'))
+                    continue
+                if role == 'secondary':
+                    put_metric(f'quotes.{method}', 'HedgeWins' if running else 'Fallbacks', 1)
+                return result
+
+            # Fall back when the primary failed, hedge when it is slower than usual
+            if not secondary_tried and (errors or time.monotonic() >= hedge_at):
+                secondary_tried = True
+                if self._start('secondary', method, argument, slot_deadline, running) and not errors:
+                    put_metric(f'quotes.{method}', 'Hedged', 1)
+
+        if running:
+            put_metric(f'quotes.{method}', 'Timeouts', 1)
+            raise QuoteError(f'No quote within {self.deadline:g}s')
+        # The refresher stops and requeues on a spent quota or a slot past its deadline
+        for error in errors:
+            if isinstance(error, (RateLimitError, DeadlineError)):
+                raise error
+        if errors:
+            raise errors[-1]
+        raise QuoteError('No quote provider is available')
+
+
+# The provider for the stock functions: Alpha Vantage behind a circuit breaker
+# and the deadline, hedged with a fallback endpoint or key when one is
+# configured. With a per-minute quota (the batch refresher) calls wait for
+# their rate-limiter slot, which is not upstream slowness, so there is no
+# deadline and the fallback is only used on failure. Each key gets its own limiter.
+def default_provider(calls_per_minute=None):
+    primary = QuoteProvider(limiter=CallRateLimiter(calls_per_minute) if calls_per_minute else None)
+
+    secondary = None
+    fallback_url = os.environ.get('QUOTE_FALLBACK_BASE_URL')
+    fallback_key = os.environ.get('QUOTE_FALLBACK_API_KEY')
+    if fallback_url or fallback_key:
+        limiter = primary.limiter
+        if fallback_key and calls_per_minute:
+            limiter = CallRateLimiter(calls_per_minute)
+        secondary = QuoteProvider(key=fallback_key or None, base_url=fallback_url or None, limiter=limiter)
+
+    if calls_per_minute:
+        return HedgedProvider(primary, secondary, deadline=None, hedge=False)
+    return HedgedProvider(primary, secondary)
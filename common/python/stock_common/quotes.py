@@ -0,0 +1,283 @@
+"""Alpha Vantage quote provider.
+
+`QuoteProvider` fetches quotes for many tickers with as few upstream calls as
+the API key allows: one REALTIME_BULK_QUOTES call per 100 symbols when the key
+has access to it, otherwise one GLOBAL_QUOTE call per symbol. Bulk rows are
+normalised to the GLOBAL_QUOTE shape so `quote_to_item` is the single mapping
+from a quote to the stock item attributes, and `store_quote` the single write.
+An optional `CallRateLimiter` keeps the provider inside the key's per-minute
+call quota when it is shared between threads. Every call is bounded by
+ALPHAVANTAGE_TIMEOUT_SECONDS; `stock_common.providers` adds hedging, fallback
+and circuit breaking on top.
+
+Set ALPHAVANTAGE_BASE_URL to point the provider at a local HTTP stub.
+"""
+import json
+import os
+import socket
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from contextlib import contextmanager
+from decimal import Decimal
+
+from stock_common.metrics import put as put_metric, timed
+from stock_common.profiling import span
+from stock_common.singleflight import LEASE_OWNER, LEASE_UNTIL
+
+BASE_URL = os.environ.get('ALPHAVANTAGE_BASE_URL', 'https://www.alphavantage.co/query')
+
+# Alpha Vantage calls per minute allowed for the key. RefreshStocksFunction
+# and BackfillHistoryFunction run at the same time on the same key and
+# neither's limiter sees the other's calls, so the backfill spends its own
+# budget and the refresher the rest.
+CALLS_PER_MINUTE = float(os.environ.get('ALPHAVANTAGE_CALLS_PER_MINUTE', '5'))
+BACKFILL_CALLS_PER_MINUTE = float(os.environ.get('ALPHAVANTAGE_BACKFILL_CALLS_PER_MINUTE', '1'))
+REFRESH_CALLS_PER_MINUTE = max(CALLS_PER_MINUTE - BACKFILL_CALLS_PER_MINUTE, 1.0)
+
+# Connect and read timeout of one upstream call
+TIMEOUT_SECONDS = float(os.environ.get('ALPHAVANTAGE_TIMEOUT_SECONDS', '5'))
+
+# Symbols accepted by a single REALTIME_BULK_QUOTES call
+BULK_BATCH_SIZE = 100
+
+# Stock item attribute -> GLOBAL_QUOTE field
+QUOTE_FIELDS = {
+    'price': '05. price',
+    'volume': '06. volume',
+    'latest_trading_day': '07. latest trading day',
+    'previous_close': '08. previous close',
+    'change': '09. change',
+    'change_percent': '10. change percent',
+}
+
+NUMERIC_FIELDS = ['price', 'volume', 'previous_close', 'change']
+
+# REALTIME_BULK_QUOTES field -> GLOBAL_QUOTE field
+BULK_FIELDS = {
+    'symbol': '01. symbol',
+    'open': '02. open',
+    'high': '03. high',
+    'low': '04. low',
+    'close': '05. price',
+    'volume': '06. volume',
+    'previous_close': '08. previous close',
+    'change': '09. change',
+    'change_percent': '10. change percent',
+}
+
+
+class QuoteError(Exception):
+    pass
+
+
+class RateLimitError(QuoteError):
+    pass
+
+
+# The upstream answered, but has no quote for the ticker
+class NotFoundError(QuoteError):
+    pass
+
+
+# The next rate-limiter slot falls after the caller's deadline; nothing was sent
+class DeadlineError(QuoteError):
+    pass
+
+
+def api_key():
+    key = os.environ.get('ALPHAVANTAGE_API_KEY')
+    if not key:
+        raise QuoteError('Alpha Vantage API key is not set in environment variables')
+    return key
+
+
+# Map an Alpha Vantage quote to stock item attributes
+def quote_to_item(ticker, quote):
+    item = {'ticker': ticker}
+    for attribute, field in QUOTE_FIELDS.items():
+        value = quote.get(field)
+        if value is None:
+            continue
+        # Convert numeric string values to Decimal
+        if attribute in NUMERIC_FIELDS and value:
+            value = Decimal(value)
+        item[attribute] = value
+    return item
+
+
+# Convert one REALTIME_BULK_QUOTES row to the GLOBAL_QUOTE shape
+def normalize_bulk_row(row):
+    quote = {BULK_FIELDS[k]: str(v) for k, v in row.items() if k in BULK_FIELDS and v not in (None, '')}
+    timestamp = row.get('timestamp')
+    if timestamp:
+        quote['07. latest trading day'] = str(timestamp)[:10]
+    change_percent = quote.get('10. change percent')
+    if change_percent and not change_percent.endswith('%'):
+        quote['10. change percent'] = change_percent + '%'
+    return quote
+
+
+# Write a quote's attributes to the stock item in place. Fields set at
+# creation (company name, sector, exchange) survive; refresh lease attributes
+# left on the item by older versions are dropped and refreshed_at is stamped.
+# `stamp` adds the delta-sync attributes from `changes.stamp`.
+# Returns (previous, current) item images, e.g. for alert evaluation.
+def store_quote(table, ticker, quote, stamp=None):
+    item = quote_to_item(ticker, quote)
+
+    values = {k: v for k, v in item.items() if k != 'ticker'}
+    values['refreshed_at'] = int(time.time())
+    values.update(stamp or {})
+
+    names = {f'#{k}': k for k in values}
+    names.update({'#lease_until': LEASE_UNTIL, '#lease_owner': LEASE_OWNER})
+
+    response = table.update_item(
+        Key={'ticker': ticker},
+        UpdateExpression='SET ' + ', '.join(f'#{k} = :{k}' for k in values) + ' REMOVE #lease_until, #lease_owner',
+        ExpressionAttributeNames=names,
+        ExpressionAttributeValues={f':{k}': v for k, v in values.items()},
+        ReturnValues='ALL_OLD'
+    )
+
+    # The update is atomic, so the old image plus our changes is the new image
+    previous = response.get('Attributes', {})
+    current = dict(previous, **item)
+    current.update(values)
+    current.pop(LEASE_UNTIL, None)
+    current.pop(LEASE_OWNER, None)
+    return previous, current
+
+
+# Spaces upstream calls evenly so threads sharing a key stay within its quota
+class CallRateLimiter:
+
+    def __init__(self, calls_per_minute):
+        self.interval = 60.0 / calls_per_minute
+        self.next_at = 0.0
+        self._lock = threading.Lock()
+
+    # Reserve the next call slot and sleep until it; returns the seconds waited.
+    # A slot after `deadline` (a time.monotonic() value) is left for other
+    # callers and None is returned instead.
+    def acquire(self, deadline=None):
+        with self._lock:
+            now = time.monotonic()
+            at = max(now, self.next_at)
+            if deadline is not None and at > deadline:
+                return None
+            self.next_at = at + self.interval
+        delay = at - now
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+
+class QuoteProvider:
+
+    # bulk=None probes REALTIME_BULK_QUOTES on first use and remembers the answer
+    def __init__(self, key=None, base_url=None, bulk=None, batch_size=BULK_BATCH_SIZE, limiter=None,
+                 timeout=TIMEOUT_SECONDS):
+        self.key = key
+        self.base_url = base_url or BASE_URL
+        self.timeout = timeout
+        self.bulk = bulk
+        self.batch_size = batch_size
+        self.limiter = limiter
+
+    # Call the API and hand back the open HTTP response, so large payloads can
+    # be read incrementally. Upstream failures raise QuoteError, and a call
+    # that could only start after `deadline` raises DeadlineError.
+    @contextmanager
+    def stream(self, function, symbol, deadline=None, **params):
+        if self.limiter is not None:
+            waited = self.limiter.acquire(deadline)
+            if waited is None:
+                raise DeadlineError(f'No {function} call slot before the deadline')
+            if waited:
+                put_metric('alphavantage.RateLimiter', 'Latency', waited * 1000)
+
+        params = dict({'function': function, 'symbol': symbol}, **params, apikey=self.key or api_key())
+        url = f'{self.base_url}?{urllib.parse.urlencode(params, safe=",")}'
+        operation = f'alphavantage.{function}'
+
+        try:
+            with timed(operation), urllib.request.urlopen(url, timeout=self.timeout) as response:
+                if response.status != 200:
+                    raise QuoteError(f'HTTP Error {response.status}')
+                yield response
+        except urllib.error.HTTPError as e:
+            raise QuoteError(f'HTTP Error: {e.code} {e.reason}')
+        except urllib.error.URLError as e:
+            raise QuoteError(f'URL Error: {e.reason}')
+        except (socket.timeout, TimeoutError):
+            put_metric(operation, 'Timeouts', 1)
+            raise QuoteError(f'Timed out after {self.timeout:g}s')
+
+    def _query(self, function, symbol, deadline=None):
+        with self.stream(function, symbol, deadline) as response:
+            body = response.read()
+        put_metric(f'alphavantage.{function}', 'ResponseBytes', len(body))
+
+        with span('parse'):
+            data = json.loads(body.decode('utf-8'))
+
+        # Check for API call frequency limit exceeded
+        if 'Note' in data:
+            raise RateLimitError('API call frequency exceeded. Please wait a minute and try again.')
+        return data
+
+    # Latest GLOBAL_QUOTE for one ticker
+    def get_quote(self, ticker, deadline=None):
+        data = self._query('GLOBAL_QUOTE', ticker, deadline)
+        if not data.get('Global Quote'):
+            raise NotFoundError('Invalid response from Alpha Vantage API or stock ticker not found')
+        return data['Global Quote']
+
+    # Quotes for up to batch_size tickers in one call, or None when the key
+    # has no access to the bulk endpoint
+    def get_bulk_quotes(self, tickers, deadline=None):
+        data = self._query('REALTIME_BULK_QUOTES', ','.join(tickers), deadline)
+        # Keys without access get an explanatory message (and demo rows for
+        # other symbols) instead of quotes
+        if 'Information' in data or 'message' in data or not isinstance(data.get('data'), list):
+            return None
+
+        wanted = set(tickers)
+        quotes = {}
+        for row in data['data']:
+            symbol = row.get('symbol')
+            if symbol in wanted:
+                quotes[symbol] = normalize_bulk_row(row)
+        return quotes
+
+    # Quotes for any number of tickers as {ticker: quote}. Tickers the API has
+    # no quote for are left out, so callers can report them individually.
+    def get_quotes(self, tickers, deadline=None):
+        tickers = list(dict.fromkeys(tickers))
+        quotes = {}
+        pending = tickers
+
+        if self.bulk is not False and len(tickers) > 1:
+            pending = []
+            for start in range(0, len(tickers), self.batch_size):
+                batch = tickers[start:start + self.batch_size]
+                batch_quotes = self.get_bulk_quotes(batch, deadline) if self.bulk is not False else None
+                if batch_quotes is None:
+                    self.bulk = False
+                    pending.extend(batch)
+                    continue
+                self.bulk = True
+                quotes.update(batch_quotes)
+
+        for ticker in pending:
+            try:
+                quotes[ticker] = self.get_quote(ticker, deadline)
+            except (RateLimitError, DeadlineError):
+                raise
+            except QuoteError as e:
+                print(f"Error fetching data for ticker {ticker}: {str(e)}")
+        return quotes
@@ -0,0 +1,89 @@
+"""Read counts for the scheduled refresher.
+
+`GET /stock/{ticker}` counts reads of found stocks in the container and
+flushes them at most every READ_COUNT_FLUSH_SECONDS, one `ADD` per ticker
+read since, to the read-counts table. A read never writes the stocks table,
+so it costs none of its write capacity and puts nothing on its stream.
+Counts not yet flushed when a container is retired are lost, which a
+ranking heuristic can afford.
+
+RefreshStocksFunction scans the counts to rank tickers and, after refreshing
+one, subtracts the count it ranked it by, so reads made meanwhile still count
+towards the next run.
+"""
+import os
+import threading
+import time
+from collections import Counter
+
+from botocore.exceptions import ClientError
+
+from stock_common.dynamo import get_table
+
+READ_COUNTS_TABLE = os.environ.get('READ_COUNTS_TABLE_NAME', 'stock-read-counts-table')
+FLUSH_SECONDS = float(os.environ.get('READ_COUNT_FLUSH_SECONDS', '60'))
+
+
+class ReadCounter:
+    """Per-container read counts, flushed to the read-counts table periodically"""
+
+    def __init__(self, table_name=READ_COUNTS_TABLE, flush_seconds=FLUSH_SECONDS, clock=time.monotonic):
+        self.table_name = table_name
+        self.flush_seconds = flush_seconds
+        self.clock = clock
+        self._counts = Counter()
+        self._flushed_at = clock()
+        self._lock = threading.Lock()
+
+    # Count one read; flushes every count once flush_seconds have passed
+    def record(self, resource_factory, ticker):
+        with self._lock:
+            self._counts[ticker] += 1
+            now = self.clock()
+            if now - self._flushed_at < self.flush_seconds:
+                return
+            pending, self._counts = self._counts, Counter()
+            self._flushed_at = now
+        self.flush(resource_factory, pending)
+
+    # Add counts to the table. Best effort: a failed write keeps its count for
+    # the next flush and never fails the read.
+    def flush(self, resource_factory, counts=None):
+        if counts is None:
+            with self._lock:
+                counts, self._counts = self._counts, Counter()
+        table = get_table(resource_factory, self.table_name)
+        for ticker, count in counts.items():
+            try:
+                table.update_item(
+                    Key={'ticker': ticker},
+                    UpdateExpression='ADD read_count :count',
+                    ExpressionAttributeValues={':count': count}
+                )
+            except ClientError as e:
+                print(e.response['Error']['Message'])
+                with self._lock:
+                    self._counts[ticker] += count
+
+
+# {ticker: reads since its last scheduled refresh}
+def load_read_counts(resource_factory, table_name=READ_COUNTS_TABLE):
+    table = get_table(resource_factory, table_name)
+    scan_args = {'ProjectionExpression': 'ticker, read_count'}
+    counts = {}
+    while True:
+        response = table.scan(**scan_args)
+        counts.update((item['ticker'], int(item.get('read_count', 0))) for item in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            return counts
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+
+# Take the reads a refresh has served off a ticker's count
+def subtract_reads(resource_factory, ticker, count, table_name=READ_COUNTS_TABLE):
+    if count:
+        get_table(resource_factory, table_name).update_item(
+            Key={'ticker': ticker},
+            UpdateExpression='ADD read_count :count',
+            ExpressionAttributeValues={':count': -count}
+        )
@@ -0,0 +1,155 @@
+"""Memoized results validated by item versions and the change sequence.
+
+`ResultCache` keeps computed results in the container, evicting the least
+recently used. Each entry records the versions of the items it was computed
+from and the delta-sync sequence number (`stock_common.changes`) current
+when they were read. A lookup first compares the sequence counter, one small
+read: if no stock has been written since, the entry is served without
+reading the items. Otherwise the caller reads the items and the entry is
+still served if their versions match, skipping the computation.
+
+A sequence number is taken before its write lands, so a counter that has not
+moved does not prove the items read under it were current. An entry is only
+served on the counter alone once its versions were confirmed more than
+SETTLE_SECONDS after that counter value was first seen, when every write
+numbered up to it has landed.
+
+With a `SharedCache` the entries are also kept as items in a DynamoDB table,
+so a container that has not seen a key yet starts from another's result. A
+request reads a key's shared item at most once: the `validate` that follows
+a `lookup` which found nothing does not read it again.
+"""
+import threading
+import time
+from collections import OrderedDict
+
+from botocore.exceptions import ClientError
+
+from stock_common.changes import SETTLE_SECONDS
+from stock_common.dynamo import get_table
+from stock_common.metrics import put as put_metric
+
+
+class _Entry:
+    __slots__ = ('value', 'versions', 'seq', 'seq_seen_at', 'settled')
+
+    def __init__(self, value, versions, seq, seq_seen_at, settled=False):
+        self.value = value
+        self.versions = versions
+        self.seq = seq
+        self.seq_seen_at = seq_seen_at
+        self.settled = settled
+
+
+class SharedCache:
+    """Cache entries stored as items in a DynamoDB table keyed on cache_key"""
+
+    def __init__(self, resource_factory, table_name, ttl_seconds=24 * 3600):
+        self.resource_factory = resource_factory
+        self.table_name = table_name
+        self.ttl_seconds = ttl_seconds
+
+    def get(self, key):
+        try:
+            item = get_table(self.resource_factory, self.table_name).get_item(Key={'cache_key': key}).get('Item')
+        except ClientError as e:
+            print(e.response['Error']['Message'])
+            return None
+        if item is None:
+            return None
+        return _Entry(list(item['value']), list(item['versions']), int(item['seq']), float(item['seq_seen_at']),
+                      bool(item.get('settled')))
+
+    def put(self, key, entry):
+        try:
+            get_table(self.resource_factory, self.table_name).put_item(Item={
+                'cache_key': key,
+                'value': entry.value,
+                'versions': entry.versions,
+                'seq': entry.seq,
+                'seq_seen_at': str(entry.seq_seen_at),
+                'settled': entry.settled,
+                'expires_at': int(time.time()) + self.ttl_seconds,
+            })
+        except ClientError as e:
+            # A result that is not shared is only recomputed elsewhere
+            print(e.response['Error']['Message'])
+
+
+class ResultCache:
+    """LRU of results keyed by the caller, validated by versions and sequence.
+    Values and versions must be lists of strings when `shared` is used."""
+
+    def __init__(self, operation, maxsize=256, shared=None, settle_seconds=SETTLE_SECONDS, clock=time.time):
+        self.operation = operation
+        self.maxsize = maxsize
+        self.shared = shared
+        self.settle_seconds = settle_seconds
+        self.clock = clock
+        self._entries = OrderedDict()
+        # Keys a lookup just found in neither cache, so its validate skips the shared read
+        self._shared_misses = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _get(self, key, after_lookup=False):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+                return entry
+            if after_lookup and self._shared_misses.pop(key, False):
+                return None
+        if self.shared is None:
+            return None
+        entry = self.shared.get(key)
+        if entry is not None:
+            self._put(key, entry)
+        elif not after_lookup:
+            with self._lock:
+                self._shared_misses[key] = True
+                while len(self._shared_misses) > self.maxsize:
+                    self._shared_misses.popitem(last=False)
+        return entry
+
+    def _put(self, key, entry):
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    # The cached value when nothing was written since it was confirmed, else None
+    def lookup(self, key, seq):
+        entry = self._get(key)
+        if entry is not None and entry.settled and entry.seq == seq:
+            put_metric(self.operation, 'CacheHit', 1)
+            return entry.value
+        return None
+
+    # The cached value when it was computed from items at these versions, else
+    # None. `seq` is the counter read before the items were.
+    def validate(self, key, versions, seq):
+        entry = self._get(key, after_lookup=True)
+        if entry is None or entry.versions != versions:
+            put_metric(self.operation, 'CacheMiss', 1)
+            return None
+        put_metric(self.operation, 'CacheHit', 1)
+
+        now = self.clock()
+        with self._lock:
+            if entry.seq != seq:
+                entry.seq, entry.seq_seen_at, entry.settled = seq, now, False
+                changed = False
+            else:
+                changed = not entry.settled and now - entry.seq_seen_at >= self.settle_seconds
+                entry.settled = entry.settled or changed
+        if changed and self.shared is not None:
+            self.shared.put(key, entry)
+        return entry.value
+
+    # Cache a value computed from items at `versions`, read under counter `seq`
+    def store(self, key, versions, seq, value):
+        entry = _Entry(value, versions, seq, self.clock())
+        self._put(key, entry)
+        if self.shared is not None:
+            self.shared.put(key, entry)
@@ -0,0 +1,192 @@
+"""Adaptive retry policy for throttled DynamoDB calls.
+
+botocore's built-in retries are switched off for the stock DynamoDB clients
+(see `CLIENT_CONFIG`) and replaced through the client's `needs-retry` event by
+a policy combining:
+
+- jittered exponential backoff ("full jitter") between attempts,
+- a client-side adaptive rate limiter that paces requests by the capacity
+  units DynamoDB reports as consumed, halving its rate on every throttle and
+  creeping back up on success,
+- a retry budget so a container cannot amplify an overload with retries.
+
+Tuning is read from the environment: STOCK_DYNAMODB_MAX_ATTEMPTS,
+STOCK_DYNAMODB_BASE_DELAY_MS, STOCK_DYNAMODB_MAX_DELAY_MS,
+STOCK_DYNAMODB_CAPACITY_UNITS (initial capacity units per second) and
+STOCK_DYNAMODB_RETRY_RATIO (retries allowed per request).
+"""
+import os
+import random
+import threading
+import time
+
+from botocore.config import Config
+from botocore.exceptions import ConnectionError, HTTPClientError, ReadTimeoutError
+
+from stock_common import metrics
+
+THROTTLE_CODES = {
+    'ProvisionedThroughputExceededException',
+    'ThrottlingException',
+    'RequestLimitExceeded',
+}
+
+RETRYABLE_CODES = THROTTLE_CODES | {
+    'InternalServerError',
+    'ServiceUnavailable',
+    'TransactionInProgressException',
+}
+
+RETRYABLE_EXCEPTIONS = (ConnectionError, HTTPClientError, ReadTimeoutError)
+
+# The policy below owns every retry decision for the stock DynamoDB clients
+CLIENT_CONFIG = Config(retries={'total_max_attempts': 1})
+
+
+# Jittered exponential backoff
+class Backoff:
+
+    def __init__(self, base_delay=0.05, max_delay=2.0, max_attempts=8):
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_attempts = max_attempts
+
+    # Delay before the retry following `attempts` failed attempts
+    def delay(self, attempts):
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempts)))
+
+
+# Token bucket limiting retries to a fraction of requests
+class RetryBudget:
+
+    def __init__(self, ratio=0.2, initial=10.0, maximum=10.0):
+        self.ratio = ratio
+        self.maximum = maximum
+        self.tokens = initial
+        self._lock = threading.Lock()
+
+    def on_request(self):
+        with self._lock:
+            self.tokens = min(self.maximum, self.tokens + self.ratio)
+
+    # Spend one token for a retry; False when the budget is exhausted
+    def try_spend(self):
+        with self._lock:
+            if self.tokens < 1:
+                return False
+            self.tokens -= 1
+            return True
+
+
+# Client-side capacity pacing with additive increase / multiplicative decrease
+class AdaptiveRateLimiter:
+
+    def __init__(self, capacity_per_second=10.0, minimum=1.0, maximum=None, increase=0.5):
+        self.rate = capacity_per_second
+        self.minimum = minimum
+        self.maximum = maximum or capacity_per_second * 4
+        self.increase = increase
+        self.tokens = capacity_per_second
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.rate, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    # Seconds to wait before the next request so consumed capacity stays under the rate
+    def wait_time(self):
+        with self._lock:
+            self._refill(time.monotonic())
+            if self.tokens > 0:
+                return 0.0
+            return -self.tokens / self.rate
+
+    def acquire(self):
+        delay = self.wait_time()
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    # Charge the capacity units DynamoDB reported and grow the rate
+    def on_success(self, consumed_units):
+        with self._lock:
+            self._refill(time.monotonic())
+            self.tokens -= consumed_units
+            self.rate = min(self.maximum, self.rate + self.increase)
+
+    def on_throttle(self):
+        with self._lock:
+            self.rate = max(self.minimum, self.rate / 2)
+            self.tokens = min(self.tokens, 0.0)
+
+
+# Retry decisions for one DynamoDB client
+class RetryPolicy:
+
+    def __init__(self, backoff=None, budget=None, limiter=None):
+        self.backoff = backoff or Backoff()
+        self.budget = budget or RetryBudget()
+        self.limiter = limiter or AdaptiveRateLimiter()
+
+    # Return the delay before retrying, or None when the call should fail now
+    def next_delay(self, attempts, error_code=None, exception=None):
+        if exception is not None:
+            retryable = isinstance(exception, RETRYABLE_EXCEPTIONS)
+        else:
+            retryable = error_code in RETRYABLE_CODES
+        if not retryable:
+            return None
+        if error_code in THROTTLE_CODES:
+            self.limiter.on_throttle()
+        if attempts >= self.backoff.max_attempts or not self.budget.try_spend():
+            return None
+        return max(self.backoff.delay(attempts), self.limiter.wait_time())
+
+    # Register the policy on a boto3 client through its event hooks
+    def install(self, client):
+        service = client.meta.service_model.service_name
+
+        def before_call(**kwargs):
+            self.budget.on_request()
+
+        def before_send(**kwargs):
+            waited = self.limiter.acquire()
+            if waited:
+                metrics.put(f'{service}.RateLimiter', 'Latency', waited * 1000)
+
+        def after_call(parsed, **kwargs):
+            if 'Error' not in parsed:
+                self.limiter.on_success(metrics.capacity_units(parsed.get('ConsumedCapacity')))
+
+        def needs_retry(attempts, response=None, caught_exception=None, operation=None, **kwargs):
+            error_code = None
+            if response is not None:
+                http_response, parsed = response
+                if http_response.status_code < 400:
+                    return None
+                error_code = parsed.get('Error', {}).get('Code')
+            elif caught_exception is None:
+                return None
+            if error_code in THROTTLE_CODES and operation is not None:
+                metrics.put(f'{service}.{operation.name}', 'Throttles', 1)
+            return self.next_delay(attempts, error_code, caught_exception)
+
+        events = client.meta.events
+        events.register(f'before-call.{service}', before_call, unique_id='stock-retry-before-call')
+        events.register(f'before-send.{service}', before_send, unique_id='stock-retry-before-send')
+        events.register(f'after-call.{service}', after_call, unique_id='stock-retry-after-call')
+        events.register_first(f'needs-retry.{service}', needs_retry, unique_id='stock-retry-needs-retry')
+        return client
+
+
+# Policy shared by every DynamoDB client in this container
+dynamodb_policy = RetryPolicy(
+    backoff=Backoff(
+        base_delay=float(os.environ.get('STOCK_DYNAMODB_BASE_DELAY_MS', '50')) / 1000.0,
+        max_delay=float(os.environ.get('STOCK_DYNAMODB_MAX_DELAY_MS', '2000')) / 1000.0,
+        max_attempts=int(os.environ.get('STOCK_DYNAMODB_MAX_ATTEMPTS', '8')),
+    ),
+    budget=RetryBudget(ratio=float(os.environ.get('STOCK_DYNAMODB_RETRY_RATIO', '0.2'))),
+    limiter=AdaptiveRateLimiter(float(os.environ.get('STOCK_DYNAMODB_CAPACITY_UNITS', '10'))),
+)
@@ -0,0 +1,148 @@
+"""Request coalescing for refreshes of the same key.
+
+`SingleFlight` shares one in-flight call per key between threads of a single
+container. `DynamoLease` extends that across containers: a short conditional
+lease in a separate lease table lets one refresher win while the others wait
+for it to finish and then read the value it wrote.
+"""
+import os
+import threading
+import time
+import uuid
+from decimal import Decimal
+
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+
+LEASE_TABLE = os.environ.get('REFRESH_LEASE_TABLE_NAME', 'stock-refresh-lease-table')
+
+LEASE_UNTIL = 'refresh_lease_until'
+LEASE_OWNER = 'refresh_lease_owner'
+
+_DESERIALIZER = TypeDeserializer()
+
+
+class _Call:
+    __slots__ = ('done', 'result', 'error')
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Duplicate call suppression within one container
+class SingleFlight:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    # Run fn once per key at a time; concurrent callers get the leader's result.
+    # Returns (result, shared) where shared is True for coalesced callers.
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result, False
+
+
+# Short-lived refresh lease, one item per key in the lease table. The leased
+# item itself is never touched, so readers never see lease attributes or a
+# placeholder for a key that does not exist yet.
+class DynamoLease:
+
+    def __init__(self, table, key, duration=10.0, poll_interval=0.1, max_poll_interval=1.0, max_polls=8):
+        self.table = table
+        self.key = key
+        self.duration = duration
+        self.poll_interval = poll_interval
+        self.max_poll_interval = max_poll_interval
+        self.max_polls = max_polls
+        self.owner = uuid.uuid4().hex
+        # When the lease seen by acquire() was taken, by us or by the holder
+        self.acquired_at = None
+
+    # Try to take the lease; returns False while another refresher holds it
+    def acquire(self):
+        now = time.time()
+        try:
+            self.table.put_item(
+                Item=dict(self.key, **{
+                    LEASE_UNTIL: Decimal(str(round(now + self.duration, 3))),
+                    LEASE_OWNER: self.owner,
+                    # Let TTL collect leases whose holder died
+                    'expires_at': int(now + self.duration) + 3600,
+                }),
+                ConditionExpression='attribute_not_exists(#until) OR #until < :now',
+                ExpressionAttributeNames={'#until': LEASE_UNTIL},
+                ExpressionAttributeValues={':now': Decimal(str(round(now, 3)))},
+                ReturnValuesOnConditionCheckFailure='ALL_OLD'
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] == 'ConditionalCheckFailedException':
+                self._holder_started(e.response.get('Item'))
+                return False
+            raise
+        self.acquired_at = now
+        return True
+
+    # Note when the holder took the lease from its item, as returned by a
+    # failed conditional put (wire format) or read back while polling
+    def _holder_started(self, lease):
+        if lease is None or LEASE_UNTIL not in lease:
+            return
+        until = lease[LEASE_UNTIL]
+        if isinstance(until, dict):
+            until = _DESERIALIZER.deserialize(until)
+        self.acquired_at = float(until) - self.duration
+
+    # Give the lease back, after the refresh or instead of it
+    def release(self):
+        try:
+            self.table.delete_item(
+                Key=self.key,
+                ConditionExpression='#owner = :owner',
+                ExpressionAttributeNames={'#owner': LEASE_OWNER},
+                ExpressionAttributeValues={':owner': self.owner}
+            )
+        except ClientError as e:
+            if e.response['Error']['Code'] != 'ConditionalCheckFailedException':
+                raise
+
+    # Wait for the holder to give the lease back, polling with exponential
+    # backoff at most max_polls times. Returns True once it is released, False
+    # if it lapses or is still held; the caller then reads the leased item.
+    def wait_for_holder(self):
+        deadline = time.time() + self.duration
+        interval = self.poll_interval
+        for _ in range(self.max_polls):
+            time.sleep(min(interval, max(deadline - time.time(), 0)))
+            interval = min(interval * 2, self.max_poll_interval)
+            lease = self.table.get_item(Key=self.key, ConsistentRead=True).get('Item')
+            if lease is None:
+                return True
+            if self.acquired_at is None:
+                self._holder_started(lease)
+            until = float(lease[LEASE_UNTIL])
+            if until < time.time() or time.time() >= deadline:
+                return False
+        return False
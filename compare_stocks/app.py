@@ -1,9 +1,34 @@
 import json
+import os
 import boto3
 from botocore.exceptions import ClientError
 from decimal import Decimal
+from functools import partial
+from stock_common import aio, changes
+from stock_common.dynamo import get_table
+from stock_common.metrics import metered
+from stock_common.profiling import profiled, span
+from stock_common.resultcache import ResultCache, SharedCache
+
+# Item attributes that change whenever a stock's quote does
+VERSION_FIELDS = ('updated_seq', 'refreshed_at', 'latest_trading_day')
+
+CACHE_SIZE = int(os.environ.get('COMPARE_CACHE_SIZE', '256'))
+# DynamoDB table shared by every container's compare cache; optional
+CACHE_TABLE = os.environ.get('COMPARE_CACHE_TABLE_NAME')
+
+result_cache = ResultCache('compare_stocks.cache', CACHE_SIZE,
+                           SharedCache(boto3.resource, CACHE_TABLE) if CACHE_TABLE else None)
+
+# How long the sequence counter is reused in the container. A cached result
+# can be served this long after a write that changes it.
+SEQ_TTL_SECONDS = float(os.environ.get('COMPARE_SEQ_TTL_SECONDS', '1'))
+
+sequence = changes.CachedSeq(SEQ_TTL_SECONDS)
 
 # Compare two stocks by their ticker symbols
+@profiled
+@metered
 def lambda_handler(event, context):
 
     # Validate the incoming event
@@ -23,10 +48,17 @@ def lambda_handler(event, context):
             'body': json.dumps({'message': 'Bad Request: Both ticker1 and ticker2 are required'})
         }
 
-    # Fetch stock data for both tickers
+    # Results are cached for the sorted pair, as a body for each order
+    key = ','.join(sorted((ticker1, ticker2)))
+    reverse = ticker1 > ticker2
+
+    # Fetch stock data for both tickers, unless nothing was written since the cached result
     try:
-        stock1 = get_stock_from_db(ticker1)
-        stock2 = get_stock_from_db(ticker2)
+        seq = sequence.get(boto3.resource)
+        bodies = result_cache.lookup(key, seq)
+        if bodies is None:
+            # Both reads at once, so the pair costs one read's latency
+            stock1, stock2 = aio.gather(partial(get_stock_from_db, ticker1), partial(get_stock_from_db, ticker2))
     except ClientError as e:
         print(e.response['Error']['Message'])
         return {
@@ -34,30 +66,44 @@ def lambda_handler(event, context):
             'body': json.dumps({'message': 'Error retrieving stock data', 'error': e.response['Error']['Message']})
         }
 
-    # Check if both stocks were found
-    if not stock1 or not stock2:
-        not_found_tickers = []
-        if not stock1:
-            not_found_tickers.append(ticker1)
-        if not stock2:
-            not_found_tickers.append(ticker2)
-        return {
-            'statusCode': 404,
-            'body': json.dumps({'message': f'Stocks not found: {", ".join(not_found_tickers)}'})
-        }
-
-    # Compare the stock data
-    comparison_result = compare_stocks(stock1, stock2)
+    if bodies is None:
+        # Check if both stocks were found
+        if not stock1 or not stock2:
+            not_found_tickers = []
+            if not stock1:
+                not_found_tickers.append(ticker1)
+            if not stock2:
+                not_found_tickers.append(ticker2)
+            return {
+                'statusCode': 404,
+                'body': json.dumps({'message': f'Stocks not found: {", ".join(not_found_tickers)}'})
+            }
+
+        first, second = (stock2, stock1) if reverse else (stock1, stock2)
+        versions = [stock_version(first), stock_version(second)]
+        bodies = result_cache.validate(key, versions, seq)
+        if bodies is None:
+            # Compare the stock data
+            comparison_result = compare_stocks(stock1, stock2)
+            with span('serialize'):
+                body = json.dumps(comparison_result, default=handle_decimal_type)
+            bodies = ['', body] if reverse else [body, '']
+            result_cache.store(key, versions, seq, bodies)
+
+    # The body in the requested order, derived once from the other order if needed
+    body = bodies[1 if reverse else 0]
+    if not body:
+        with span('serialize'):
+            body = bodies[1 if reverse else 0] = swap_order(bodies[0 if reverse else 1])
 
     return {
         'statusCode': 200,
-        'body': json.dumps(comparison_result, default=handle_decimal_type)
+        'body': body
     }
 
 # Retrieve a stock's data from DynamoDB
 def get_stock_from_db(ticker):
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table('stocks-table')  # Replace with your actual table name
+    table = get_table(boto3.resource)
 
     try:
         response = table.get_item(Key={'ticker': ticker})
@@ -67,6 +113,16 @@ def get_stock_from_db(ticker):
 
     return response.get('Item')
 
+# The version of a stock item; any quote update changes it
+def stock_version(stock):
+    return ','.join(str(stock.get(field, '')) for field in VERSION_FIELDS)
+
+# The same comparison body with the stocks in the other order
+def swap_order(body):
+    comparison = json.loads(body)
+    comparison['stock1'], comparison['stock2'] = comparison['stock2'], comparison['stock1']
+    return json.dumps(comparison)
+
 # Compare two stock data dictionaries
 def compare_stocks(stock1, stock2):
     # Define the fields to compare
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# Make the shared Lambda layer importable the same way it is under /opt/python
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'common', 'python'))
@@ -2,8 +2,14 @@ import json
 import boto3
 import uuid
 from botocore.exceptions import ClientError
+from stock_common import changes
+from stock_common.dynamo import get_table
+from stock_common.metrics import metered
+from stock_common.profiling import profiled, span
 
 # Extract stock object from request body and insert it into DynamoDB table
+@profiled
+@metered
 def lambda_handler(event, context):
 
     # ================== Sample Input ================== #
@@ -27,7 +33,8 @@ def lambda_handler(event, context):
 
     # Parse the request body
     try:
-        new_stock = json.loads(event['body'])
+        with span('parse'):
+            new_stock = json.loads(event['body'])
     except json.JSONDecodeError:
         return {
             'statusCode': 400,
@@ -62,9 +69,11 @@ def add_stock_to_db(new_stock):
     # Assign a unique ID to the stock
     new_stock['id'] = str(uuid.uuid1())
 
+    # Stamp the write for delta sync (GET /stock/changes)
+    new_stock.update(changes.stamp(boto3.resource))
+
     # Initialize DynamoDB resource and specify the table
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table('stocks-table')  # Replace 'stocks-table' with your actual table name
+    table = get_table(boto3.resource)
 
     # Put the new stock item into the DynamoDB table
     response = table.put_item(Item=new_stock)
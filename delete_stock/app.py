@@ -1,8 +1,14 @@
 import json
 import boto3
 from botocore.exceptions import ClientError
+from stock_common import changes
+from stock_common.dynamo import STOCKS_TABLE, transact_write
+from stock_common.metrics import metered
+from stock_common.profiling import profiled
 
 # Delete a stock by ticker
+@profiled
+@metered
 def lambda_handler(event, context):
 
     # ================== inputs ================== #
@@ -39,8 +45,7 @@ def lambda_handler(event, context):
             'body': json.dumps({'message': 'The stock was deleted successfully from the database'})
         }
     except ClientError as e:
-        error_code = e.response['Error']['Code']
-        if error_code == 'ConditionalCheckFailedException':
+        if is_missing_stock(e):
             # The stock does not exist
             return {
                 'statusCode': 404,
@@ -54,14 +59,24 @@ def lambda_handler(event, context):
                 'body': json.dumps({'message': 'An error occurred while deleting the stock'})
             }
 
-# Delete a selected stock from DynamoDB table using its ticker
+# Delete a selected stock from DynamoDB table using its ticker. The delete,
+# conditioned on the stock existing, and its tombstone are one transaction,
+# so a missing stock or a failed delete leaves no tombstone behind.
 def delete_stock_from_db(ticker):
 
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table('stocks-table')  # Replace 'stocks-table' with your actual table name
+    return transact_write(boto3.resource, [
+        {'Delete': {
+            'TableName': STOCKS_TABLE,
+            'Key': {'ticker': ticker},
+            'ConditionExpression': 'attribute_exists(ticker)'
+        }},
+        changes.tombstone_put(boto3.resource, ticker),
+    ])
 
-    response = table.delete_item(
-        Key={'ticker': ticker},
-        ConditionExpression='attribute_exists(ticker)'
-    )
-    return response
\ No newline at end of file
+
+# Whether the transaction was cancelled because the stock does not exist
+def is_missing_stock(error):
+    if error.response['Error']['Code'] != 'TransactionCanceledException':
+        return False
+    reasons = error.response.get('CancellationReasons') or []
+    return bool(reasons) and reasons[0].get('Code') == 'ConditionalCheckFailed'
@@ -0,0 +1,585 @@
+"""In-memory stand-in for the boto3 DynamoDB resource.
+
+Implements the subset of the Table/resource API the stock handlers use:
+get/put/update/delete_item, query (also on global secondary indexes), scan,
+batch_get_item, transact_write_items and batch_writer,
+with condition, key-condition, filter, projection and update expressions
+evaluated the way DynamoDB does (SET with if_not_exists/list_append and +/-,
+REMOVE, ADD, DELETE; comparisons, BETWEEN, IN, AND/OR/NOT, attribute_exists,
+attribute_not_exists, attribute_type, begins_with, contains and size).
+Numbers are stored as Decimal and items are copied on the way in and out,
+as with a real round trip. Every operation takes one lock, so handlers can
+share a table across server threads.
+"""
+import contextlib
+import copy
+import re
+import threading
+from decimal import Decimal
+
+from boto3.dynamodb.conditions import ConditionBase, ConditionExpressionBuilder
+from boto3.dynamodb.types import TypeSerializer
+from botocore.exceptions import ClientError
+
+_TOKEN = re.compile(r'\s*(?:(<>|<=|>=|=|<|>|\(|\)|,|\+|-|\.|\[\d+\])|(#\w+)|(:\w+)|([A-Za-z_]\w*))')
+
+_MISSING = object()
+
+_SERIALIZER = TypeSerializer()
+
+
+def _client_error(code, message, operation):
+    return ClientError({'Error': {'Code': code, 'Message': message}}, operation)
+
+
+# Convert Python numbers to Decimal throughout, as DynamoDB returns them
+def _normalize(value):
+    if isinstance(value, bool) or value is None:
+        return value
+    if isinstance(value, (int, float)):
+        return Decimal(str(value))
+    if isinstance(value, dict):
+        return {k: _normalize(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_normalize(v) for v in value]
+    if isinstance(value, (set, frozenset)):
+        return {_normalize(v) for v in value}
+    return value
+
+
+def _tokenize(expression):
+    tokens = []
+    position = 0
+    expression = expression.strip()
+    while position < len(expression):
+        match = _TOKEN.match(expression, position)
+        if match is None or match.end() == position:
+            raise _client_error('ValidationException', f'Invalid expression: {expression}', 'Expression')
+        tokens.append(next(group for group in match.groups() if group is not None))
+        position = match.end()
+    return tokens
+
+
+class _Parser:
+    """Recursive-descent parser over one expression's tokens"""
+
+    def __init__(self, expression, names, values):
+        self.tokens = _tokenize(expression)
+        self.position = 0
+        self.names = names or {}
+        self.values = values or {}
+
+    def peek(self, offset=0):
+        index = self.position + offset
+        return self.tokens[index] if index < len(self.tokens) else None
+
+    def keyword(self, word, offset=0):
+        token = self.peek(offset)
+        return token is not None and token.upper() == word
+
+    def take(self, expected=None):
+        token = self.peek()
+        if token is None or (expected is not None and token.upper() != expected.upper()):
+            raise _client_error('ValidationException', f'Expected {expected or "token"} near {token!r}', 'Expression')
+        self.position += 1
+        return token
+
+    def done(self):
+        return self.position >= len(self.tokens)
+
+    # path := name ('.' name | '[n]')*
+    def path(self):
+        token = self.take()
+        path = [self.names[token] if token.startswith('#') else token]
+        while self.peek() is not None and (self.peek() == '.' or self.peek().startswith('[')):
+            token = self.take()
+            if token == '.':
+                name = self.take()
+                path.append(self.names[name] if name.startswith('#') else name)
+            else:
+                path.append(int(token[1:-1]))
+        return tuple(path)
+
+    # operand := :value | function(...) | path, returned as a callable on the item
+    def operand(self):
+        token = self.peek()
+        if token.startswith(':'):
+            self.take()
+            value = _normalize(self.values[token])
+            return lambda item: value
+        if self.peek(1) == '(':
+            name = self.take().lower()
+            self.take('(')
+            args = [self.operand()]
+            while self.peek() == ',':
+                self.take(',')
+                args.append(self.operand())
+            self.take(')')
+            return self.function(name, args)
+        path = self.path()
+        return lambda item: _get(item, path)
+
+    def function(self, name, args):
+        if name == 'size':
+            def size(item):
+                value = args[0](item)
+                return _MISSING if value is _MISSING else Decimal(len(value))
+            return size
+        if name == 'if_not_exists':
+            def if_not_exists(item):
+                value = args[0](item)
+                return args[1](item) if value is _MISSING else value
+            return if_not_exists
+        if name == 'list_append':
+            return lambda item: list(args[0](item)) + list(args[1](item))
+        raise _client_error('ValidationException', f'Unsupported function {name}', 'Expression')
+
+    # condition := and_condition (OR and_condition)*
+    def condition(self):
+        left = self.and_condition()
+        while self.keyword('OR'):
+            self.take()
+            right = self.and_condition()
+            left = (lambda a, b: lambda item: a(item) or b(item))(left, right)
+        return left
+
+    def and_condition(self):
+        left = self.not_condition()
+        while self.keyword('AND'):
+            self.take()
+            right = self.not_condition()
+            left = (lambda a, b: lambda item: a(item) and b(item))(left, right)
+        return left
+
+    def not_condition(self):
+        if self.keyword('NOT'):
+            self.take()
+            inner = self.not_condition()
+            return lambda item: not inner(item)
+        return self.predicate()
+
+    def predicate(self):
+        if self.peek() == '(':
+            self.take('(')
+            inner = self.condition()
+            self.take(')')
+            return inner
+
+        token = self.peek()
+        if self.peek(1) == '(' and token.lower() in (
+                'attribute_exists', 'attribute_not_exists', 'attribute_type', 'begins_with', 'contains'):
+            name = self.take().lower()
+            self.take('(')
+            path = self.path()
+            argument = None
+            if self.peek() == ',':
+                self.take(',')
+                argument = self.operand()
+            self.take(')')
+            return _predicate_function(name, path, argument)
+
+        left = self.operand()
+        if self.keyword('BETWEEN'):
+            self.take()
+            low = self.operand()
+            self.take('AND')
+            high = self.operand()
+            return lambda item: _compare(left(item), '>=', low(item)) and _compare(left(item), '<=', high(item))
+        if self.keyword('IN'):
+            self.take()
+            self.take('(')
+            options = [self.operand()]
+            while self.peek() == ',':
+                self.take(',')
+                options.append(self.operand())
+            self.take(')')
+            return lambda item: any(_compare(left(item), '=', option(item)) for option in options)
+
+        comparator = self.take()
+        right = self.operand()
+        return lambda item: _compare(left(item), comparator, right(item))
+
+    # value := operand (('+' | '-') operand)?
+    def value(self):
+        left = self.operand()
+        if self.peek() in ('+', '-'):
+            operator = self.take()
+            right = self.operand()
+            if operator == '+':
+                return lambda item: left(item) + right(item)
+            return lambda item: left(item) - right(item)
+        return left
+
+
+def _predicate_function(name, path, argument):
+    if name == 'attribute_exists':
+        return lambda item: _get(item, path) is not _MISSING
+    if name == 'attribute_not_exists':
+        return lambda item: _get(item, path) is _MISSING
+    if name == 'begins_with':
+        return lambda item: isinstance(_get(item, path), str) and _get(item, path).startswith(argument(item))
+    if name == 'contains':
+        def contains(item):
+            value = _get(item, path)
+            return value is not _MISSING and argument(item) in value
+        return contains
+
+    def attribute_type(item):
+        value = _get(item, path)
+        expected = argument(item)
+        if value is _MISSING:
+            return False
+        actual = ('BOOL' if isinstance(value, bool) else 'N' if isinstance(value, Decimal) else
+                  'S' if isinstance(value, str) else 'B' if isinstance(value, bytes) else
+                  'M' if isinstance(value, dict) else 'L' if isinstance(value, list) else
+                  'NULL' if value is None else 'SS')
+        return actual == expected
+    return attribute_type
+
+
+def _compare(left, comparator, right):
+    if left is _MISSING or right is _MISSING:
+        return comparator == '<>' and left is not right
+    try:
+        if comparator == '=':
+            return left == right
+        if comparator == '<>':
+            return left != right
+        if comparator == '<':
+            return left < right
+        if comparator == '<=':
+            return left <= right
+        if comparator == '>':
+            return left > right
+        if comparator == '>=':
+            return left >= right
+    except TypeError:
+        return False
+    raise _client_error('ValidationException', f'Invalid comparator {comparator}', 'Expression')
+
+
+def _get(item, path):
+    value = item
+    for component in path:
+        try:
+            value = value[component]
+        except (KeyError, IndexError, TypeError):
+            return _MISSING
+    return value
+
+
+def _set(item, path, value):
+    target = item
+    for component in path[:-1]:
+        target = target[component]
+    target[path[-1]] = value
+
+
+def _remove(item, path):
+    target = _get(item, path[:-1]) if len(path) > 1 else item
+    if target is not _MISSING:
+        try:
+            del target[path[-1]]
+        except (KeyError, IndexError):
+            pass
+
+
+# Parse an update expression into a function applying it to an item in place
+def _compile_update(expression, names, values):
+    parser = _Parser(expression, names, values)
+    actions = []
+    while not parser.done():
+        clause = parser.take().upper()
+        while True:
+            if clause == 'SET':
+                path = parser.path()
+                parser.take('=')
+                actions.append(('SET', path, parser.value()))
+            elif clause == 'REMOVE':
+                actions.append(('REMOVE', parser.path(), None))
+            elif clause in ('ADD', 'DELETE'):
+                path = parser.path()
+                actions.append((clause, path, parser.operand()))
+            else:
+                raise _client_error('ValidationException', f'Invalid update clause {clause}', 'UpdateItem')
+            if parser.peek() != ',':
+                break
+            parser.take(',')
+
+    def apply(item):
+        # Every right-hand side sees the item as it was before the update
+        before = copy.deepcopy(item)
+        for action, path, operand in actions:
+            if action == 'SET':
+                _set(item, path, operand(before))
+            elif action == 'REMOVE':
+                _remove(item, path)
+            elif action == 'ADD':
+                current = _get(item, path)
+                change = operand(before)
+                if current is _MISSING:
+                    _set(item, path, change)
+                elif isinstance(current, set):
+                    _set(item, path, current | change)
+                else:
+                    _set(item, path, current + change)
+            elif action == 'DELETE':
+                current = _get(item, path)
+                if current is not _MISSING:
+                    remaining = current - operand(before)
+                    if remaining:
+                        _set(item, path, remaining)
+                    else:
+                        _remove(item, path)
+    return apply
+
+
+def _compile_condition(expression, names, values):
+    if isinstance(expression, ConditionBase):
+        built = ConditionExpressionBuilder().build_expression(expression)
+        names = dict(names or {}, **built.attribute_name_placeholders)
+        values = dict(values or {}, **built.attribute_value_placeholders)
+        expression = built.condition_expression
+    parser = _Parser(expression, names, values)
+    condition = parser.condition()
+    if not parser.done():
+        raise _client_error('ValidationException', f'Invalid expression: {expression}', 'Expression')
+    return condition
+
+
+def _project(item, projection, names):
+    if not projection:
+        return copy.deepcopy(item)
+    attributes = set()
+    for part in projection.split(','):
+        top = part.strip().split('.')[0].split('[')[0]
+        attributes.add((names or {}).get(top, top))
+    return {k: copy.deepcopy(v) for k, v in item.items() if k in attributes}
+
+
+class _BatchWriter:
+
+    def __init__(self, table):
+        self._table = table
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+    def put_item(self, Item):
+        self._table.put_item(Item=Item)
+
+    def delete_item(self, Key):
+        self._table.delete_item(Key=Key)
+
+
+class MemoryTable:
+    """Dictionary-backed table with a hash key and an optional range key"""
+
+    def __init__(self, name, hash_key, range_key=None, lock=None):
+        self.name = name
+        self.table_name = name
+        self.hash_key = hash_key
+        self.range_key = range_key
+        # Global secondary index name -> (hash key, range key); indexes project ALL
+        self.indexes = {}
+        self._items = {}
+        self._lock = lock or threading.RLock()
+
+    def add_index(self, name, hash_key, range_key=None):
+        self.indexes[name] = (hash_key, range_key)
+
+    def _key(self, item):
+        try:
+            key = (item[self.hash_key],) + ((item[self.range_key],) if self.range_key else ())
+        except KeyError:
+            raise _client_error('ValidationException',
+                                'The provided key element does not match the schema', 'Key')
+        return tuple(_normalize(k) for k in key)
+
+    # Index key followed by the table key, the order an index query returns items in
+    def _index_key(self, index_name, item):
+        try:
+            key = tuple(item[k] for k in self.indexes[index_name] if k)
+        except KeyError:
+            raise _client_error('ValidationException',
+                                'The provided key element does not match the schema', 'Key')
+        return tuple(_normalize(k) for k in key) + self._key(item)
+
+    def _check(self, item, kwargs, operation):
+        expression = kwargs.get('ConditionExpression')
+        if expression is None:
+            return
+        condition = _compile_condition(expression, kwargs.get('ExpressionAttributeNames'),
+                                       kwargs.get('ExpressionAttributeValues'))
+        if not condition(item or {}):
+            error = _client_error('ConditionalCheckFailedException', 'The conditional request failed', operation)
+            # The resource only deserializes successful responses, so the item
+            # comes back in wire format as it does from DynamoDB
+            if item is not None and kwargs.get('ReturnValuesOnConditionCheckFailure') == 'ALL_OLD':
+                error.response['Item'] = {name: _SERIALIZER.serialize(value) for name, value in item.items()}
+            raise error
+
+    def get_item(self, Key, ProjectionExpression=None, ExpressionAttributeNames=None, **kwargs):
+        with self._lock:
+            item = self._items.get(self._key(Key))
+            if item is None:
+                return {}
+            return {'Item': _project(item, ProjectionExpression, ExpressionAttributeNames)}
+
+    def put_item(self, Item, ReturnValues='NONE', **kwargs):
+        item = _normalize(copy.deepcopy(Item))
+        with self._lock:
+            key = self._key(item)
+            old = self._items.get(key)
+            self._check(old, kwargs, 'PutItem')
+            self._items[key] = item
+        return {'Attributes': copy.deepcopy(old)} if ReturnValues == 'ALL_OLD' and old else {}
+
+    def update_item(self, Key, UpdateExpression=None, ReturnValues='NONE', ExpressionAttributeNames=None,
+                    ExpressionAttributeValues=None, **kwargs):
+        kwargs.update(ExpressionAttributeNames=ExpressionAttributeNames,
+                      ExpressionAttributeValues=ExpressionAttributeValues)
+        with self._lock:
+            key = self._key(Key)
+            old = self._items.get(key)
+            self._check(old, kwargs, 'UpdateItem')
+            item = copy.deepcopy(old) if old is not None else _normalize(dict(Key))
+            if UpdateExpression:
+                _compile_update(UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues)(item)
+            self._items[key] = item
+
+        if ReturnValues in ('ALL_NEW', 'UPDATED_NEW'):
+            return {'Attributes': copy.deepcopy(item)}
+        if ReturnValues in ('ALL_OLD', 'UPDATED_OLD') and old is not None:
+            return {'Attributes': copy.deepcopy(old)}
+        return {}
+
+    def delete_item(self, Key, ReturnValues='NONE', **kwargs):
+        with self._lock:
+            key = self._key(Key)
+            old = self._items.get(key)
+            self._check(old, kwargs, 'DeleteItem')
+            self._items.pop(key, None)
+        return {'Attributes': copy.deepcopy(old)} if ReturnValues == 'ALL_OLD' and old else {}
+
+    # Page through items in key order, applying key condition, filter and projection
+    def _page(self, items, kwargs, key_condition=None, index=None):
+        names = kwargs.get('ExpressionAttributeNames')
+        values = kwargs.get('ExpressionAttributeValues')
+        filter_expression = kwargs.get('FilterExpression')
+        matches_filter = _compile_condition(filter_expression, names, values) if filter_expression else None
+        limit = kwargs.get('Limit')
+        start = kwargs.get('ExclusiveStartKey')
+        start_key = (self._index_key(index, start) if index else self._key(start)) if start else None
+        forward = kwargs.get('ScanIndexForward', True)
+
+        ordered = sorted(items, key=lambda pair: pair[0], reverse=not forward)
+        if key_condition is not None:
+            ordered = [(key, item) for key, item in ordered if key_condition(item)]
+        if start_key is not None:
+            ordered = [(key, item) for key, item in ordered if (key > start_key if forward else key < start_key)]
+
+        page = ordered[:limit] if limit else ordered
+        result_items = [
+            _project(item, kwargs.get('ProjectionExpression'), names)
+            for _, item in page
+            if matches_filter is None or matches_filter(item)
+        ]
+        response = {'Items': result_items, 'Count': len(result_items), 'ScannedCount': len(page)}
+        if limit and len(ordered) > limit:
+            last = page[-1][1]
+            key_attributes = (self.hash_key, self.range_key) + (self.indexes[index] if index else ())
+            response['LastEvaluatedKey'] = {k: last[k] for k in key_attributes if k}
+        return response
+
+    def query(self, KeyConditionExpression, **kwargs):
+        condition = _compile_condition(KeyConditionExpression, kwargs.get('ExpressionAttributeNames'),
+                                       kwargs.get('ExpressionAttributeValues'))
+        index = kwargs.get('IndexName')
+        with self._lock:
+            if index is None:
+                return self._page(list(self._items.items()), kwargs, condition)
+            if index not in self.indexes:
+                raise _client_error('ValidationException', f'The table does not have the specified index: {index}',
+                                    'Query')
+            # Items missing an index key attribute are not in the (sparse) index
+            indexed = [(self._index_key(index, item), item) for item in self._items.values()
+                       if all(k in item for k in self.indexes[index] if k)]
+            return self._page(indexed, kwargs, condition, index)
+
+    def scan(self, Segment=None, TotalSegments=None, **kwargs):
+        with self._lock:
+            items = list(self._items.items())
+        if TotalSegments:
+            items = [(key, item) for key, item in items if hash(key) % TotalSegments == Segment]
+        return self._page(items, kwargs)
+
+    def batch_writer(self, overwrite_by_pkeys=None):
+        return _BatchWriter(self)
+
+
+class MemoryResource:
+    """The part of the boto3 DynamoDB service resource the handlers use"""
+
+    def __init__(self, tables=()):
+        self.tables = {table.name: table for table in tables}
+
+    def add_table(self, name, hash_key, range_key=None):
+        self.tables[name] = MemoryTable(name, hash_key, range_key)
+        return self.tables[name]
+
+    def Table(self, name):
+        try:
+            return self.tables[name]
+        except KeyError:
+            raise _client_error('ResourceNotFoundException', f'Requested resource not found: {name}', 'DescribeTable')
+
+    def batch_get_item(self, RequestItems, **kwargs):
+        responses = {}
+        for name, request in RequestItems.items():
+            table = self.Table(name)
+            found = []
+            for key in request['Keys']:
+                item = table.get_item(Key=key, ProjectionExpression=request.get('ProjectionExpression'),
+                                      ExpressionAttributeNames=request.get('ExpressionAttributeNames')).get('Item')
+                if item is not None:
+                    found.append(item)
+            responses[name] = found
+        return {'Responses': responses, 'UnprocessedKeys': {}}
+
+    # All or nothing: every condition is checked before any write is applied.
+    # Requests use plain Python values, as `stock_common.dynamo.transact_write` passes them.
+    def transact_write_items(self, TransactItems, **kwargs):
+        actions = [(action, self.Table(request['TableName']), request)
+                   for entry in TransactItems for action, request in entry.items()]
+        tables = sorted({table.name: table for _, table, _ in actions}.values(), key=lambda table: table.name)
+        with contextlib.ExitStack() as stack:
+            for table in tables:
+                stack.enter_context(table._lock)
+
+            reasons = []
+            for action, table, request in actions:
+                old = table._items.get(table._key(request['Item'] if action == 'Put' else request['Key']))
+                try:
+                    table._check(old, request, 'TransactWriteItems')
+                    reasons.append({'Code': 'None'})
+                except ClientError as e:
+                    reasons.append({'Code': 'ConditionalCheckFailed', 'Message': e.response['Error']['Message']})
+            if any(reason['Code'] != 'None' for reason in reasons):
+                raise ClientError({
+                    'Error': {'Code': 'TransactionCanceledException', 'Message': 'Transaction cancelled'},
+                    'CancellationReasons': reasons,
+                }, 'TransactWriteItems')
+
+            for action, table, request in actions:
+                args = {k: v for k, v in request.items() if k not in ('TableName', 'ConditionExpression')}
+                if action == 'Put':
+                    table.put_item(Item=args['Item'])
+                elif action == 'Update':
+                    table.update_item(**args)
+                elif action == 'Delete':
+                    table.delete_item(Key=args['Key'])
+        return {}
@@ -0,0 +1,291 @@
+"""Replay recorded API Gateway events as load.
+
+Events come from `events/event.json` ({"ApiName": [event, ...]}), a JSON list,
+or an NDJSON capture with one proxy event per line (as written by
+`python -m devtools.server --capture`). They are replayed either against the
+handlers in-process (the same mounting as the dev server) or against a
+deployed endpoint, on an open-loop arrival schedule:
+
+- constant: evenly spaced at --rate requests per second
+- poisson: exponential inter-arrival times with mean rate --rate
+- bursty: --burst-size requests at once, bursts spaced to average --rate
+- recorded: the original gaps between requestTimeEpoch values, divided by --speed
+
+Latency is measured from each request's scheduled arrival, so time spent
+waiting for a free worker counts (no coordinated omission). The report gives
+per-route throughput, status counts and latency percentiles.
+
+    python -m devtools.replay events/event.json --process poisson --rate 50 --requests 2000 \\
+        --concurrency 8 --seed-data devtools/seed.json --report replay.json
+    python -m devtools.replay capture.ndjson --process recorded --speed 2 --target https://abc.execute-api.us-east-1.amazonaws.com/Prod
+"""
+import argparse
+import base64
+import itertools
+import json
+import os
+import random
+import sys
+import threading
+import time
+import urllib.error
+import urllib.parse
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+
+PROCESSES = ('constant', 'poisson', 'bursty', 'recorded')
+
+# Request headers that must not be replayed to a different host
+HOP_HEADERS = {'host', 'content-length', 'connection', 'x-forwarded-for', 'x-forwarded-port', 'x-forwarded-proto'}
+
+
+# {API event name: (resource, METHOD)} for the Api events in the template
+def api_event_routes(template):
+    routes = {}
+    for resource in (template.get('Resources') or {}).values():
+        for name, event in ((resource.get('Properties') or {}).get('Events') or {}).items():
+            if event.get('Type') == 'Api':
+                routes[name] = (event['Properties']['Path'], event['Properties']['Method'].upper())
+    return routes
+
+
+# Fill in the resource, path and method a hand-written sample event leaves out
+def complete_event(event, route):
+    if route is None or event.get('resource'):
+        return event
+    resource, method = route
+    event = dict(event, resource=resource, httpMethod=event.get('httpMethod') or method)
+    if not event.get('path') and '{' not in resource:
+        event['path'] = resource
+    return event
+
+
+# Proxy events from a .json file ({api: event or [events]} or [events]) or an
+# NDJSON capture. Events keyed by an API event name of the template are
+# completed from its route.
+def load_events(path, routes=None):
+    with open(path) as source:
+        text = source.read()
+    try:
+        document = json.loads(text)
+    except ValueError:
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    if isinstance(document, dict) and 'httpMethod' in document:
+        return [document]
+    if isinstance(document, list):
+        return document
+
+    events = []
+    for name, api_events in document.items():
+        for event in [api_events] if isinstance(api_events, dict) else api_events:
+            events.append(complete_event(event, (routes or {}).get(name)))
+    return events
+
+
+def route_key(event):
+    return f"{event.get('httpMethod', 'GET')} {event.get('resource') or event.get('path', '/')}"
+
+
+# Arrival offsets in seconds from the start of the run
+def arrivals(process, count, rate=10.0, burst_size=10, rng=None, events=None, speed=1.0):
+    rng = rng or random.Random()
+    if process == 'constant':
+        return [i / rate for i in range(count)]
+    if process == 'poisson':
+        offsets, at = [], 0.0
+        for _ in range(count):
+            offsets.append(at)
+            at += rng.expovariate(rate)
+        return offsets
+    if process == 'bursty':
+        return [(i // burst_size) * burst_size / rate for i in range(count)]
+    if process == 'recorded':
+        epochs = [(event.get('requestContext') or {}).get('requestTimeEpoch') for event in events]
+        if None in epochs:
+            raise ValueError('recorded arrivals need requestContext.requestTimeEpoch on every event')
+        return [(epoch - epochs[0]) / 1000 / speed for epoch in epochs]
+    raise ValueError(f'Unknown arrival process {process!r}; expected one of {", ".join(PROCESSES)}')
+
+
+class InProcessTarget:
+    """Invokes the handlers mounted by the dev server directly with each event"""
+
+    def __init__(self, app):
+        self.app = app
+
+    def __call__(self, event):
+        from devtools.server import LambdaContext
+
+        resource = event.get('resource')
+        if resource is None:
+            resource, path_parameters = self.app.match(event.get('path', '/'))
+            event = dict(event, resource=resource, pathParameters=path_parameters or None)
+        route = self.app.handlers.get((resource, event.get('httpMethod'))) or self.app.handlers.get((resource, 'ANY'))
+        if route is None:
+            return 404
+        handler, name, timeout = route
+        result = handler(event, LambdaContext(name, timeout))
+        return int(result.get('statusCode', 200))
+
+
+class HttpTarget:
+    """Sends each event as an HTTP request to a deployed stage, e.g. https://.../Prod"""
+
+    def __init__(self, base_url, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.timeout = timeout
+
+    def request(self, event):
+        params = event.get('multiValueQueryStringParameters') or {
+            k: [v] for k, v in (event.get('queryStringParameters') or {}).items()
+        }
+        url = self.base_url + urllib.parse.quote(event.get('path', '/'))
+        if params:
+            url += '?' + urllib.parse.urlencode(params, doseq=True)
+
+        body = event.get('body')
+        if body is not None:
+            body = base64.b64decode(body) if event.get('isBase64Encoded') else body.encode('utf-8')
+        headers = {k: v for k, v in (event.get('headers') or {}).items() if k.lower() not in HOP_HEADERS}
+        return urllib.request.Request(url, data=body, headers=headers, method=event.get('httpMethod', 'GET'))
+
+    def __call__(self, event):
+        try:
+            with urllib.request.urlopen(self.request(event), timeout=self.timeout) as response:
+                response.read()
+                return response.status
+        except urllib.error.HTTPError as e:
+            e.read()
+            return e.code
+
+
+# Nearest-rank percentile of sorted values
+def percentile(values, fraction):
+    if not values:
+        return None
+    return round(values[min(int(fraction * len(values)), len(values) - 1)], 3)
+
+
+def summarize(samples, duration):
+    latencies = sorted(sample['latency'] * 1000 for sample in samples)
+    statuses = {}
+    for sample in samples:
+        statuses[str(sample['status'])] = statuses.get(str(sample['status']), 0) + 1
+    return {
+        'requests': len(samples),
+        'errors': sum(1 for sample in samples if sample['status'] is None or sample['status'] >= 500),
+        'throughput': round(len(samples) / duration, 2) if duration else None,
+        'status': statuses,
+        'latency_ms': {
+            'mean': round(sum(latencies) / len(latencies), 3) if latencies else None,
+            'p50': percentile(latencies, 0.50),
+            'p90': percentile(latencies, 0.90),
+            'p99': percentile(latencies, 0.99),
+            'max': round(latencies[-1], 3) if latencies else None,
+        },
+    }
+
+
+# Fire events at their arrival offsets on `concurrency` workers; returns the report
+def replay(target, events, offsets, concurrency=8):
+    samples = []
+    lock = threading.Lock()
+
+    def send(event, scheduled):
+        started = time.perf_counter()
+        try:
+            status = target(event)
+        except Exception as e:
+            print(f'{route_key(event)} failed: {e}', file=sys.stderr)
+            status = None
+        finished = time.perf_counter()
+        with lock:
+            samples.append({
+                'route': route_key(event),
+                'status': status,
+                'latency': finished - scheduled,
+                'service': finished - started,
+            })
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as workers:
+        for event, offset in zip(events, offsets):
+            delay = start + offset - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            workers.submit(send, event, start + offset)
+    duration = time.perf_counter() - start
+
+    routes = {}
+    for sample in samples:
+        routes.setdefault(sample['route'], []).append(sample)
+    report = summarize(samples, duration)
+    report['duration_seconds'] = round(duration, 3)
+    report['routes'] = {route: summarize(route_samples, duration) for route, route_samples in sorted(routes.items())}
+    return report
+
+
+def format_report(report):
+    def ms(value):
+        return '-' if value is None else f'{value:.1f}'
+
+    lines = [f"{'route':<40} {'reqs':>6} {'errs':>5} {'req/s':>8} {'p50':>8} {'p90':>8} {'p99':>8} {'max':>8}"]
+    for route, summary in list(report['routes'].items()) + [('total', report)]:
+        latency = summary['latency_ms']
+        lines.append(f"{route:<40} {summary['requests']:>6} {summary['errors']:>5} {summary['throughput'] or 0:>8.1f} "
+                     f"{ms(latency['p50']):>8} {ms(latency['p90']):>8} {ms(latency['p99']):>8} {ms(latency['max']):>8}")
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Replay recorded API Gateway events as load')
+    parser.add_argument('events', help='events JSON ({"Api": [events]} or a list) or an NDJSON capture')
+    parser.add_argument('--target', default='local', help='"local" for the in-process handlers, or a stage URL')
+    parser.add_argument('--process', choices=PROCESSES, default='constant')
+    parser.add_argument('--rate', type=float, default=10.0, help='mean requests per second')
+    parser.add_argument('--requests', type=int, help='requests to send, cycling through the events')
+    parser.add_argument('--duration', type=float, help='seconds to run at --rate (instead of --requests)')
+    parser.add_argument('--burst-size', type=int, default=10)
+    parser.add_argument('--speed', type=float, default=1.0, help='speed-up factor for recorded arrivals')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--seed', type=int, help='random seed for Poisson arrivals')
+    parser.add_argument('--seed-data', help='JSON file of {"table-name": [items]} for the local memory backend')
+    parser.add_argument('--backend', choices=['memory', 'aws'], default='memory', help='tables used by --target local')
+    parser.add_argument('--report', help='write the JSON report to this file')
+    args = parser.parse_args(argv)
+
+    from devtools.server import load_template
+
+    events = load_events(args.events, api_event_routes(load_template()))
+    if not events:
+        parser.error(f'No events in {args.events}')
+
+    if args.process == 'recorded':
+        events.sort(key=lambda event: (event.get('requestContext') or {}).get('requestTimeEpoch') or 0)
+    else:
+        count = args.requests or (int(args.duration * args.rate) if args.duration else len(events))
+        events = list(itertools.islice(itertools.cycle(events), count))
+    offsets = arrivals(args.process, len(events), args.rate, args.burst_size, random.Random(args.seed),
+                       events, args.speed)
+
+    if args.target == 'local':
+        from devtools.server import build_app
+
+        # Metrics print per invocation, which would dominate the measurement
+        os.environ.setdefault('STOCK_METRICS', '0')
+        target = InProcessTarget(build_app(backend=args.backend, seed=args.seed_data))
+    else:
+        target = HttpTarget(args.target)
+
+    report = replay(target, events, offsets, args.concurrency)
+    report.update({'process': args.process, 'rate': args.rate, 'concurrency': args.concurrency})
+
+    print(format_report(report))
+    if args.report:
+        with open(args.report, 'w') as out:
+            json.dump(report, out, indent=2)
+
+
+if __name__ == '__main__':
+    main()
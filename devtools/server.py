@@ -0,0 +1,285 @@
+"""Local all-in-one server for the stock API.
+
+Mounts every API function declared in template.yaml in one process, behind
+the vendored Werkzeug ThreadedWSGIServer. HTTP requests are translated into
+API Gateway proxy events and handed to the real `lambda_handler`s in-process,
+so there are no per-invoke containers and local load tests and profiles
+measure the handler code itself. With `--backend memory` (the default) the
+tables declared in the template are served from memory; `--backend aws` uses
+the DynamoDB tables of your configured AWS account.
+
+    python -m devtools.server --port 3000 --seed devtools/seed.json
+"""
+import argparse
+import base64
+import importlib
+import json
+import os
+import sys
+import threading
+import time
+import traceback
+import uuid
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# The shared layer, as Lambda mounts it at /opt/python
+for path in (ROOT, os.path.join(ROOT, 'common', 'python')):
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+try:
+    import werkzeug  # noqa: F401
+except ImportError:
+    # Werkzeug is vendored with discover_services
+    sys.path.append(os.path.join(ROOT, 'discover_services'))
+
+import yaml
+from werkzeug.serving import ThreadedWSGIServer, WSGIRequestHandler
+from werkzeug.wrappers import Request, Response
+
+from devtools.memory_table import MemoryResource
+
+TEMPLATE = os.path.join(ROOT, 'template.yaml')
+
+
+# Safe loader that ignores CloudFormation intrinsic tags (!Ref, !Sub, ...)
+class _TemplateLoader(yaml.SafeLoader):
+    pass
+
+
+_TemplateLoader.add_multi_constructor('!', lambda loader, suffix, node: None)
+
+
+def load_template(path=TEMPLATE):
+    with open(path) as template:
+        return yaml.load(template, Loader=_TemplateLoader)
+
+
+# (resource, METHOD, module, handler name, function name, timeout) for every
+# API event on the main API. The optional router deployment is skipped: it
+# serves the same handlers.
+def api_routes(template):
+    globals_ = (template.get('Globals') or {}).get('Function') or {}
+    routes = []
+    for name, resource in (template.get('Resources') or {}).items():
+        if resource.get('Type') != 'AWS::Serverless::Function' or resource.get('Condition'):
+            continue
+        properties = resource.get('Properties') or {}
+        handler = properties.get('Handler') or globals_.get('Handler', 'app.lambda_handler')
+        module_name, _, function_name = handler.rpartition('.')
+        package = properties.get('CodeUri', './').strip('./').replace('/', '.')
+        module = f'{package}.{module_name}' if package else module_name
+        timeout = properties.get('Timeout') or globals_.get('Timeout', 3)
+
+        for event in (properties.get('Events') or {}).values():
+            if event.get('Type') != 'Api':
+                continue
+            path = event['Properties']['Path']
+            method = event['Properties']['Method'].upper()
+            routes.append((path, method, module, function_name, properties.get('FunctionName', name), timeout))
+    return routes
+
+
+# MemoryResource with every DynamoDB table declared in the template
+def memory_backend(template):
+    backend = MemoryResource()
+    for name, resource in (template.get('Resources') or {}).items():
+        properties = resource.get('Properties') or {}
+        if resource.get('Type') == 'AWS::DynamoDB::Table':
+            keys = {k['KeyType']: k['AttributeName'] for k in properties['KeySchema']}
+            table = backend.add_table(properties.get('TableName') or name, keys['HASH'], keys.get('RANGE'))
+            for index in properties.get('GlobalSecondaryIndexes') or []:
+                keys = {k['KeyType']: k['AttributeName'] for k in index['KeySchema']}
+                table.add_index(index['IndexName'], keys['HASH'], keys.get('RANGE'))
+        elif resource.get('Type') == 'AWS::Serverless::SimpleTable':
+            primary_key = (properties.get('PrimaryKey') or {}).get('Name', 'id')
+            backend.add_table(properties.get('TableName') or name, primary_key)
+    return backend
+
+
+def seed_backend(backend, path):
+    with open(path) as seed:
+        tables = json.load(seed, parse_float=str)
+    for table_name, items in tables.items():
+        table = backend.Table(table_name)
+        for item in items:
+            table.put_item(Item=item)
+
+
+# Per-request access logging would dominate a local load test
+class QuietRequestHandler(WSGIRequestHandler):
+
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+class LambdaContext:
+    """The attributes of the Lambda context object the handlers may read"""
+
+    def __init__(self, function_name, timeout):
+        self.function_name = function_name
+        self.function_version = '$LATEST'
+        self.invoked_function_arn = f'arn:aws:lambda:local:000000000000:function:{function_name}'
+        self.memory_limit_in_mb = 128
+        self.aws_request_id = str(uuid.uuid4())
+        self.log_group_name = f'/aws/lambda/{function_name}'
+        self.log_stream_name = 'local'
+        self._deadline = time.monotonic() + timeout
+
+    def get_remaining_time_in_millis(self):
+        return max(int((self._deadline - time.monotonic()) * 1000), 0)
+
+
+# Build the API Gateway proxy event for a request
+def proxy_event(request, resource, path_parameters):
+    body = request.get_data(as_text=True)
+    return {
+        'resource': resource,
+        'path': request.path,
+        'httpMethod': request.method,
+        'headers': dict(request.headers),
+        'multiValueHeaders': {k: request.headers.getlist(k) for k in request.headers.keys()},
+        'queryStringParameters': request.args.to_dict() or None,
+        'multiValueQueryStringParameters': request.args.to_dict(flat=False) or None,
+        'pathParameters': path_parameters or None,
+        'stageVariables': None,
+        'requestContext': {
+            'resourcePath': resource,
+            'httpMethod': request.method,
+            'path': f'/local{request.path}',
+            'stage': 'local',
+            'requestId': str(uuid.uuid4()),
+            'requestTimeEpoch': int(time.time() * 1000),
+            'identity': {'sourceIp': request.remote_addr},
+        },
+        'body': body or None,
+        'isBase64Encoded': False,
+    }
+
+
+def proxy_response(result):
+    body = result.get('body') or ''
+    if result.get('isBase64Encoded'):
+        body = base64.b64decode(body)
+    response = Response(body, status=int(result.get('statusCode', 200)))
+    response.headers.pop('Content-Type', None)
+    for key, value in (result.get('headers') or {}).items():
+        response.headers[key] = str(value)
+    for key, values in (result.get('multiValueHeaders') or {}).items():
+        for value in values:
+            response.headers.add(key, str(value))
+    if 'Content-Type' not in response.headers:
+        response.headers['Content-Type'] = 'application/json'
+    return response
+
+
+def json_response(status, message):
+    return Response(json.dumps({'message': message}), status=status, content_type='application/json')
+
+
+class DevServerApp:
+    """WSGI application dispatching requests to the mounted handlers"""
+
+    def __init__(self, routes, capture=None):
+        # Imported here so handlers load after the backend and environment are set
+        from router.app import compile_resource
+
+        # Writable file receiving every proxy event as one NDJSON line
+        self.capture = capture
+        self._capture_lock = threading.Lock()
+        self.handlers = {}
+        resources = {}
+        for resource, method, module, function_name, name, timeout in routes:
+            try:
+                handler = getattr(importlib.import_module(module), function_name)
+            except Exception as e:
+                # One function that cannot load locally should not take the others down
+                print(f'Not mounting {name} ({module}): {e}')
+                continue
+            self.handlers[(resource, method)] = (handler, name, timeout)
+            resources[resource] = compile_resource(resource)
+
+        # Static resources first so /stock/list never matches /stock/{ticker}
+        self.patterns = sorted(resources.items(), key=lambda entry: ('{' in entry[0], entry[0]))
+
+    def match(self, path):
+        for resource, pattern in self.patterns:
+            match = pattern.match(path)
+            if match:
+                return resource, match.groupdict()
+        return None, None
+
+    def __call__(self, environ, start_response):
+        request = Request(environ)
+        resource, path_parameters = self.match(request.path)
+        if resource is None:
+            response = json_response(404, 'Not Found')
+        else:
+            route = self.handlers.get((resource, request.method)) or self.handlers.get((resource, 'ANY'))
+            if route is None:
+                response = json_response(405, f'Method {request.method} not allowed on {resource}')
+            else:
+                event = proxy_event(request, resource, path_parameters)
+                if self.capture is not None:
+                    self.record(event)
+                response = self.invoke(route, event)
+        return response(environ, start_response)
+
+    # Append the event to the capture, for replay with devtools.replay
+    def record(self, event):
+        line = json.dumps(event, separators=(',', ':')) + '\n'
+        with self._capture_lock:
+            self.capture.write(line)
+            self.capture.flush()
+
+    def invoke(self, route, event):
+        handler, name, timeout = route
+        try:
+            return proxy_response(handler(event, LambdaContext(name, timeout)))
+        except Exception:
+            traceback.print_exc()
+            # What API Gateway returns when the integration fails
+            return json_response(502, 'Internal server error')
+
+
+def build_app(template=None, backend='memory', seed=None, capture=None):
+    from stock_common import dynamo
+
+    template = template or load_template()
+    if backend == 'memory':
+        # Clients for other services (S3, Cloud Map) can still be created offline
+        os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+        resource = memory_backend(template)
+        if seed:
+            seed_backend(resource, seed)
+        dynamo.use_backend(resource)
+    return DevServerApp(api_routes(template), capture)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve every API function in one local process')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=3000)
+    parser.add_argument('--backend', choices=['memory', 'aws'], default='memory')
+    parser.add_argument('--seed', help='JSON file of {"table-name": [items]} loaded into the memory backend')
+    parser.add_argument('--template', default=TEMPLATE)
+    parser.add_argument('--metrics', action='store_true', help='Print EMF metrics for every request')
+    parser.add_argument('--log-requests', action='store_true', help='Log every request')
+    parser.add_argument('--capture', help='Append every request as a proxy event to this NDJSON file')
+    args = parser.parse_args(argv)
+
+    # Metrics print per invocation, which dominates a local load test
+    if not args.metrics:
+        os.environ.setdefault('STOCK_METRICS', '0')
+
+    capture = open(args.capture, 'a') if args.capture else None
+    app = build_app(load_template(args.template), args.backend, args.seed, capture)
+    handler = WSGIRequestHandler if args.log_requests else QuietRequestHandler
+    server = ThreadedWSGIServer(args.host, args.port, app, handler)
+    print(f'Serving {len(app.handlers)} routes on http://{args.host}:{server.server_port} ({args.backend} backend)')
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
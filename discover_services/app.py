@@ -2,11 +2,12 @@ import json
 from flask import Flask, jsonify, request
 import boto3
 from botocore.exceptions import BotoCoreError, ClientError
+from stock_common.metrics import instrument_client, metered
 
 app = Flask(__name__)
 
 # Initialize the AWS Service Discovery client
-client = boto3.client('servicediscovery')
+client = instrument_client(boto3.client('servicediscovery'))
 
 @app.route('/discover-services', methods=['GET'])
 def discover_services():
@@ -46,6 +47,7 @@ def discover_services():
         return jsonify({"error": str(e)}), 500
 
 # Lambda handler for AWS integration
+@metered
 def lambda_handler(event, context):
     # Log the incoming event to inspect its structure
     print("Event received:", event)
@@ -0,0 +1,264 @@
+import csv
+import gzip
+import hashlib
+import io
+import json
+import os
+import time
+import boto3
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal
+from stock_common import changes, mmapsnap
+from stock_common.dynamo import STOCKS_TABLE, new_resource
+from stock_common.metrics import capacity_units, metered, timed
+from stock_common.profiling import profiled, span
+from stock_common.singleflight import LEASE_OWNER, LEASE_UNTIL
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # Parquet is optional; fall back to typed, gzipped CSV
+    pyarrow = None
+
+# s3://bucket/prefix or a local directory (for testing)
+DESTINATION = os.environ.get('SNAPSHOT_DESTINATION', '/tmp/stock-snapshots')
+SEGMENTS = int(os.environ.get('SNAPSHOT_SEGMENTS', '4'))
+FORMAT = os.environ.get('SNAPSHOT_FORMAT', 'parquet' if pyarrow is not None else 'csv')
+
+# Write the memory-mapped read snapshot from the same scan as the columnar one
+READ_SNAPSHOT = os.environ.get('SNAPSHOT_READ_SNAPSHOT', '1') != '0'
+
+# Read capacity units per second the scan may use across its segments, so it
+# leaves the rest of the stocks table's provisioned reads to the API; 0 for
+# no limit. Items per scan page, so each pause follows a small read.
+SCAN_CAPACITY_UNITS = float(os.environ.get('SNAPSHOT_SCAN_CAPACITY_UNITS', '2'))
+SCAN_PAGE_ITEMS = 100
+
+# Column types for the attributes the stock functions write; others are inferred
+KNOWN_COLUMNS = {
+    'ticker': 'string',
+    'company_name': 'string',
+    'exchange': 'string',
+    'sector': 'string',
+    'price': 'double',
+    'volume': 'int64',
+    'latest_trading_day': 'string',
+    'previous_close': 'double',
+    'change': 'double',
+    'change_percent': 'string',
+}
+
+# Refresh lease attributes older stock items may still carry; in neither snapshot
+LEASE_COLUMNS = {LEASE_UNTIL, LEASE_OWNER}
+
+# Sync bookkeeping left out of the columnar snapshot, so its schema and schema
+# hash only follow the stock data. The read snapshot keeps it, answering in the
+# shape a scan of the table does.
+SKIPPED_COLUMNS = set(changes.INTERNAL_FIELDS) | {'updated_seq', 'updated_at'} | LEASE_COLUMNS
+
+
+# Write a columnar snapshot of the stocks table plus its manifest, and the
+# read snapshot from the same scan
+@profiled
+@metered
+def lambda_handler(event, context):
+    event = event or {}
+    destination = event.get('destination', DESTINATION)
+    snapshot_format = event.get('format', FORMAT)
+    segments = int(event.get('segments', SEGMENTS))
+
+    if snapshot_format == 'mmap':
+        return write_read_snapshot(destination, segments)
+    if snapshot_format == 'parquet' and pyarrow is None:
+        snapshot_format = 'csv'
+
+    read_snapshot = event.get('read_snapshot', READ_SNAPSHOT)
+    # Read before the scan, so every write up to it is in the snapshot or still settling
+    seq = changes.current_seq(boto3.resource) if read_snapshot else None
+    items = parallel_scan(segments)
+    rows = [{k: v for k, v in item.items() if k not in SKIPPED_COLUMNS} for item in items]
+    schema = infer_schema(rows)
+
+    with span('serialize'):
+        if snapshot_format == 'parquet':
+            data, extension = encode_parquet(rows, schema), 'parquet'
+        else:
+            data, extension = encode_csv_gzip(rows, schema), 'csv.gz'
+
+    name = f'stocks-{time.strftime("%Y%m%dT%H%M%SZ", time.gmtime())}.{extension}'
+    manifest = {
+        'snapshot': name,
+        'format': snapshot_format,
+        'rows': len(rows),
+        'bytes': len(data),
+        'segments': segments,
+        'schema': [{'name': column, 'type': column_type} for column, column_type in schema],
+        'schema_hash': schema_hash(schema),
+        'created_at': int(time.time()),
+    }
+    manifest_data = json.dumps(manifest, indent=2).encode('utf-8')
+
+    write_object(destination, name, data)
+    write_object(destination, name.split('.')[0] + '.manifest.json', manifest_data)
+    # The stable manifest name always points at the newest snapshot
+    write_object(destination, 'manifest.json', manifest_data)
+
+    if read_snapshot:
+        write_read_snapshot(destination, segments, items, seq)
+
+    return manifest
+
+
+# Write the memory-mapped read snapshot (stock_common.mmapsnap) under its
+# stable name, replacing the previous one. Scans the table unless given the
+# items of a scan and the counter value read before it.
+def write_read_snapshot(destination, segments, items=None, seq=None):
+    if items is None:
+        # Read before the scan, so every write up to it is in the snapshot or still settling
+        seq = changes.current_seq(boto3.resource)
+        items = parallel_scan(segments)
+    created_at = int(time.time())
+
+    with span('serialize'):
+        data = mmapsnap.build(items, seq, created_at)
+
+    write_object(destination, mmapsnap.SNAPSHOT_NAME, data)
+
+    return {
+        'snapshot': mmapsnap.SNAPSHOT_NAME,
+        'format': 'mmap',
+        'rows': len(items),
+        'bytes': len(data),
+        'segments': segments,
+        'seq': seq,
+        'created_at': created_at,
+    }
+
+
+# Scan the table with parallel segments and merge the results. Each segment
+# gets its own resource, created here rather than on the segment threads.
+def parallel_scan(segments):
+    tables = [new_resource(boto3.resource).Table(STOCKS_TABLE) for _ in range(segments)]
+    with ThreadPoolExecutor(max_workers=segments) as executor:
+        pages = executor.map(lambda segment: scan_segment(tables[segment], segment, segments), range(segments))
+        items = [item for page in pages for item in page]
+    items.sort(key=lambda item: item['ticker'])
+    return items
+
+
+# Read every page of one scan segment, pausing after each page for the
+# capacity it consumed to stay within this segment's share of the budget
+def scan_segment(table, segment, total_segments):
+    scan_args = {'Segment': segment, 'TotalSegments': total_segments,
+                 'Limit': SCAN_PAGE_ITEMS, 'ReturnConsumedCapacity': 'TOTAL'}
+    units_per_second = SCAN_CAPACITY_UNITS / total_segments
+    items = []
+    while True:
+        response = table.scan(**scan_args)
+        items.extend(
+            {k: v for k, v in item.items() if k not in LEASE_COLUMNS}
+            for item in response.get('Items', [])
+        )
+        if 'LastEvaluatedKey' not in response:
+            return items
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+        if units_per_second > 0:
+            time.sleep(capacity_units(response.get('ConsumedCapacity')) / units_per_second)
+
+
+# Infer a column type for an attribute that is not in KNOWN_COLUMNS
+def infer_type(values):
+    present = [v for v in values if v is not None]
+    if not present:
+        return 'string'
+    if all(isinstance(v, bool) for v in present):
+        return 'bool'
+    if all(isinstance(v, Decimal) for v in present):
+        return 'int64' if all(v % 1 == 0 for v in present) else 'double'
+    if all(isinstance(v, str) for v in present):
+        return 'string'
+    return 'json'
+
+
+# Ordered (column, type) pairs for the snapshot
+def infer_schema(items):
+    known_order = list(KNOWN_COLUMNS)
+    columns = {column for item in items for column in item}
+    schema = []
+    # Known columns keep their declared order; any others follow alphabetically
+    for column in sorted(columns, key=lambda c: (known_order.index(c), '') if c in KNOWN_COLUMNS else (len(known_order), c)):
+        column_type = KNOWN_COLUMNS.get(column) or infer_type([item.get(column) for item in items])
+        schema.append((column, column_type))
+    return schema
+
+
+def schema_hash(schema):
+    canonical = json.dumps([[column, column_type] for column, column_type in schema], separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+# Convert an attribute value to the Python value for its column type
+def convert(value, column_type):
+    if value is None:
+        return None
+    try:
+        if column_type == 'double':
+            return float(value)
+        if column_type == 'int64':
+            return int(Decimal(value))
+        if column_type == 'bool':
+            return bool(value)
+        if column_type == 'json':
+            return json.dumps(value, default=str, sort_keys=True)
+    except (ArithmeticError, ValueError, TypeError):
+        return None
+    return str(value)
+
+
+def encode_parquet(items, schema):
+    arrow_types = {
+        'string': pyarrow.string(),
+        'json': pyarrow.string(),
+        'double': pyarrow.float64(),
+        'int64': pyarrow.int64(),
+        'bool': pyarrow.bool_(),
+    }
+    table = pyarrow.table({
+        column: pyarrow.array([convert(item.get(column), column_type) for item in items],
+                              type=arrow_types[column_type])
+        for column, column_type in schema
+    })
+    buffer = io.BytesIO()
+    pyarrow.parquet.write_table(table, buffer, compression='zstd')
+    return buffer.getvalue()
+
+
+# Gzipped CSV whose header row carries the column types as name:type
+def encode_csv_gzip(items, schema):
+    buffer = io.BytesIO()
+    with gzip.GzipFile(fileobj=buffer, mode='wb', mtime=0) as compressed:
+        text = io.TextIOWrapper(compressed, encoding='utf-8', newline='')
+        writer = csv.writer(text)
+        writer.writerow([f'{column}:{column_type}' for column, column_type in schema])
+        for item in items:
+            row = [convert(item.get(column), column_type) for column, column_type in schema]
+            writer.writerow(['' if value is None else value for value in row])
+        text.flush()
+        text.detach()
+    return buffer.getvalue()
+
+
+# Write bytes to s3://bucket/prefix/<name> or <directory>/<name>
+def write_object(destination, name, data):
+    if destination.startswith('s3://'):
+        bucket, _, prefix = destination[len('s3://'):].partition('/')
+        key = f'{prefix.rstrip("/")}/{name}' if prefix else name
+        with timed('s3.PutObject'):
+            boto3.client('s3').put_object(Bucket=bucket, Key=key, Body=data)
+        return f's3://{bucket}/{key}'
+
+    os.makedirs(destination, exist_ok=True)
+    path = os.path.join(destination, name)
+    with open(path, 'wb') as output:
+        output.write(data)
+    return path
@@ -0,0 +1,111 @@
+import json
+import os
+import boto3
+import decimal
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+from stock_common.dynamo import get_table
+from stock_common.metrics import metered
+from stock_common.profiling import profiled, span
+
+AGGREGATES_TABLE = os.environ.get('AGGREGATES_TABLE_NAME', 'stock-aggregates-table')
+
+GROUP_TYPES = ['sector', 'exchange']
+
+# Attributes returned to clients; mean_change is derived from the change sum and count
+SUMMARY_FIELDS = ['group_type', 'group_name', 'count', 'sum_volume', 'mean_change',
+                  'min_change', 'max_change', 'updated_at']
+
+# Attributes read from an aggregate item
+READ_FIELDS = [f for f in SUMMARY_FIELDS if f != 'mean_change'] + ['sum_change', 'change_count']
+
+
+# Read precomputed sector/exchange aggregates
+@profiled
+@metered
+def lambda_handler(event, context):
+
+    # ================== Sample Input ================== #
+    # GET /stock/aggregates?sector=Technology   -> one group
+    # GET /stock/aggregates?by=exchange         -> every exchange
+    # ================================================== #
+
+    if event.get('httpMethod') != 'GET':
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': 'Bad Request: invalid HTTP method'})
+        }
+
+    params = event.get('queryStringParameters') or {}
+    group_type = next((g for g in GROUP_TYPES if params.get(g)), None)
+    by = params.get('by')
+
+    if group_type is None and by not in GROUP_TYPES:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': f'Bad Request: pass one of {", ".join(GROUP_TYPES)} or by=<{"|".join(GROUP_TYPES)}>'})
+        }
+
+    try:
+        if group_type is not None:
+            result = get_aggregate_from_db(group_type, params[group_type])
+            if result is None:
+                return {
+                    'statusCode': 404,
+                    'body': json.dumps({'message': 'Aggregate not found'})
+                }
+        else:
+            result = get_aggregates_from_db(by)
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'message': 'Error retrieving aggregates'})
+        }
+
+    with span('serialize'):
+        body = json.dumps(result, default=handle_decimal_type)
+
+    return {
+        'statusCode': 200,
+        'body': body
+    }
+
+
+def projection():
+    return {
+        'ProjectionExpression': ', '.join(f'#{f}' for f in READ_FIELDS),
+        'ExpressionAttributeNames': {f'#{f}': f for f in READ_FIELDS}
+    }
+
+
+# The client view of an aggregate item, with the mean change computed
+def summarize(item):
+    summary = {k: v for k, v in item.items() if k in SUMMARY_FIELDS}
+    if item.get('change_count'):
+        summary['mean_change'] = (item['sum_change'] / item['change_count']).quantize(decimal.Decimal('0.0001'))
+    return summary
+
+
+# Fetch a single group's aggregate item (one GetItem)
+def get_aggregate_from_db(group_type, group_name):
+    table = get_table(boto3.resource, AGGREGATES_TABLE)
+    response = table.get_item(Key={'group_type': group_type, 'group_name': group_name}, **projection())
+    item = response.get('Item')
+    return summarize(item) if item is not None else None
+
+
+# Fetch every group of one type (one Query over a handful of items)
+def get_aggregates_from_db(group_type):
+    table = get_table(boto3.resource, AGGREGATES_TABLE)
+    response = table.query(KeyConditionExpression=Key('group_type').eq(group_type), **projection())
+    return [summarize(item) for item in response.get('Items', [])]
+
+
+def handle_decimal_type(obj):
+    if isinstance(obj, decimal.Decimal):
+        if obj % 1 == 0:
+            return int(obj)
+        else:
+            return float(obj)
+    raise TypeError
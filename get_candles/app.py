@@ -0,0 +1,99 @@
+import json
+import boto3
+import decimal
+from botocore.exceptions import ClientError
+from stock_common import packed
+from stock_common.candles import CANDLES_TABLE, RESOLUTIONS, query_series, series_key
+from stock_common.dynamo import get_table
+from stock_common.metrics import metered
+from stock_common.profiling import profiled, span
+
+DEFAULT_LIMIT = 500
+MAX_LIMIT = 1000
+
+# Attributes returned for each candle
+CANDLE_FIELDS = ['bucket_start', 'open', 'high', 'low', 'close', 'volume', 'ticks']
+
+
+# Read precomputed OHLCV candles: GET /stock/{ticker}/candles?res=1h&from=&to=&limit=
+@profiled
+@metered
+def lambda_handler(event, context):
+
+    # Validate the incoming event
+    if not event.get('pathParameters') or event['httpMethod'] != 'GET':
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': 'Bad Request'})
+        }
+
+    ticker = event['pathParameters'].get('ticker')
+    params = event.get('queryStringParameters') or {}
+    resolution = params.get('res', '1h')
+
+    if not ticker or resolution not in RESOLUTIONS:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': f'Bad Request: res must be one of {", ".join(RESOLUTIONS)}'})
+        }
+
+    try:
+        start = int(params['from']) if params.get('from') else None
+        end = int(params['to']) if params.get('to') else None
+        limit = min(int(params.get('limit', DEFAULT_LIMIT)), MAX_LIMIT)
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': 'Bad Request: from, to and limit must be integers'})
+        }
+
+    try:
+        candles = query_candles(ticker, resolution, start, end, limit)
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'message': 'Error reading candles'})
+        }
+
+    with span('serialize'):
+        body = json.dumps({
+            'ticker': ticker,
+            'resolution': resolution,
+            'candles': candles
+        }, default=handle_decimal_type)
+
+    return {
+        'statusCode': 200,
+        'body': body
+    }
+
+
+# Range query over one series. Without `from` the newest `limit` candles are
+# returned; either way candles come back oldest first. Daily candles are read
+# from the packed monthly history when it is enabled.
+def query_candles(ticker, resolution, start, end, limit):
+    table = get_table(boto3.resource, CANDLES_TABLE)
+    if resolution == '1d' and packed.ENABLED and packed.np is not None:
+        columns = packed.read_daily(table, ticker, start, end, limit)
+        with span('serialize'):
+            rows = zip(*(columns[f].tolist() for f in packed.COLUMNS))
+            return [candle_row(row) for row in rows]
+    return query_series(table, series_key(ticker, resolution), start, end, limit, CANDLE_FIELDS)
+
+
+# A packed day as the 1d series returns it: ticks only when quotes were folded into it
+def candle_row(row):
+    candle = dict(zip(packed.COLUMNS, row))
+    if not candle['ticks']:
+        del candle['ticks']
+    return candle
+
+
+def handle_decimal_type(obj):
+    if isinstance(obj, decimal.Decimal):
+        if obj % 1 == 0:
+            return int(obj)
+        else:
+            return float(obj)
+    raise TypeError
@@ -2,7 +2,17 @@ import json
 import boto3
 import decimal
 from botocore.exceptions import ClientError
+from stock_common.dynamo import get_table
+from stock_common.fields import FieldsError, parse_fields, projection_args
+from stock_common.metrics import metered
+from stock_common.profiling import profiled, span
+from stock_common.readcounts import ReadCounter
 
+# Reads since the last refresh, for the scheduled refresher's ranking
+read_counter = ReadCounter()
+
+@profiled
+@metered
 def lambda_handler(event, context):
 
     # Validate the incoming event
@@ -15,8 +25,17 @@ def lambda_handler(event, context):
     # Extract the stock ticker from the path parameters
     ticker = event['pathParameters']['ticker']
 
+    # Only read the attributes asked for with ?fields=price,volume
+    try:
+        fields = parse_fields(event.get('queryStringParameters'))
+    except FieldsError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': str(e)})
+        }
+
     # Fetch the stock data from DynamoDB
-    response = get_stock_from_db(ticker)
+    response = get_stock_from_db(ticker, fields)
 
     # Handle the case where the stock is not found
     if 'Item' not in response:
@@ -25,18 +44,23 @@ def lambda_handler(event, context):
             'body': json.dumps({'message': 'Stock not found'})
         }
 
+    # Counted in the container and written in batches, never to the stocks table
+    read_counter.record(boto3.resource, ticker)
+
     # Return the stock data
+    with span('serialize'):
+        body = json.dumps(response['Item'], indent=2, default=handle_decimal_type)
+
     return {
         'statusCode': 200,
-        'body': json.dumps(response['Item'], indent=2, default=handle_decimal_type)
+        'body': body
     }
 
-def get_stock_from_db(ticker):
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table('stocks-table')  # Replace with your actual table name
+def get_stock_from_db(ticker, fields=None):
+    table = get_table(boto3.resource)
 
     try:
-        response = table.get_item(Key={'ticker': ticker})
+        response = table.get_item(Key={'ticker': ticker}, **projection_args(fields))
         return response
     except ClientError as e:
         print(e.response['Error']['Message'])
@@ -1,26 +1,73 @@
+import base64
 import json
 import boto3
 import decimal
+from boto3.dynamodb.conditions import Attr
 from botocore.exceptions import ClientError
+from stock_common import mmapsnap
+from stock_common.changes import TOMBSTONES_TABLE, changes_since
+from stock_common.dynamo import get_table
+from stock_common.fields import FieldsError, parse_fields, projection_args
+from stock_common.metrics import metered
+from stock_common.profiling import profiled, span
 
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
 
-# Get a list of all stocks
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 1000
+
+
+# Get a list of all stocks, or of those whose ticker starts with ?prefix=
+@profiled
+@metered
 def lambda_handler(event, context):
-    response = get_stocks_from_db()
+    if event.get('resource') == '/stock/export':
+        return export_handler(event)
+    if event.get('resource') == '/stock/changes':
+        return changes_handler(event)
+
+    # Only read the attributes asked for with ?fields=price,volume
+    try:
+        fields = parse_fields(event.get('queryStringParameters'))
+    except FieldsError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': str(e)})
+        }
+
+    prefix = (event.get('queryStringParameters') or {}).get('prefix') or None
+
+    # A fresh read snapshot answers without a scan
+    source = mmapsnap.default_source()
+    snapshot = source.current() if source is not None else None
+    if snapshot is not None:
+        with span('serialize'):
+            body = get_stocks_from_snapshot(snapshot, prefix, fields)
+        return {
+            'statusCode': 200,
+            'body': body
+        }
+
+    response = get_stocks_from_db(fields, prefix)
+
+    with span('serialize'):
+        body = json.dumps(response, indent=2, default=handle_decimal_type)
 
     return {
         'statusCode': 200,
-        'body': json.dumps(response, indent=2, default=handle_decimal_type)
+        'body': body
     }
 
 
 # Get a list of all stocks from DynamoDB table
-def get_stocks_from_db():
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table('stocks-table')  # Updated table name
+def get_stocks_from_db(fields=None, prefix=None):
+    table = get_table(boto3.resource)
+    scan_args = projection_args(fields)
+    if prefix:
+        scan_args['FilterExpression'] = Attr('ticker').begins_with(prefix)
 
     try:
-        response = table.scan()
+        response = table.scan(**scan_args)
     except ClientError as e:
         print(e.response['Error']['Message'])
         return []
@@ -28,6 +75,185 @@ def get_stocks_from_db():
         return response.get('Items', [])
 
 
+# The JSON list body straight from the snapshot's heap. Items are only
+# decoded to drop the attributes not asked for.
+def get_stocks_from_snapshot(snapshot, prefix=None, fields=None):
+    start, end = snapshot.prefix_range(prefix) if prefix else (0, len(snapshot))
+    if not fields:
+        return snapshot.items_json(start, end).decode('utf-8')
+    items = []
+    for i in range(start, end):
+        item = json.loads(bytes(snapshot.item_json(i)))
+        items.append({field: item[field] for field in fields if field in item})
+    return json.dumps(items)
+
+
+# Export the table as NDJSON, one scan page per API Gateway response.
+# API Gateway buffers Lambda responses, so clients follow the X-Next-Cursor
+# header (or the `cursor` query parameter) until it is absent.
+def export_handler(event):
+    params = event.get('queryStringParameters') or {}
+
+    if event.get('httpMethod') != 'GET' or params.get('format', 'ndjson') != 'ndjson':
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': 'Bad Request: only GET with format=ndjson is supported'})
+        }
+
+    try:
+        fields = parse_fields(params)
+    except FieldsError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': str(e)})
+        }
+
+    try:
+        start_key = decode_cursor(params.get('cursor'))
+        limit = int(params['limit']) if params.get('limit') else None
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': 'Bad Request: invalid cursor or limit'})
+        }
+    if limit is not None and limit < 1:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': 'Bad Request: limit must be at least 1'})
+        }
+
+    try:
+        items, last_key = next(iter_stock_pages(limit=limit, start_key=start_key, fields=fields))
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'message': 'Error exporting stocks'})
+        }
+
+    headers = {'Content-Type': NDJSON_CONTENT_TYPE}
+    if last_key is not None:
+        headers['X-Next-Cursor'] = encode_cursor(last_key)
+
+    with span('serialize'):
+        body = ''.join(ndjson_lines(items))
+
+    return {
+        'statusCode': 200,
+        'headers': headers,
+        'body': body
+    }
+
+
+# Stocks changed after a sequence number: GET /stock/changes?since=<seq>&limit=&fields=
+# Clients start from since=0 and pass next_since back until has_more is false.
+def changes_handler(event):
+    params = event.get('queryStringParameters') or {}
+
+    if event.get('httpMethod') != 'GET':
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': 'Bad Request: only GET is supported'})
+        }
+
+    try:
+        since = int(params.get('since', 0))
+        limit = min(int(params.get('limit', DEFAULT_CHANGES_LIMIT)), MAX_CHANGES_LIMIT)
+    except ValueError:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': 'Bad Request: since and limit must be integers'})
+        }
+    if since < 0 or limit < 1:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': 'Bad Request: since must be 0 or more and limit at least 1'})
+        }
+
+    try:
+        fields = parse_fields(params)
+    except FieldsError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': str(e)})
+        }
+    # The sequence and write time drive the merge with deletes and the settle window
+    if fields:
+        fields = list(dict.fromkeys(fields + ['updated_seq', 'updated_at']))
+
+    try:
+        result = changes_since(get_table(boto3.resource), get_table(boto3.resource, TOMBSTONES_TABLE),
+                               since, limit, projection_args(fields))
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'message': 'Error reading changes'})
+        }
+
+    with span('serialize'):
+        body = json.dumps(result, default=handle_decimal_type)
+
+    return {
+        'statusCode': 200,
+        'body': body
+    }
+
+
+# Stream the whole table as NDJSON chunks, one chunk per scan page.
+# Hosts that can stream a response (chunked transfer, Lambda response
+# streaming through a web adapter) iterate this directly, so memory stays
+# bounded by a single page regardless of table size.
+def iter_export_chunks(limit=None, fields=None):
+    for items, _ in iter_stock_pages(limit=limit, fields=fields):
+        if items:
+            yield ''.join(ndjson_lines(items)).encode('utf-8')
+
+
+# Write the whole table as NDJSON to a writable stream
+def stream_stocks_ndjson(stream, limit=None, fields=None):
+    for chunk in iter_export_chunks(limit=limit, fields=fields):
+        stream.write(chunk)
+
+
+# Scan the table lazily, yielding (items, last_evaluated_key) per page
+def iter_stock_pages(limit=None, start_key=None, fields=None):
+    table = get_table(boto3.resource)
+    scan_args = projection_args(fields)
+    if limit:
+        scan_args['Limit'] = limit
+
+    while True:
+        if start_key is not None:
+            scan_args['ExclusiveStartKey'] = start_key
+        response = table.scan(**scan_args)
+        start_key = response.get('LastEvaluatedKey')
+        yield response.get('Items', []), start_key
+        if start_key is None:
+            return
+
+
+def ndjson_lines(items):
+    for item in items:
+        yield json.dumps(item, separators=(',', ':'), default=handle_decimal_type) + '\n'
+
+
+def encode_cursor(key):
+    return base64.urlsafe_b64encode(json.dumps(key, default=handle_decimal_type).encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    if not cursor:
+        return None
+    try:
+        key = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except Exception:
+        raise ValueError('invalid cursor')
+    if not isinstance(key, dict):
+        raise ValueError('invalid cursor')
+    return key
+
+
 # Converter for Decimal objects for JSON serialization
 def handle_decimal_type(obj):
     if isinstance(obj, decimal.Decimal):
@@ -35,4 +261,4 @@ def handle_decimal_type(obj):
             return int(obj)
         else:
             return float(obj)
-    raise TypeError
\ No newline at end of file
+    raise TypeError
@@ -0,0 +1,135 @@
+import json
+import boto3
+import decimal
+from botocore.exceptions import ClientError
+from stock_common import alerts
+from stock_common.dynamo import get_table
+from stock_common.metrics import metered
+from stock_common.profiling import profiled, span
+
+# Create, list and delete a stock's price-alert rules
+@profiled
+@metered
+def lambda_handler(event, context):
+
+    # ================== Sample Input ================== #
+    # event = {
+    #     "httpMethod": "POST",
+    #     "pathParameters": {"ticker": "AAPL"},
+    #     "body": json.dumps({"metric": "price", "direction": "above", "threshold": 200})
+    # }
+    # ================================================== #
+
+    path_parameters = event.get('pathParameters') or {}
+    ticker = path_parameters.get('ticker')
+    if not ticker:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': 'Bad Request: Missing stock ticker in path parameters'})
+        }
+
+    method = event.get('httpMethod')
+    try:
+        if method == 'POST':
+            return create_rule(ticker, event.get('body'))
+        if method == 'GET':
+            return list_rules(ticker)
+        if method == 'DELETE' and path_parameters.get('rule_id'):
+            return delete_rule(ticker, path_parameters['rule_id'])
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'message': 'Internal Server Error: Unable to access alert rules'})
+        }
+
+    return {
+        'statusCode': 400,
+        'body': json.dumps({'message': 'Bad Request: Invalid HTTP method'})
+    }
+
+
+def create_rule(ticker, body):
+    try:
+        with span('parse'):
+            request = json.loads(body or '')
+        rule = alerts.new_rule(ticker, request.get('metric'), request.get('direction'), request.get('threshold'))
+    except (json.JSONDecodeError, AttributeError, ValueError) as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': f'Bad Request: {str(e)}'})
+        }
+
+    get_table(boto3.resource, alerts.ALERTS_TABLE).put_item(Item=rule)
+
+    return {
+        'statusCode': 201,
+        'body': json.dumps(public_rule(rule), default=handle_decimal_type)
+    }
+
+
+def list_rules(ticker):
+    table = get_table(boto3.resource, alerts.ALERTS_TABLE)
+    query_args = {
+        'KeyConditionExpression': 'ticker = :ticker',
+        'ExpressionAttributeValues': {':ticker': ticker},
+    }
+    rules = []
+    while True:
+        response = table.query(**query_args)
+        rules.extend(public_rule(rule) for rule in response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    with span('serialize'):
+        body = json.dumps(rules, indent=2, default=handle_decimal_type)
+
+    return {
+        'statusCode': 200,
+        'body': body
+    }
+
+
+# Rules are keyed by their position in the threshold index, so find the key
+# for the rule id among the ticker's rules first
+def delete_rule(ticker, rule_id):
+    table = get_table(boto3.resource, alerts.ALERTS_TABLE)
+    query_args = {
+        'KeyConditionExpression': 'ticker = :ticker',
+        'FilterExpression': 'rule_id = :rule_id',
+        'ExpressionAttributeValues': {':ticker': ticker, ':rule_id': rule_id},
+        'ProjectionExpression': 'rule_key',
+    }
+    while True:
+        response = table.query(**query_args)
+        matches = response.get('Items', [])
+        if matches or 'LastEvaluatedKey' not in response:
+            break
+        query_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    if not matches:
+        return {
+            'statusCode': 404,
+            'body': json.dumps({'message': 'Alert rule not found'})
+        }
+
+    table.delete_item(Key={'ticker': ticker, 'rule_key': matches[0]['rule_key']})
+
+    return {
+        'statusCode': 200,
+        'body': json.dumps({'message': 'The alert rule was deleted successfully'})
+    }
+
+
+def public_rule(rule):
+    return {k: v for k, v in rule.items() if k != 'rule_key'}
+
+
+def handle_decimal_type(obj):
+    if isinstance(obj, decimal.Decimal):
+        if obj % 1 == 0:
+            return int(obj)
+        else:
+            return float(obj)
+    raise TypeError
@@ -0,0 +1,202 @@
+import json
+import math
+import time
+import boto3
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from decimal import Decimal, InvalidOperation
+from botocore.exceptions import ClientError
+from stock_common.dynamo import STOCKS_TABLE, get_resource
+from stock_common.metrics import metered
+from stock_common.profiling import profiled, span
+from stock_common.retry import THROTTLE_CODES
+
+# Keys accepted by one BatchGetItem request
+BATCH_GET_SIZE = 100
+MAX_POSITIONS = 10000
+MAX_WORKERS = 8
+MAX_UNPROCESSED_RETRIES = 5
+
+UNKNOWN_SECTOR = 'Unknown'
+
+
+# Value a set of holdings: market value, daily P&L, weights and sector exposure
+@profiled
+@metered
+def lambda_handler(event, context):
+
+    # ================== Sample Input ================== #
+    # event = {
+    #     "httpMethod": "POST",
+    #     "body": json.dumps({"AAPL": 10, "MSFT": 2.5})
+    # }
+    # ================================================== #
+
+    # Validate the incoming event
+    if not event.get('body') or event['httpMethod'] != 'POST':
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': 'Bad Request: Invalid HTTP method or missing body'})
+        }
+
+    # Parse the request body
+    try:
+        with span('parse'):
+            holdings = json.loads(event['body'], parse_float=Decimal)
+    except json.JSONDecodeError:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': 'Bad Request: Body is not valid JSON'})
+        }
+
+    try:
+        tickers, quantities = parse_holdings(holdings)
+    except ValueError as e:
+        return {
+            'statusCode': 400,
+            'body': json.dumps({'message': f'Bad Request: {str(e)}'})
+        }
+
+    try:
+        stocks = batch_get_stocks(tickers)
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        if e.response['Error']['Code'] in THROTTLE_CODES:
+            return {
+                'statusCode': 503,
+                'body': json.dumps({'message': 'Service Unavailable: Stock prices are being throttled, retry shortly'})
+            }
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'message': 'Internal Server Error: Unable to read stock prices'})
+        }
+
+    valuation = value_portfolio(tickers, quantities, stocks)
+
+    with span('serialize'):
+        body = json.dumps(valuation)
+
+    return {
+        'statusCode': 200,
+        'body': body
+    }
+
+
+# Validate {ticker: quantity} into parallel ticker and quantity lists
+def parse_holdings(holdings):
+    if not isinstance(holdings, dict) or not holdings:
+        raise ValueError('Body must be a non-empty object of {ticker: quantity}')
+    if len(holdings) > MAX_POSITIONS:
+        raise ValueError(f'At most {MAX_POSITIONS} positions are supported')
+
+    tickers = []
+    quantities = []
+    for ticker, quantity in holdings.items():
+        if not ticker or isinstance(quantity, bool):
+            raise ValueError(f'Invalid position {ticker!r}')
+        try:
+            quantity = Decimal(str(quantity))
+        except (InvalidOperation, ValueError):
+            raise ValueError(f'Quantity for {ticker} must be a number')
+        # NaN and Infinity parse as numbers but cannot be valued or serialized,
+        # and neither can quantities such as 1e400 that overflow a float
+        if not quantity.is_finite() or not math.isfinite(float(quantity)):
+            raise ValueError(f'Quantity for {ticker} must be a finite number')
+        quantities.append(float(quantity))
+        tickers.append(ticker)
+    return tickers, quantities
+
+
+# Read price, previous close and sector for every ticker with BatchGetItem,
+# 100 keys per request, the requests issued in parallel
+def batch_get_stocks(tickers):
+    dynamodb = get_resource(boto3.resource)
+    batches = [tickers[i:i + BATCH_GET_SIZE] for i in range(0, len(tickers), BATCH_GET_SIZE)]
+
+    stocks = {}
+    with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(batches))) as executor:
+        for items in executor.map(lambda batch: batch_get(dynamodb, batch), batches):
+            for item in items:
+                stocks[item['ticker']] = item
+    return stocks
+
+
+# One BatchGetItem request, re-requesting any unprocessed keys with backoff.
+# Keys still unprocessed after the retries mean the table is throttling, and
+# are reported as a throttling ClientError.
+def batch_get(dynamodb, tickers):
+    request = {
+        STOCKS_TABLE: {
+            'Keys': [{'ticker': ticker} for ticker in tickers],
+            'ProjectionExpression': 'ticker, price, previous_close, sector'
+        }
+    }
+    items = []
+    for attempt in range(MAX_UNPROCESSED_RETRIES + 1):
+        response = dynamodb.batch_get_item(RequestItems=request)
+        items.extend(response.get('Responses', {}).get(STOCKS_TABLE, []))
+        request = response.get('UnprocessedKeys')
+        if not request:
+            return items
+        time.sleep(0.05 * (2 ** attempt))
+    raise ClientError({'Error': {'Code': 'ProvisionedThroughputExceededException',
+                                 'Message': 'BatchGetItem left keys unprocessed after retries'}},
+                      'BatchGetItem')
+
+
+def as_float(value):
+    return float(value) if value is not None else np.nan
+
+
+# Compute the valuation over whole arrays rather than position by position
+def value_portfolio(tickers, quantities, stocks):
+    with span('valuation'):
+        quantity = np.array(quantities, dtype=np.float64)
+        price = np.array([as_float(stocks.get(t, {}).get('price')) for t in tickers], dtype=np.float64)
+        previous_close = np.array([as_float(stocks.get(t, {}).get('previous_close')) for t in tickers],
+                                  dtype=np.float64)
+        sectors = np.array([stocks.get(t, {}).get('sector') or UNKNOWN_SECTOR for t in tickers], dtype=object)
+
+        # Positions without a price are reported and left out of the totals
+        priced = ~np.isnan(price)
+        missing = [t for t, ok in zip(tickers, priced) if not ok]
+
+        market_value = np.where(priced, quantity * price, 0.0)
+        # Without a previous close the position contributes no daily P&L
+        daily_pnl = np.where(priced & ~np.isnan(previous_close), quantity * (price - previous_close), 0.0)
+
+        total_value = market_value.sum()
+        total_pnl = daily_pnl.sum()
+        opening_value = total_value - total_pnl
+        weights = market_value / total_value if total_value else np.zeros_like(market_value)
+
+        sector_names, sector_index = np.unique(sectors[priced].astype(str), return_inverse=True)
+        sector_values = np.bincount(sector_index, weights=market_value[priced], minlength=len(sector_names))
+
+    positions = [
+        {
+            'ticker': tickers[i],
+            'quantity': quantities[i],
+            'price': float(price[i]),
+            'market_value': round(float(market_value[i]), 2),
+            'daily_pnl': round(float(daily_pnl[i]), 2),
+            'weight': round(float(weights[i]), 6),
+            'sector': sectors[i],
+        }
+        for i in np.flatnonzero(priced)
+    ]
+
+    return {
+        'total_value': round(float(total_value), 2),
+        'daily_pnl': round(float(total_pnl), 2),
+        'daily_pnl_percent': round(float(total_pnl / opening_value * 100), 4) if opening_value else None,
+        'positions': positions,
+        'sector_exposure': {
+            str(name): {
+                'value': round(float(value), 2),
+                'weight': round(float(value / total_value), 6) if total_value else 0.0,
+            }
+            for name, value in zip(sector_names, sector_values)
+        },
+        'missing': missing,
+    }
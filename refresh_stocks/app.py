@@ -0,0 +1,174 @@
+import os
+import threading
+import time
+import boto3
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from botocore.exceptions import ClientError
+from stock_common import alerts, changes
+from stock_common.dynamo import get_table
+from stock_common.metrics import metered, put as put_metric
+from stock_common.profiling import profiled
+from stock_common.providers import default_provider
+from stock_common.quotes import (BULK_BATCH_SIZE, REFRESH_CALLS_PER_MINUTE, DeadlineError, QuoteError,
+                                  RateLimitError, store_quote)
+from stock_common.readcounts import load_read_counts, subtract_reads
+
+# Tickers per shard when the API key can use bulk quotes
+SHARD_SIZE = int(os.environ.get('REFRESH_SHARD_SIZE', str(BULK_BATCH_SIZE)))
+WORKERS = int(os.environ.get('REFRESH_WORKERS', '4'))
+
+# Tickers refreshed more recently than this are skipped
+MIN_AGE_SECONDS = int(os.environ.get('REFRESH_MIN_AGE_SECONDS', '300'))
+
+# Upper bound on a run when there is no Lambda context to ask
+MAX_RUN_SECONDS = float(os.environ.get('REFRESH_MAX_RUN_SECONDS', '240'))
+
+# Stop starting new shards this long before the invocation times out
+DEADLINE_MARGIN_SECONDS = 10
+
+# The refresher's share of the Alpha Vantage quota, shared by every worker thread
+quote_provider = default_provider(REFRESH_CALLS_PER_MINUTE)
+
+
+# Refresh tracked tickers, most in need first, within the quota and time left
+@profiled
+@metered
+def lambda_handler(event, context):
+
+    # ================== Sample Input ================== #
+    # Scheduled EventBridge event; the payload is not used
+    # ================================================== #
+
+    now = time.time()
+    if context is not None:
+        run_seconds = context.get_remaining_time_in_millis() / 1000.0 - DEADLINE_MARGIN_SECONDS
+    else:
+        run_seconds = MAX_RUN_SECONDS
+    deadline = time.monotonic() + run_seconds
+
+    candidates = load_candidates()
+    queue = deque(prioritize(candidates, now))
+    selected = len(queue)
+
+    run = RefreshRun(queue, deadline, {item['ticker']: item.get('read_count', 0) for item in candidates})
+    # Learn whether the key has bulk access from a two-ticker shard before
+    # handing out bulk-sized ones: without it a bulk-sized shard would take
+    # one rate-limited call per ticker
+    if quote_provider.bulk is None and len(queue) > 1:
+        run.refresh(run.next_shard(2))
+    with ThreadPoolExecutor(max_workers=WORKERS) as executor:
+        workers = [executor.submit(run.work) for _ in range(WORKERS)]
+    for worker in workers:
+        worker.result()
+
+    put_metric('refresh_stocks.run', 'Deferred', len(run.queue))
+
+    return {
+        'considered': len(candidates),
+        'selected': selected,
+        'updated': len(run.updated),
+        'failed': run.failed,
+        'deferred': len(run.queue),
+    }
+
+
+# Read every ticker with the attributes the freshness score needs: the last
+# refresh from the stocks table, the reads since from the read-counts table
+def load_candidates():
+    table = get_table(boto3.resource)
+    scan_args = {
+        'ProjectionExpression': 'ticker, refreshed_at'
+    }
+    candidates = []
+    while True:
+        response = table.scan(**scan_args)
+        candidates.extend(response.get('Items', []))
+        if 'LastEvaluatedKey' not in response:
+            break
+        scan_args['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    read_counts = load_read_counts(boto3.resource)
+    for item in candidates:
+        item['read_count'] = read_counts.get(item['ticker'], 0)
+    return candidates
+
+
+# Freshness score: reads since the last refresh times seconds since it.
+# A ticker that was never refreshed is treated as stale since the epoch.
+def freshness_score(item, now):
+    staleness = now - float(item.get('refreshed_at', 0))
+    if staleness < MIN_AGE_SECONDS:
+        return 0
+    return (1 + float(item.get('read_count', 0))) * staleness
+
+
+# Tickers that need a refresh, highest score first
+def prioritize(candidates, now):
+    scored = [(freshness_score(item, now), item['ticker']) for item in candidates]
+    scored.sort(key=lambda pair: (-pair[0], pair[1]))
+    return [ticker for score, ticker in scored if score > 0]
+
+
+# Worker threads pull shards off one priority queue until it is empty, the
+# deadline passes or Alpha Vantage reports the quota as spent
+class RefreshRun:
+
+    def __init__(self, queue, deadline, read_counts=None):
+        self.queue = queue
+        self.deadline = deadline
+        self.read_counts = read_counts or {}
+        self.updated = []
+        self.failed = []
+        self.stopped = threading.Event()
+        self._lock = threading.Lock()
+
+    # Take the next shard: a bulk batch once the key is known to have bulk
+    # access, otherwise a single ticker so the deadline is checked between calls
+    def next_shard(self, size=None):
+        if size is None:
+            size = SHARD_SIZE if quote_provider.bulk else 1
+        with self._lock:
+            return [self.queue.popleft() for _ in range(min(size, len(self.queue)))]
+
+    def work(self):
+        while not self.stopped.is_set() and time.monotonic() < self.deadline:
+            shard = self.next_shard()
+            if not shard:
+                return
+            self.refresh(shard)
+
+    # Fetch and store one shard's quotes. The calls only take rate-limiter
+    # slots before the deadline, so a worker never sleeps past it.
+    def refresh(self, shard):
+        table = get_table(boto3.resource)
+        try:
+            quotes = quote_provider.get_quotes(shard, self.deadline)
+        except (RateLimitError, DeadlineError) as e:
+            print(str(e))
+            self.stopped.set()
+            with self._lock:
+                self.queue.extendleft(reversed(shard))
+            return
+        except QuoteError as e:
+            print(f"Error fetching data for tickers {', '.join(shard)}: {str(e)}")
+            for ticker in shard:
+                self._done(self.failed, ticker)
+            return
+
+        for ticker in shard:
+            if ticker not in quotes:
+                self._done(self.failed, ticker)
+                continue
+            try:
+                previous, item = store_quote(table, ticker, quotes[ticker], changes.stamp(boto3.resource))
+                alerts.evaluate_write(boto3.resource, previous, item)
+                subtract_reads(boto3.resource, ticker, int(self.read_counts.get(ticker, 0)))
+                self._done(self.updated, ticker)
+            except ClientError as e:
+                print(e.response['Error']['Message'])
+                self._done(self.failed, ticker)
+
+    def _done(self, results, ticker):
+        with self._lock:
+            results.append(ticker)
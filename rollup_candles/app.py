@@ -0,0 +1,73 @@
+import boto3
+from decimal import Decimal
+from boto3.dynamodb.types import TypeDeserializer
+from stock_common.candles import CANDLES_TABLE, fold_quote
+from stock_common.dynamo import get_table
+from stock_common.metrics import metered
+from stock_common.profiling import profiled
+
+deserializer = TypeDeserializer()
+
+
+# Fold quote updates from the stocks table's change stream into OHLCV candles
+@profiled
+@metered
+def lambda_handler(event, context):
+
+    # ================== Sample Input ================== #
+    # event = {
+    #     "Records": [{
+    #         "eventName": "MODIFY",
+    #         "dynamodb": {
+    #             "OldImage": {"ticker": {"S": "AAPL"}, "price": {"N": "150.00"}, "refreshed_at": {"N": "1715700000"}, ...},
+    #             "NewImage": {"ticker": {"S": "AAPL"}, "price": {"N": "150.25"}, "refreshed_at": {"N": "1715700060"}, ...}
+    #         }
+    #     }]
+    # }
+    # ================================================== #
+
+    table = get_table(boto3.resource, CANDLES_TABLE)
+
+    quotes = 0
+    for record in event.get('Records', []):
+        quote = quote_from_record(record)
+        if quote is None:
+            continue
+        fold_quote(table, *quote)
+        quotes += 1
+
+    return {'quotes_folded': quotes}
+
+
+# Turn a DynamoDB stream image into a plain item
+def deserialize_image(image):
+    return {k: deserializer.deserialize(v) for k, v in (image or {}).items()}
+
+
+# (ticker, price, volume traded since the previous quote, quote time) for a
+# stream record that carries a new quote, otherwise None. Writes that are not
+# quote refreshes (creation, read counting, leases) leave refreshed_at alone.
+def quote_from_record(record):
+    old = deserialize_image(record['dynamodb'].get('OldImage'))
+    new = deserialize_image(record['dynamodb'].get('NewImage'))
+
+    refreshed_at = new.get('refreshed_at')
+    if new.get('price') is None or refreshed_at is None or refreshed_at == old.get('refreshed_at'):
+        return None
+
+    return new['ticker'], new['price'], volume_delta(old, new), int(refreshed_at)
+
+
+# Quote volume is cumulative for the trading day, so a candle's volume is the
+# difference between consecutive quotes of the same day
+def volume_delta(old, new):
+    new_volume = new.get('volume')
+    if new_volume is None:
+        return Decimal(0)
+    old_volume = old.get('volume')
+    if old_volume is None or old.get('price') is None:
+        # The first quote seen for the ticker: its earlier volume is unknown
+        return Decimal(0)
+    if old.get('latest_trading_day') != new.get('latest_trading_day'):
+        return new_volume
+    return max(new_volume - old_volume, Decimal(0))
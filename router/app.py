@@ -0,0 +1,82 @@
+import json
+import re
+
+from compare_stocks.app import lambda_handler as compare_stocks_handler
+from create_stock.app import lambda_handler as create_stock_handler
+from delete_stock.app import lambda_handler as delete_stock_handler
+from get_aggregates.app import lambda_handler as get_aggregates_handler
+from get_candles.app import lambda_handler as get_candles_handler
+from get_stock.app import lambda_handler as get_stock_handler
+from get_stocks.app import lambda_handler as get_stocks_handler
+from manage_alerts.app import lambda_handler as manage_alerts_handler
+from portfolio_value.app import lambda_handler as portfolio_value_handler
+from update_stock.app import lambda_handler as update_stock_handler
+
+# API Gateway resource and HTTP method -> existing per-function handler
+ROUTES = {
+    ('/stock', 'POST'): create_stock_handler,
+    ('/stock/list', 'GET'): get_stocks_handler,
+    ('/stock/export', 'GET'): get_stocks_handler,
+    ('/stock/changes', 'GET'): get_stocks_handler,
+    ('/stock/compare', 'GET'): compare_stocks_handler,
+    ('/stock/aggregates', 'GET'): get_aggregates_handler,
+    ('/stock/{ticker}', 'GET'): get_stock_handler,
+    ('/stock/{ticker}', 'PUT'): update_stock_handler,
+    ('/stock/{ticker}', 'DELETE'): delete_stock_handler,
+    ('/stock/{ticker}/candles', 'GET'): get_candles_handler,
+    ('/stock/{ticker}/alerts', 'GET'): manage_alerts_handler,
+    ('/stock/{ticker}/alerts', 'POST'): manage_alerts_handler,
+    ('/stock/{ticker}/alerts/{rule_id}', 'DELETE'): manage_alerts_handler,
+    ('/portfolio/value', 'POST'): portfolio_value_handler,
+}
+
+
+# Compile a resource template such as /stock/{ticker} into a path regex
+def compile_resource(resource):
+    parts = re.split(r'\{(\w+)\+?\}', resource)
+    pattern = ''.join(
+        re.escape(part) if index % 2 == 0 else f'(?P<{part}>[^/]+)'
+        for index, part in enumerate(parts)
+    )
+    return re.compile(f'^{pattern}$')
+
+
+# Static resources come first so /stock/list never matches /stock/{ticker}
+RESOURCE_PATTERNS = sorted(
+    {(resource, compile_resource(resource)) for resource, _ in ROUTES},
+    key=lambda entry: ('{' in entry[0], entry[0])
+)
+
+
+# Find the resource and path parameters for a raw request path
+def match_path(path):
+    for resource, pattern in RESOURCE_PATTERNS:
+        match = pattern.match(path)
+        if match:
+            return resource, match.groupdict()
+    return None, None
+
+
+# Dispatch every stock route from a single function
+def lambda_handler(event, context):
+    resource = event.get('resource')
+    method = event.get('httpMethod')
+
+    # Events from a proxy resource (/{proxy+}) are routed on their path instead
+    if not any(resource == known for known, _ in ROUTES):
+        resource, path_parameters = match_path(event.get('path') or '')
+        if resource is None:
+            return {
+                'statusCode': 404,
+                'body': json.dumps({'message': 'Not Found'})
+            }
+        event = dict(event, resource=resource, pathParameters=path_parameters or None)
+
+    handler = ROUTES.get((resource, method))
+    if handler is None:
+        return {
+            'statusCode': 405,
+            'body': json.dumps({'message': f'Method {method} not allowed on {resource}'})
+        }
+
+    return handler(event, context)
@@ -0,0 +1,238 @@
+"""Server-sent-events price stream.
+
+A long-running WSGI service (not an API Gateway Lambda: SSE needs a held-open
+connection). Clients connect to `/stream?tickers=AAPL,MSFT` and receive an
+`event: quote` for every changed quote of those tickers. Quotes come from the
+stocks table's DynamoDB stream through `DynamoStreamFeed`, so anything that
+writes a quote (`PUT /stock/{ticker}`, the scheduled refresher) is pushed
+without polling.
+
+Local mode:
+
+    PYTHONPATH=common/python python -m stream_prices.app --table stocks-table --port 8001
+"""
+import argparse
+import json
+import os
+import threading
+import time
+import urllib.parse
+from decimal import Decimal
+from socketserver import ThreadingMixIn
+from wsgiref.simple_server import WSGIServer, make_server
+
+import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
+from stock_common.pricefeed import QUOTE_FIELDS, PriceHub
+
+MAX_TICKERS = int(os.environ.get('STREAM_MAX_TICKERS', '50'))
+HEARTBEAT_SECONDS = float(os.environ.get('STREAM_HEARTBEAT_SECONDS', '15'))
+# Connections are closed after this long; EventSource clients reconnect
+MAX_CONNECTION_SECONDS = float(os.environ.get('STREAM_MAX_CONNECTION_SECONDS', '300'))
+RECONNECT_MILLIS = 3000
+
+deserializer = TypeDeserializer()
+
+# Iterators that can no longer be read from and are fetched again for their shard
+ITERATOR_LOST_CODES = ('ExpiredIteratorException', 'TrimmedDataAccessException')
+
+# Quotes published here reach every connected subscriber of the ticker
+hub = PriceHub()
+
+
+def handle_decimal_type(obj):
+    if isinstance(obj, Decimal):
+        if obj % 1 == 0:
+            return int(obj)
+        else:
+            return float(obj)
+    raise TypeError
+
+
+# One SSE message; the id lets clients see which quote they last received
+def format_event(ticker, quote):
+    data = json.dumps(quote, separators=(',', ':'), default=handle_decimal_type)
+    return f'event: quote\nid: {ticker}:{quote.get("refreshed_at", "")}\ndata: {data}\n\n'.encode('utf-8')
+
+
+# Yield SSE chunks for a subscription until the connection limit or disconnect.
+# Each batch holds the latest quote per ticker, so a slow reader skips
+# intermediate quotes rather than queueing them.
+def event_stream(subscription, heartbeat=HEARTBEAT_SECONDS, max_seconds=MAX_CONNECTION_SECONDS):
+    deadline = time.monotonic() + max_seconds
+    try:
+        yield f'retry: {RECONNECT_MILLIS}\n\n'.encode('utf-8')
+        while time.monotonic() < deadline and not subscription.closed:
+            batch = subscription.next_batch(min(heartbeat, max(deadline - time.monotonic(), 0)))
+            if not batch:
+                yield b': keepalive\n\n'
+                continue
+            yield b''.join(format_event(ticker, quote) for ticker, quote in batch)
+    finally:
+        hub.unsubscribe(subscription)
+
+
+def respond(start_response, status, message):
+    start_response(status, [('Content-Type', 'application/json')])
+    return [json.dumps({'message': message}).encode('utf-8')]
+
+
+# WSGI application serving GET /stream?tickers=AAPL,MSFT
+def sse_app(environ, start_response):
+    if environ.get('PATH_INFO') != '/stream':
+        return respond(start_response, '404 Not Found', 'Not Found')
+    if environ.get('REQUEST_METHOD') != 'GET':
+        return respond(start_response, '405 Method Not Allowed', 'Method Not Allowed')
+
+    params = urllib.parse.parse_qs(environ.get('QUERY_STRING', ''))
+    tickers = {t.strip().upper() for value in params.get('tickers', []) for t in value.split(',') if t.strip()}
+    if not tickers or len(tickers) > MAX_TICKERS:
+        return respond(start_response, '400 Bad Request',
+                       f'Bad Request: tickers must list between 1 and {MAX_TICKERS} symbols')
+
+    subscription = hub.subscribe(tickers)
+    start_response('200 OK', [
+        ('Content-Type', 'text/event-stream'),
+        ('Cache-Control', 'no-cache'),
+        ('X-Accel-Buffering', 'no'),
+    ])
+    return event_stream(subscription)
+
+
+# The client-facing part of a stocks table item
+def public_quote(item):
+    quote = {'ticker': item['ticker']}
+    quote.update({k: item[k] for k in QUOTE_FIELDS + ('refreshed_at',) if k in item})
+    return quote
+
+
+# Follows every shard of the stocks table's stream and publishes new images
+class DynamoStreamFeed(threading.Thread):
+
+    def __init__(self, stream_arn, price_hub=hub, client=None, poll_interval=1.0, discover_interval=30.0):
+        super().__init__(daemon=True)
+        self.stream_arn = stream_arn
+        self.hub = price_hub
+        self.client = client or boto3.client('dynamodbstreams')
+        self.poll_interval = poll_interval
+        self.discover_interval = discover_interval
+        self.stopped = threading.Event()
+        # shard id -> iterator; finished shards map to None
+        self.iterators = {}
+        # shard id -> sequence number of the last record read from it
+        self.positions = {}
+
+    # Every shard of the stream, one DescribeStream page at a time
+    def list_shards(self):
+        describe_args = {'StreamArn': self.stream_arn}
+        while True:
+            description = self.client.describe_stream(**describe_args)['StreamDescription']
+            yield from description.get('Shards', [])
+            if 'LastEvaluatedShardId' not in description:
+                return
+            describe_args['ExclusiveStartShardId'] = description['LastEvaluatedShardId']
+
+    # Start reading shards we have not seen: open shards at startup from
+    # LATEST, child shards found later from their beginning
+    def discover_shards(self, initial):
+        for shard in self.list_shards():
+            shard_id = shard['ShardId']
+            if shard_id in self.iterators:
+                continue
+            if initial and 'EndingSequenceNumber' in shard['SequenceNumberRange']:
+                self.iterators[shard_id] = None
+                continue
+            self.iterators[shard_id] = self.client.get_shard_iterator(
+                StreamArn=self.stream_arn,
+                ShardId=shard_id,
+                ShardIteratorType='LATEST' if initial else 'TRIM_HORIZON'
+            )['ShardIterator']
+
+    # A fresh iterator for a shard whose iterator expired or whose records
+    # were trimmed: just after the last record read when it is still there,
+    # otherwise from the newest records
+    def reopen_shard(self, shard_id, code):
+        position = self.positions.get(shard_id)
+        iterator_args = {'ShardIteratorType': 'LATEST'}
+        if position is not None and code == 'ExpiredIteratorException':
+            iterator_args = {'ShardIteratorType': 'AFTER_SEQUENCE_NUMBER', 'SequenceNumber': position}
+        self.iterators[shard_id] = self.client.get_shard_iterator(
+            StreamArn=self.stream_arn, ShardId=shard_id, **iterator_args
+        )['ShardIterator']
+
+    def publish_records(self, records):
+        for record in records:
+            image = record['dynamodb'].get('NewImage')
+            if not image:
+                continue
+            item = {k: deserializer.deserialize(v) for k, v in image.items()}
+            if item.get('price') is not None:
+                self.hub.publish(item['ticker'], public_quote(item))
+
+    def poll(self):
+        for shard_id, iterator in list(self.iterators.items()):
+            if iterator is None:
+                continue
+            try:
+                response = self.client.get_records(ShardIterator=iterator)
+            except ClientError as e:
+                code = e.response['Error']['Code']
+                if code not in ITERATOR_LOST_CODES:
+                    raise
+                print(f'{shard_id}: {e.response["Error"]["Message"]}')
+                self.reopen_shard(shard_id, code)
+                continue
+            records = response.get('Records', [])
+            self.publish_records(records)
+            if records:
+                self.positions[shard_id] = records[-1]['dynamodb']['SequenceNumber']
+            self.iterators[shard_id] = response.get('NextShardIterator')
+
+    def run(self):
+        self.discover_shards(initial=True)
+        discovered = time.monotonic()
+        while not self.stopped.is_set():
+            try:
+                if time.monotonic() - discovered > self.discover_interval:
+                    self.discover_shards(initial=False)
+                    discovered = time.monotonic()
+                self.poll()
+            except ClientError as e:
+                print(e.response['Error']['Message'])
+            self.stopped.wait(self.poll_interval)
+
+    def stop(self):
+        self.stopped.set()
+
+
+class ThreadingWSGIServer(ThreadingMixIn, WSGIServer):
+    daemon_threads = True
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Serve the SSE price stream')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8001)
+    source = parser.add_mutually_exclusive_group(required=True)
+    source.add_argument('--stream-arn', help='DynamoDB stream of the stocks table')
+    source.add_argument('--table', help='Stocks table; its latest stream is used')
+    args = parser.parse_args(argv)
+
+    stream_arn = args.stream_arn
+    if stream_arn is None:
+        stream_arn = boto3.client('dynamodb').describe_table(TableName=args.table)['Table']['LatestStreamArn']
+
+    feed = DynamoStreamFeed(stream_arn)
+    feed.start()
+
+    server = make_server(args.host, args.port, sse_app, server_class=ThreadingWSGIServer)
+    print(f'Streaming quotes on http://{args.host}:{args.port}/stream?tickers=AAPL')
+    try:
+        server.serve_forever()
+    finally:
+        feed.stop()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,77 @@
+import os
+import sys
+
+import pytest
+
+from stock_common import dynamo, metrics
+from tests.perf.harness import Harness
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class StaticTable:
+    """Table returning fixed responses, so benchmarks time the handler rather than a mock"""
+
+    def __init__(self, items=(), key='ticker'):
+        self.key = key
+        self.items = {item[key]: item for item in items}
+
+    def scan(self, **kwargs):
+        return {'Items': list(self.items.values())}
+
+    def get_item(self, Key, **kwargs):
+        item = self.items.get(Key[self.key])
+        return {'Item': item} if item is not None else {}
+
+    def update_item(self, Key, **kwargs):
+        item = self.items.get(Key[self.key])
+        return {'Attributes': dict(item)} if item is not None else {}
+
+    def put_item(self, Item, **kwargs):
+        return {}
+
+    def query(self, **kwargs):
+        return {'Items': []}
+
+
+class StaticResource:
+
+    def __init__(self):
+        self.tables = {}
+
+    def add_table(self, name, items, key='ticker'):
+        self.tables[name] = StaticTable(items, key)
+
+    def Table(self, name):
+        return self.tables.setdefault(name, StaticTable())
+
+
+@pytest.fixture(scope='session')
+def perf():
+    return Harness()
+
+
+# Metric buffering and flushing would be timed along with every handler
+@pytest.fixture(autouse=True)
+def no_metrics(monkeypatch):
+    monkeypatch.setattr(metrics, '_enabled', False)
+
+
+# Serve every table from StaticTables; returns the resource to fill
+@pytest.fixture()
+def static_backend():
+    resource = StaticResource()
+    dynamo.use_backend(resource)
+    try:
+        yield resource
+    finally:
+        dynamo.use_backend(None)
+
+
+# discover_services vendors Flask and creates its Cloud Map client on import
+@pytest.fixture()
+def discover_app(monkeypatch):
+    monkeypatch.syspath_prepend(os.path.join(ROOT, 'discover_services'))
+    monkeypatch.setenv('AWS_DEFAULT_REGION', os.environ.get('AWS_DEFAULT_REGION', 'us-east-1'))
+    import discover_services.app
+    return discover_services.app
@@ -0,0 +1,74 @@
+"""Fixed-seed synthetic datasets for the performance suite.
+
+Every generator takes a seed, so a benchmark sees the same data on every run
+and its baseline stays comparable.
+"""
+import random
+import string
+from decimal import Decimal
+
+SEED = 4471
+
+SECTORS = ['Technology', 'Financials', 'Health Care', 'Energy', 'Industrials', 'Utilities']
+EXCHANGES = ['NASDAQ', 'NYSE']
+
+
+def tickers(n, seed=SEED):
+    rng = random.Random(seed)
+    symbols = set()
+    while len(symbols) < n:
+        symbols.add(''.join(rng.choice(string.ascii_uppercase) for _ in range(rng.randint(1, 5))))
+    return sorted(symbols)
+
+
+# Stocks table items, as a scan returns them
+def stock_items(n, seed=SEED):
+    rng = random.Random(seed)
+    items = []
+    for ticker in tickers(n, seed):
+        previous_close = Decimal(rng.randint(100, 100000)) / 100
+        change = Decimal(rng.randint(-500, 500)) / 100
+        items.append({
+            'ticker': ticker,
+            'company_name': f'{ticker} Holdings Inc.',
+            'exchange': rng.choice(EXCHANGES),
+            'sector': rng.choice(SECTORS),
+            'price': previous_close + change,
+            'volume': Decimal(rng.randint(1000, 90000000)),
+            'previous_close': previous_close,
+            'change': change,
+            'change_percent': f'{change / previous_close * 100:.4f}%',
+            'latest_trading_day': '2024-05-17',
+            'refreshed_at': Decimal(1715976000 + rng.randint(0, 86400)),
+            'read_count': Decimal(rng.randint(0, 500)),
+        })
+    return items
+
+
+# Alpha Vantage GLOBAL_QUOTE payloads, {ticker: quote}
+def global_quotes(n, seed=SEED):
+    quotes = {}
+    for item in stock_items(n, seed):
+        quotes[item['ticker']] = {
+            '01. symbol': item['ticker'],
+            '05. price': f"{item['price']:.4f}",
+            '06. volume': str(item['volume']),
+            '07. latest trading day': item['latest_trading_day'],
+            '08. previous close': f"{item['previous_close']:.4f}",
+            '09. change': f"{item['change']:.4f}",
+            '10. change percent': item['change_percent'],
+        }
+    return quotes
+
+
+# Cloud Map ListServices summaries
+def services(n, seed=SEED):
+    rng = random.Random(seed)
+    return [{
+        'Id': f'srv-{rng.getrandbits(64):016x}',
+        'Arn': f'arn:aws:servicediscovery:us-east-1:000000000000:service/srv-{i}',
+        'Name': f'stock-service-{i}',
+        'Type': 'HTTP',
+        'Description': rng.choice(['', f'Stock microservice {i}']),
+        'InstanceCount': rng.randint(1, 4),
+    } for i in range(n)]
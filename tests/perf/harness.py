@@ -0,0 +1,158 @@
+"""Benchmark harness for the performance regression suite.
+
+Wall-clock timings depend on the machine, so each benchmark's per-call time
+is divided by the time of a fixed calibration workload measured in the same
+process. Baselines are stored in these calibration units, which lets one
+baseline file serve laptops and CI runners alike. Each benchmark round is
+paired with a calibration round timed just before it and the median ratio is
+kept, so a machine that speeds up or slows down during the run moves both
+sides of a ratio instead of one. Allocations are the tracemalloc peak of a
+single call, in KiB, and do not need normalising.
+
+Set PERF_UPDATE_BASELINES=1 to record the current measurements as the new
+baselines instead of checking against them.
+"""
+import gc
+import json
+import os
+import time
+import tracemalloc
+from decimal import Decimal
+
+BASELINES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'baselines.json')
+
+# A run fails when a metric exceeds its baseline by more than this factor
+TIME_TOLERANCE = float(os.environ.get('PERF_TIME_TOLERANCE', '1.5'))
+MEMORY_TOLERANCE = float(os.environ.get('PERF_MEMORY_TOLERANCE', '1.25'))
+
+# Allocation differences below this are noise (interned strings, freelists)
+MEMORY_SLACK_KIB = 16
+
+# Time differences below this are noise for benchmarks of a few microseconds
+# (cache and dict state left by the rest of the session)
+TIME_SLACK_UNITS = 0.01
+
+UPDATE = os.environ.get('PERF_UPDATE_BASELINES', '').lower() in ('1', 'true', 'yes')
+
+ROUNDS = 7
+MIN_ROUND_SECONDS = 0.05
+
+# A time over budget is re-measured this many times before it counts, since a
+# noisy neighbour slows a whole measurement rather than single rounds
+REMEASURE = 2
+
+
+# Per-call time of fn in calibration units: the median over several rounds of
+# fn's per-call time divided by that of a calibration round timed just before.
+# As in timeit, the garbage collector is off while timing: its pauses depend on
+# everything else the test session allocated, not on fn.
+def relative_time(fn, rounds=ROUNDS, min_round_seconds=MIN_ROUND_SECONDS):
+    fn()
+    _calibration_workload()
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        number = _calls_per_round(fn, min_round_seconds)
+        calibration_number = _calls_per_round(_calibration_workload, min_round_seconds)
+        ratios = sorted(_round_time(fn, number) / _round_time(_calibration_workload, calibration_number)
+                        for _ in range(rounds))
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+    return ratios[len(ratios) // 2]
+
+
+# Calls of fn per round, doubling until a round is long enough to time reliably
+def _calls_per_round(fn, min_round_seconds):
+    number = 1
+    while _round_time(fn, number) * number < min_round_seconds:
+        number *= 2
+    return number
+
+
+# Per-call time of one round of `number` calls
+def _round_time(fn, number):
+    started = time.perf_counter()
+    for _ in range(number):
+        fn()
+    return (time.perf_counter() - started) / number
+
+
+# Peak KiB allocated by one call of fn, after a warm-up call
+def peak_allocation(fn):
+    fn()
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak / 1024
+
+
+_CALIBRATION_ROWS = [{'ticker': f'T{i}', 'price': Decimal(i) / 7, 'volume': i * 1000} for i in range(200)]
+
+
+# The fixed reference workload: JSON-encode and decode Decimal-valued rows
+def _calibration_workload():
+    encoded = json.dumps(_CALIBRATION_ROWS, default=str)
+    return sorted(json.loads(encoded), key=lambda row: row['price'])
+
+
+def load_baselines(path=BASELINES):
+    try:
+        with open(path) as baselines:
+            return json.load(baselines)
+    except FileNotFoundError:
+        return {}
+
+
+def save_baselines(baselines, path=BASELINES):
+    with open(path, 'w') as out:
+        json.dump(baselines, out, indent=2, sort_keys=True)
+        out.write('\n')
+
+
+class Harness:
+    """Measures benchmarks and checks them against the stored baselines"""
+
+    def __init__(self, path=BASELINES, update=UPDATE):
+        self.path = path
+        self.update = update
+        self.baselines = load_baselines(path)
+
+    # Measure fn; returns {'time': calibration units per call, 'peak_kib': KiB}
+    def measure(self, fn):
+        return {
+            'time': round(relative_time(fn), 3),
+            'peak_kib': round(peak_allocation(fn), 1),
+        }
+
+    # Measure fn and assert it stays within the baseline budget for name
+    def check(self, name, fn):
+        measured = self.measure(fn)
+        if self.update:
+            self.baselines[name] = measured
+            save_baselines(self.baselines, self.path)
+            return measured
+
+        baseline = self.baselines.get(name)
+        assert baseline is not None, f'No baseline for {name}; run with PERF_UPDATE_BASELINES=1'
+
+        time_budget = max(baseline['time'] * TIME_TOLERANCE, baseline['time'] + TIME_SLACK_UNITS)
+        for _ in range(REMEASURE):
+            if measured['time'] <= time_budget:
+                break
+            measured['time'] = min(measured['time'], round(relative_time(fn), 3))
+
+        failures = []
+        if measured['time'] > time_budget:
+            failures.append(f"time {measured['time']} units > budget {time_budget:.3f} "
+                            f"(baseline {baseline['time']} x {TIME_TOLERANCE})")
+        memory_budget = max(baseline['peak_kib'] * MEMORY_TOLERANCE, baseline['peak_kib'] + MEMORY_SLACK_KIB)
+        if measured['peak_kib'] > memory_budget:
+            failures.append(f"peak allocation {measured['peak_kib']} KiB > budget {memory_budget:.1f} KiB "
+                            f"(baseline {baseline['peak_kib']} KiB)")
+        assert not failures, f'{name} regressed: ' + '; '.join(failures)
+        return measured
@@ -0,0 +1,94 @@
+# tests/perf/test_hot_paths.py
+
+import json
+
+from tests.perf import datasets
+
+
+class StaticServiceDiscovery:
+
+    def __init__(self, services):
+        self.services = services
+
+    def list_services(self, **kwargs):
+        return {"Services": self.services}
+
+
+def test_list_serialization(perf, static_backend):
+    """
+    GET /stock/list serializing a 1,000-item scan.
+    """
+    from get_stocks.app import lambda_handler
+
+    static_backend.add_table("stocks-table", datasets.stock_items(1000))
+    event = {"resource": "/stock/list", "httpMethod": "GET", "path": "/stock/list"}
+
+    assert len(json.loads(lambda_handler(event, None)["body"])) == 1000
+
+    perf.check("list_serialization", lambda: lambda_handler(event, None))
+
+
+def test_compare(perf, static_backend, monkeypatch):
+    """
+    GET /stock/compare for two stored tickers, computed with sequential and overlapped reads, and from the
+    result cache.
+    """
+    from compare_stocks import app
+    from stock_common import aio
+    from stock_common.resultcache import ResultCache
+
+    items = datasets.stock_items(100)
+    static_backend.add_table("stocks-table", items)
+    static_backend.add_table("stock-sequence-table", [{"name": "stocks", "value": 1}], key="name")
+    event = {
+        "httpMethod": "GET",
+        "queryStringParameters": {"ticker1": items[0]["ticker"], "ticker2": items[1]["ticker"]},
+    }
+
+    monkeypatch.setattr(app, "result_cache", ResultCache("compare_stocks.cache", maxsize=0))
+    # The in-memory reads do not block, so overlapping them only adds the event
+    # loop's overhead; the sequential path is measured against the original baseline
+    monkeypatch.setattr(aio, "ENABLED", False)
+    assert app.lambda_handler(event, None)["statusCode"] == 200
+    perf.check("compare", lambda: app.lambda_handler(event, None))
+
+    monkeypatch.setattr(aio, "ENABLED", True)
+    assert app.lambda_handler(event, None)["statusCode"] == 200
+    perf.check("compare_async", lambda: app.lambda_handler(event, None))
+
+    monkeypatch.setattr(app, "result_cache", ResultCache("compare_stocks.cache", settle_seconds=0))
+    assert app.lambda_handler(event, None)["statusCode"] == 200
+    assert app.lambda_handler(event, None)["statusCode"] == 200
+    perf.check("compare_cached", lambda: app.lambda_handler(event, None))
+
+
+def test_update_mapping(perf, static_backend):
+    """
+    Mapping 100 Alpha Vantage quotes to stock items and writing them.
+    """
+    from update_stock.app import update_stock_in_db
+
+    static_backend.add_table("stocks-table", datasets.stock_items(100))
+    static_backend.add_table("stock-sequence-table", [{"name": "stocks", "value": 1}], key="name")
+    quotes = list(datasets.global_quotes(100).items())
+
+    def update_all():
+        for ticker, quote in quotes:
+            update_stock_in_db(ticker, quote)
+
+    assert update_stock_in_db(*quotes[0])["price"] is not None
+
+    perf.check("update_mapping", update_all)
+
+
+def test_discovery_dispatch(perf, discover_app, monkeypatch, capsys):
+    """
+    GET /discover-services through the Flask dispatch for 50 registered services.
+    """
+    monkeypatch.setattr(discover_app, "client", StaticServiceDiscovery(datasets.services(50)))
+    event = {"path": "/discover-services", "queryStringParameters": {"namespaceId": "ns-perf"}}
+
+    response = discover_app.lambda_handler(event, None)
+    assert len(json.loads(response["body"])["services"]) == 50
+
+    perf.check("discovery_dispatch", lambda: discover_app.lambda_handler(event, None))
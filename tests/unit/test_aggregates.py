@@ -0,0 +1,142 @@
+# tests/unit/test_aggregates.py
+
+import json
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+
+from boto3.dynamodb.conditions import Key
+from boto3.dynamodb.types import TypeSerializer
+
+from devtools.server import load_template, memory_backend
+from stock_common import dynamo
+
+serializer = TypeSerializer()
+
+
+def stream_record(event_name, old=None, new=None):
+    """Builds a synthetic DynamoDB stream record"""
+    record = {"eventName": event_name, "dynamodb": {}}
+    if old is not None:
+        record["dynamodb"]["OldImage"] = {k: serializer.serialize(v) for k, v in old.items()}
+    if new is not None:
+        record["dynamodb"]["NewImage"] = {k: serializer.serialize(v) for k, v in new.items()}
+    return record
+
+
+def stock(ticker, sector, volume, change_percent, exchange="NASDAQ"):
+    return {"ticker": ticker, "sector": sector, "exchange": exchange,
+            "volume": Decimal(volume), "change_percent": change_percent}
+
+
+def aggregate(backend, group_type, group_name):
+    from get_aggregates.app import summarize
+
+    item = backend.Table("stock-aggregates-table").get_item(
+        Key={"group_type": group_type, "group_name": group_name}).get("Item")
+    return summarize(item)
+
+
+def test_stream_records_maintain_aggregates():
+    """
+    Insert, modify and remove records incrementally maintain per-sector and per-exchange aggregates.
+    """
+    from aggregate_stocks.app import lambda_handler as aggregate_handler
+
+    backend = memory_backend(load_template())
+    dynamo.use_backend(backend)
+    try:
+        aggregate_handler({"Records": [
+            stream_record("INSERT", new=stock("AAPL", "Technology", "100", "1.5000%")),
+            stream_record("INSERT", new=stock("MSFT", "Technology", "300", "-0.5000%")),
+            stream_record("INSERT", new=stock("TSLA", "Automotive", "50", "2.0000%")),
+        ]}, None)
+
+        technology = aggregate(backend, "sector", "Technology")
+        assert technology["count"] == 2
+        assert technology["sum_volume"] == Decimal("400")
+        assert technology["mean_change"] == Decimal("0.5000")
+        assert (technology["min_change"], technology["max_change"]) == (Decimal("-0.5000"), Decimal("1.5000"))
+        assert aggregate(backend, "exchange", "NASDAQ")["count"] == 3
+
+        # Members are separate items, outside the partitions the aggregates are queried from
+        aggregates = backend.Table("stock-aggregates-table")
+        assert "members" not in aggregates.get_item(
+            Key={"group_type": "sector", "group_name": "Technology"})["Item"]
+        assert aggregates.get_item(Key={"group_type": "sector#Technology", "group_name": "AAPL"})["Item"]["volume"] \
+            == Decimal("100")
+        assert len(aggregates.query(KeyConditionExpression=Key("group_type").eq("sector"))["Items"]) == 2
+
+        # MSFT moves sector and AAPL is deleted: both extremes leave Technology
+        aggregate_handler({"Records": [
+            stream_record("MODIFY", old=stock("MSFT", "Technology", "300", "-0.5000%"),
+                          new=stock("MSFT", "Software", "350", "0.2500%")),
+            stream_record("REMOVE", old=stock("AAPL", "Technology", "100", "1.5000%")),
+        ]}, None)
+
+        technology = aggregate(backend, "sector", "Technology")
+        assert technology["count"] == 0
+        assert technology["sum_volume"] == 0
+        assert "mean_change" not in technology and "min_change" not in technology
+        assert aggregate(backend, "sector", "Software")["sum_volume"] == Decimal("350")
+        assert aggregate(backend, "exchange", "NASDAQ")["count"] == 2
+
+        # A new low extends the extremes without reading the members again
+        aggregate_handler({"Records": [
+            stream_record("INSERT", new=stock("ORCL", "Software", "10", "-3.0000%")),
+        ]}, None)
+        software = aggregate(backend, "sector", "Software")
+        assert (software["min_change"], software["max_change"]) == (Decimal("-3.0000"), Decimal("0.2500"))
+        assert software["mean_change"] == Decimal("-1.3750")
+
+        # Replaying a record is idempotent
+        before = aggregate(backend, "sector", "Software")
+        aggregate_handler({"Records": [
+            stream_record("MODIFY", old=stock("MSFT", "Technology", "300", "-0.5000%"),
+                          new=stock("MSFT", "Software", "350", "0.2500%")),
+        ]}, None)
+        after = aggregate(backend, "sector", "Software")
+        assert after["sum_volume"] == before["sum_volume"]
+        assert after["count"] == before["count"]
+    finally:
+        dynamo.use_backend(None)
+
+
+def test_malformed_volume_counts_as_zero():
+    """
+    A stock whose volume is not a number still joins its groups, contributing no volume.
+    """
+    from aggregate_stocks.app import member_value
+
+    assert member_value({"volume": "n/a", "change_percent": "1.5%"}) == \
+        {"volume": Decimal(0), "change": Decimal("1.5")}
+    assert member_value({"volume": "NaN"})["volume"] == 0
+    assert member_value({"volume": " 1200 "})["volume"] == Decimal("1200")
+    assert member_value({})["volume"] == 0
+
+
+@patch('get_aggregates.app.boto3.resource')
+def test_get_aggregate_reads_one_item(mock_boto3_resource):
+    """
+    A single group is served by one projected GetItem.
+    """
+    from get_aggregates.app import lambda_handler as get_aggregates_handler
+
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+    mock_table.get_item.return_value = {"Item": {
+        "group_type": "sector", "group_name": "Technology", "count": Decimal(2),
+        "mean_change": Decimal("0.5000")
+    }}
+
+    response = get_aggregates_handler({
+        "httpMethod": "GET",
+        "queryStringParameters": {"sector": "Technology"}
+    }, None)
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == {
+        "group_type": "sector", "group_name": "Technology", "count": 2, "mean_change": 0.5
+    }
+    called_kwargs = mock_table.get_item.call_args[1]
+    assert called_kwargs["Key"] == {"group_type": "sector", "group_name": "Technology"}
+    assert "#members" not in called_kwargs["ExpressionAttributeNames"]
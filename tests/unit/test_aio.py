@@ -0,0 +1,93 @@
+# tests/unit/test_aio.py
+
+import json
+import time
+from decimal import Decimal
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from devtools.server import load_template, memory_backend
+from stock_common import aio, dynamo
+from stock_common.resultcache import ResultCache
+
+LATENCY = 0.2
+
+
+def test_gather_overlaps_calls_on_one_loop():
+    """
+    Independent calls take about the slowest one, in order, on a loop reused across calls.
+    """
+    def slow(value):
+        time.sleep(LATENCY)
+        return value
+
+    started = time.monotonic()
+    assert aio.gather(*(lambda i=i: slow(i) for i in range(4))) == [0, 1, 2, 3]
+    assert time.monotonic() - started < 2 * LATENCY
+
+    loop = aio.get_loop()
+    assert aio.gather(lambda: 1) == [1]
+    assert aio.get_loop() is loop and not loop.is_closed()
+
+
+def test_gather_errors():
+    """
+    The first error is raised, or returned in place with return_exceptions.
+    """
+    def fail():
+        raise KeyError("boom")
+
+    with pytest.raises(KeyError):
+        aio.gather(lambda: 1, fail)
+    results = aio.gather(fail, lambda: 2, return_exceptions=True)
+    assert isinstance(results[0], KeyError) and results[1] == 2
+
+    with patch.object(aio, "ENABLED", False):
+        assert aio.gather(lambda: 1, lambda: 2) == [1, 2]
+
+
+def test_compare_reads_both_stocks_at_once():
+    """
+    GET /stock/compare takes about one read's latency for the two stocks.
+    """
+    from compare_stocks import app
+
+    backend = memory_backend(load_template())
+    stocks = backend.Table("stocks-table")
+    stocks.put_item(Item={"ticker": "AAPL", "price": Decimal("190.5")})
+    stocks.put_item(Item={"ticker": "TSLA", "price": Decimal("175.25")})
+    get_item = stocks.get_item
+
+    def slow_get_item(**kwargs):
+        time.sleep(LATENCY)
+        return get_item(**kwargs)
+
+    stocks.get_item = slow_get_item
+    dynamo.use_backend(backend)
+    try:
+        with patch.object(app, "result_cache", ResultCache("compare_stocks.cache", maxsize=0)):
+            started = time.monotonic()
+            response = app.lambda_handler(
+                {"httpMethod": "GET", "queryStringParameters": {"ticker1": "AAPL", "ticker2": "TSLA"}}, None)
+            elapsed = time.monotonic() - started
+    finally:
+        dynamo.use_backend(None)
+
+    assert json.loads(response["body"])["comparisons"]["price"] == "AAPL has higher price"
+    assert elapsed < 1.5 * LATENCY
+
+
+def test_overlapped_calls_share_one_resource():
+    """
+    Calls overlapped on a cold container create the DynamoDB resource and Table once.
+    """
+    def slow_factory(*args, **kwargs):
+        time.sleep(0.05)
+        return MagicMock()
+
+    factory = MagicMock(side_effect=slow_factory)
+    with patch.object(dynamo, "_resources", {}), patch.object(dynamo, "_tables", {}):
+        tables = aio.gather(*(lambda: dynamo.get_table(factory) for _ in range(4)))
+    factory.assert_called_once()
+    assert all(table is tables[0] for table in tables)
@@ -0,0 +1,98 @@
+# tests/unit/test_alerts.py
+
+import json
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+
+from stock_common import alerts
+
+
+class FakeAlertsTable:
+    """Sorted rule index supporting the BETWEEN key condition; counts the rules read"""
+
+    def __init__(self, rules):
+        self.rules = sorted(rules, key=lambda rule: rule['rule_key'])
+        self.read = 0
+
+    def query(self, ExpressionAttributeValues, **kwargs):
+        low, high = ExpressionAttributeValues[':low'], ExpressionAttributeValues[':high']
+        items = [r for r in self.rules if low <= r['rule_key'] <= high]
+        self.read += len(items)
+        return {'Items': items}
+
+
+def test_only_crossed_rules_are_read():
+    """
+    A price move reads exactly the rules whose thresholds it crossed.
+    """
+    rules = [alerts.new_rule('AAPL', 'price', direction, Decimal(threshold) / 4)
+             for direction in ('above', 'below') for threshold in range(1, 2000)]
+    rules.append(alerts.new_rule('AAPL', 'change_percent', 'below', '-2'))
+    table = FakeAlertsTable(rules)
+    outbox = MagicMock()
+
+    fired = alerts.evaluate(table, outbox,
+                            {'ticker': 'AAPL', 'price': Decimal('100.00'), 'change_percent': '-1.5000%'},
+                            {'ticker': 'AAPL', 'price': Decimal('101.00'), 'change_percent': '-2.0000%'})
+
+    # Above 100.25, 100.5, 100.75 and 101 on price; below -2 on change percent
+    assert sorted((a['metric'], a['direction'], a['threshold']) for a in fired) == [
+        ('change_percent', 'below', Decimal('-2')),
+        ('price', 'above', Decimal('100.25')), ('price', 'above', Decimal('100.5')),
+        ('price', 'above', Decimal('100.75')), ('price', 'above', Decimal('101')),
+    ]
+    assert table.read == 5
+    batch = outbox.batch_writer.return_value.__enter__.return_value
+    assert batch.put_item.call_count == 5
+
+
+def test_threshold_encoding_orders_negative_values():
+    """
+    Encoded thresholds sort in numeric order, including negatives.
+    """
+    values = [Decimal(v) for v in ('-250.5', '-2', '-0.0001', '0', '0.0001', '3', '1000000')]
+    assert sorted(values, key=alerts.encode_threshold) == values
+
+
+def test_unencodable_value_does_not_fail_the_write():
+    """
+    A price outside the threshold range is logged and counted, and the write it followed still succeeds.
+    """
+    resource_factory = MagicMock()
+
+    with patch.object(alerts.metrics, 'put') as put_metric:
+        for price in ('1e20', 'NaN'):
+            fired = alerts.evaluate_write(resource_factory, {'ticker': 'AAPL', 'price': Decimal('100')},
+                                          {'ticker': 'AAPL', 'price': Decimal(price)})
+            assert fired == []
+
+    assert put_metric.call_args_list == [(('alerts.evaluate', 'Errors', 1),)] * 2
+
+
+@patch('manage_alerts.app.boto3.resource')
+def test_create_alert_rule(mock_boto3_resource):
+    """
+    POST /stock/{ticker}/alerts validates and stores a rule in the threshold index.
+    """
+    from manage_alerts.app import lambda_handler as manage_alerts_handler
+
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+
+    response = manage_alerts_handler({
+        "httpMethod": "POST",
+        "pathParameters": {"ticker": "AAPL"},
+        "body": json.dumps({"metric": "price", "direction": "above", "threshold": 200})
+    }, None)
+
+    assert response["statusCode"] == 201
+    stored = mock_table.put_item.call_args[1]["Item"]
+    assert stored["rule_key"].startswith("price#above#1000000000200.0000#")
+    assert json.loads(response["body"])["rule_id"] == stored["rule_id"]
+
+    response = manage_alerts_handler({
+        "httpMethod": "POST",
+        "pathParameters": {"ticker": "AAPL"},
+        "body": json.dumps({"metric": "volume", "direction": "above", "threshold": 1})
+    }, None)
+    assert response["statusCode"] == 400
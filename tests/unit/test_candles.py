@@ -0,0 +1,88 @@
+# tests/unit/test_candles.py
+
+import json
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+
+from boto3.dynamodb.types import TypeSerializer
+
+serializer = TypeSerializer()
+
+
+def stream_record(old, new):
+    """Builds a synthetic MODIFY stream record"""
+    return {"eventName": "MODIFY", "dynamodb": {
+        "OldImage": {k: serializer.serialize(v) for k, v in old.items()},
+        "NewImage": {k: serializer.serialize(v) for k, v in new.items()},
+    }}
+
+
+@patch('rollup_candles.app.boto3.resource')
+def test_quotes_fold_into_candles(mock_boto3_resource):
+    """
+    A quote refresh updates one candle per resolution and extends the high when exceeded.
+    """
+    from rollup_candles.app import lambda_handler as rollup_handler
+
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+    mock_table.update_item.return_value = {"Attributes": {
+        "open": Decimal("150"), "high": Decimal("150.10"), "low": Decimal("149"), "close": Decimal("150.25")
+    }}
+
+    old = {"ticker": "AAPL", "price": Decimal("150.00"), "volume": Decimal("1000"),
+           "latest_trading_day": "2024-05-14", "refreshed_at": Decimal(1715700000)}
+    new = dict(old, price=Decimal("150.25"), volume=Decimal("1250"), refreshed_at=Decimal(1715700075))
+    read_counted = dict(new, read_count=Decimal(3))
+
+    result = rollup_handler({"Records": [
+        stream_record(old, new),
+        # A read-count write is not a new quote
+        stream_record(new, read_counted),
+    ]}, None)
+
+    assert result == {"quotes_folded": 1}
+    folds = [c[1] for c in mock_table.update_item.call_args_list if "ReturnValues" in c[1]]
+    assert [f["Key"] for f in folds] == [
+        {"series": "AAPL#1m", "bucket_start": 1715700060},
+        {"series": "AAPL#1h", "bucket_start": 1715698800},
+        {"series": "AAPL#1d", "bucket_start": 1715644800},
+    ]
+    assert folds[0]["ExpressionAttributeValues"][":volume"] == Decimal("250")
+    extends = [c[1] for c in mock_table.update_item.call_args_list if "ReturnValues" not in c[1]]
+    assert len(extends) == 3
+    assert extends[0]["ConditionExpression"] == "#extreme < :price"
+    assert extends[0]["ExpressionAttributeNames"] == {"#extreme": "high"}
+
+
+@patch('get_candles.app.boto3.resource')
+def test_get_candles_returns_newest_oldest_first(mock_boto3_resource):
+    """
+    Without `from`, the newest candles are read descending and returned oldest first.
+    """
+    from get_candles.app import lambda_handler as get_candles_handler
+
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+    mock_table.query.return_value = {"Items": [
+        {"bucket_start": Decimal(7200), "close": Decimal("151")},
+        {"bucket_start": Decimal(3600), "close": Decimal("150.5")},
+    ]}
+
+    response = get_candles_handler({
+        "httpMethod": "GET",
+        "pathParameters": {"ticker": "AAPL"},
+        "queryStringParameters": {"res": "1h", "limit": "2"}
+    }, None)
+
+    assert response["statusCode"] == 200
+    body = json.loads(response["body"])
+    assert [c["bucket_start"] for c in body["candles"]] == [3600, 7200]
+    assert mock_table.query.call_args[1]["ScanIndexForward"] is False
+
+    response = get_candles_handler({
+        "httpMethod": "GET",
+        "pathParameters": {"ticker": "AAPL"},
+        "queryStringParameters": {"res": "5m"}
+    }, None)
+    assert response["statusCode"] == 400
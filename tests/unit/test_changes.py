@@ -0,0 +1,66 @@
+# tests/unit/test_changes.py
+
+import json
+from unittest.mock import patch
+
+from devtools.server import load_template, memory_backend
+from stock_common import changes, dynamo
+
+
+def changes_event(since, limit=None):
+    params = {"since": str(since)}
+    if limit:
+        params["limit"] = str(limit)
+    return {"resource": "/stock/changes", "httpMethod": "GET", "queryStringParameters": params}
+
+
+def test_changes_since_merges_writes_and_deletes():
+    """
+    Creates and deletes come back in sequence order, paged by next_since, with a delete before a re-create.
+    """
+    from create_stock.app import lambda_handler as create_stock_handler
+    from delete_stock.app import lambda_handler as delete_stock_handler
+    from get_stocks.app import lambda_handler as get_stocks_handler
+
+    dynamo.use_backend(memory_backend(load_template()))
+    try:
+        for ticker in ("AAPL", "MSFT", "JPM"):
+            create_stock_handler({"httpMethod": "POST", "body": json.dumps({"ticker": ticker})}, None)
+        delete_stock_handler({"httpMethod": "DELETE", "pathParameters": {"ticker": "AAPL"}}, None)
+        create_stock_handler({"httpMethod": "POST", "body": json.dumps({"ticker": "AAPL"})}, None)
+
+        with patch.object(changes, "SETTLE_SECONDS", 0):
+            body = json.loads(get_stocks_handler(changes_event(0, limit=2), None)["body"])
+            assert [(c["ticker"], c["updated_seq"]) for c in body["changes"]] == [("MSFT", 2), ("JPM", 3)]
+            assert body["changes"][0].get("deleted") is None
+            assert "sync_partition" not in body["changes"][0]
+            assert (body["next_since"], body["has_more"]) == (3, True)
+
+            body = json.loads(get_stocks_handler(changes_event(body["next_since"]), None)["body"])
+            assert [(c["ticker"], c["updated_seq"], c.get("deleted")) for c in body["changes"]] == [
+                ("AAPL", 4, True), ("AAPL", 5, None)]
+            assert (body["next_since"], body["has_more"]) == (5, False)
+
+        # Changes younger than the settle window are held back until they cannot be overtaken
+        body = json.loads(get_stocks_handler(changes_event(3), None)["body"])
+        assert body == {"changes": [], "next_since": 3, "has_more": False}
+
+        assert get_stocks_handler(changes_event(-1), None)["statusCode"] == 400
+    finally:
+        dynamo.use_backend(None)
+
+
+def test_failed_delete_leaves_no_tombstone():
+    """
+    Deleting a missing stock is a 404 and publishes no delete to delta-sync clients.
+    """
+    from delete_stock.app import lambda_handler as delete_stock_handler
+
+    backend = memory_backend(load_template())
+    dynamo.use_backend(backend)
+    try:
+        response = delete_stock_handler({"httpMethod": "DELETE", "pathParameters": {"ticker": "AAPL"}}, None)
+        assert response["statusCode"] == 404
+        assert backend.Table(changes.TOMBSTONES_TABLE).scan()["Items"] == []
+    finally:
+        dynamo.use_backend(None)
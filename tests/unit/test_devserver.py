@@ -0,0 +1,74 @@
+# tests/unit/test_devserver.py
+
+import json
+
+import pytest
+from boto3.dynamodb.conditions import Attr, Key
+from botocore.exceptions import ClientError
+
+from devtools.memory_table import MemoryResource
+from devtools.server import build_app
+from stock_common import dynamo
+
+
+@pytest.fixture()
+def client():
+    from werkzeug.test import Client
+    from werkzeug.wrappers import Response
+
+    app = build_app(seed="devtools/seed.json")
+    try:
+        yield Client(app, Response)
+    finally:
+        dynamo.use_backend(None)
+
+
+def test_memory_table_expressions():
+    """
+    The in-memory table applies update, condition and key expressions like DynamoDB.
+    """
+    table = MemoryResource().add_table("candles", "series", "bucket_start")
+    for start in (60, 120, 180):
+        table.put_item(Item={"series": "AAPL#1m", "bucket_start": start, "volume": 1})
+
+    table.update_item(
+        Key={"series": "AAPL#1m", "bucket_start": 60},
+        UpdateExpression="SET #o = if_not_exists(#o, :p) ADD volume :v",
+        ConditionExpression=Attr("volume").lt(5),
+        ExpressionAttributeNames={"#o": "open"},
+        ExpressionAttributeValues={":p": 10, ":v": 2},
+    )
+    item = table.get_item(Key={"series": "AAPL#1m", "bucket_start": 60})["Item"]
+    assert item["open"] == 10 and item["volume"] == 3
+
+    with pytest.raises(ClientError) as error:
+        table.put_item(Item={"series": "AAPL#1m", "bucket_start": 60},
+                       ConditionExpression="attribute_not_exists(series)")
+    assert error.value.response["Error"]["Code"] == "ConditionalCheckFailedException"
+
+    response = table.query(
+        KeyConditionExpression=Key("series").eq("AAPL#1m") & Key("bucket_start").gte(120),
+        ScanIndexForward=False,
+        Limit=1,
+    )
+    assert [i["bucket_start"] for i in response["Items"]] == [180]
+    assert response["LastEvaluatedKey"] == {"series": "AAPL#1m", "bucket_start": 180}
+
+
+def test_dev_server_routes_to_handlers(client):
+    """
+    Requests reach the mounted handlers and share the seeded in-memory tables.
+    """
+    response = client.get("/stock/AAPL")
+    assert response.status_code == 200
+    assert json.loads(response.get_data(as_text=True))["ticker"] == "AAPL"
+
+    response = client.post("/stock", data=json.dumps({"ticker": "TSLA", "company_name": "Tesla"}))
+    assert response.status_code == 200
+    assert client.get("/stock/TSLA").status_code == 200
+
+    response = client.post("/portfolio/value", data=json.dumps({"AAPL": 10}))
+    assert json.loads(response.get_data(as_text=True))["positions"][0]["ticker"] == "AAPL"
+
+    assert client.get("/nope").status_code == 404
+    assert client.open("/stock/AAPL", method="PATCH").status_code == 405
@@ -0,0 +1,82 @@
+# tests/unit/test_fields.py
+
+import json
+from unittest.mock import patch, MagicMock
+from decimal import Decimal
+
+import pytest
+
+from stock_common.fields import FieldsError, parse_fields
+
+
+def test_parse_fields():
+    """
+    fields= is deduplicated, always includes the key, and rejects names that are not attributes.
+    """
+    assert parse_fields(None) is None
+    assert parse_fields({"limit": "5"}) is None
+    assert parse_fields({"fields": "price, volume,price"}) == ["ticker", "price", "volume"]
+    assert parse_fields({"fields": "volume,ticker"}) == ["volume", "ticker"]
+
+    for value in ("", " , ", "price,#volume", "a.b"):
+        with pytest.raises(FieldsError):
+            parse_fields({"fields": value})
+
+
+@patch('get_stock.app.boto3.resource')
+def test_get_stock_fields(mock_boto3_resource):
+    """
+    get_stock reads only the requested attributes.
+    """
+    from get_stock.app import lambda_handler as get_stock_handler
+
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+    mock_table.get_item.return_value = {"Item": {"ticker": "AAPL", "price": Decimal("189.84")}}
+
+    event = {
+        "pathParameters": {"ticker": "AAPL"},
+        "queryStringParameters": {"fields": "price"},
+        "httpMethod": "GET",
+    }
+    response = get_stock_handler(event, None)
+
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == {"ticker": "AAPL", "price": 189.84}
+    mock_table.get_item.assert_called_with(
+        Key={"ticker": "AAPL"},
+        ProjectionExpression="#ticker, #price",
+        ExpressionAttributeNames={"#ticker": "ticker", "#price": "price"},
+    )
+
+    event["queryStringParameters"] = {"fields": "price;volume"}
+    assert get_stock_handler(event, None)["statusCode"] == 400
+
+
+@patch('get_stocks.app.boto3.resource')
+def test_get_stocks_fields(mock_boto3_resource):
+    """
+    The list and export scans project the requested attributes.
+    """
+    from get_stocks.app import lambda_handler as get_stocks_handler
+
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+    mock_table.scan.return_value = {"Items": [{"ticker": "AAPL", "volume": Decimal(52000000)}]}
+
+    projection = {
+        "ProjectionExpression": "#ticker, #volume",
+        "ExpressionAttributeNames": {"#ticker": "ticker", "#volume": "volume"},
+    }
+
+    response = get_stocks_handler({"httpMethod": "GET", "queryStringParameters": {"fields": "volume"}}, None)
+    assert json.loads(response["body"]) == [{"ticker": "AAPL", "volume": 52000000}]
+    mock_table.scan.assert_called_with(**projection)
+
+    response = get_stocks_handler({
+        "resource": "/stock/export",
+        "httpMethod": "GET",
+        "queryStringParameters": {"fields": "volume", "limit": "10"},
+    }, None)
+    assert response["statusCode"] == 200
+    mock_table.scan.assert_called_with(Limit=10, **projection)
@@ -196,7 +196,7 @@ def test_get_stock(mock_boto3_resource, apigw_event_get):
 
 @patch.dict('update_stock.app.os.environ', {'ALPHA_VANTAGE_API_KEY': 'RYXS7QBFIK5870FS'})  # Insert Alpha Vantage API Key Here (only used for tests)
 @patch('update_stock.app.boto3.resource')
-@patch('update_stock.app.urllib.request.urlopen')
+@patch('stock_common.quotes.urllib.request.urlopen')
 def test_update_stock(mock_urlopen, mock_boto3_resource, apigw_event_update):
     """
     Test the update_stock_handler by updating a stock's price and volume.
@@ -262,8 +262,9 @@ def test_delete_stock(mock_boto3_resource, apigw_event_delete):
     mock_table = MagicMock()
     mock_boto3_resource.return_value.Table.return_value = mock_table
 
-    # Mock delete_item response
-    mock_table.delete_item.return_value = {}
+    # Mock transact_write_items response
+    mock_client = mock_boto3_resource.return_value.meta.client
+    mock_client.transact_write_items.return_value = {}
 
     # Call the handler
     response = delete_stock_handler(apigw_event_delete, None)
@@ -274,11 +275,15 @@ def test_delete_stock(mock_boto3_resource, apigw_event_delete):
     assert "message" in body
     assert body["message"] == "The stock was deleted successfully from the database"
 
-    # Ensure delete_item was called with correct parameters
-    mock_table.delete_item.assert_called_with(
-        Key={"ticker": "AAPL"},
-        ConditionExpression="attribute_exists(ticker)"
-    )
+    # Ensure the conditional delete and its tombstone were written together
+    delete, tombstone = mock_client.transact_write_items.call_args.kwargs["TransactItems"]
+    assert delete == {"Delete": {
+        "TableName": "stocks-table",
+        "Key": {"ticker": {"S": "AAPL"}},
+        "ConditionExpression": "attribute_exists(ticker)"
+    }}
+    assert tombstone["Put"]["TableName"] == "stock-tombstones-table"
+    assert tombstone["Put"]["Item"]["ticker"] == {"S": "AAPL"}
 
 # -------------------------------
 # Test for compare_stocks Handler
@@ -390,4 +395,90 @@ def test_get_stocks(mock_boto3_resource, apigw_event_get_stocks):
     assert TEST_STOCK_TSLA in stocks
 
     # Ensure scan was called
-    mock_table.scan.assert_called_once()
\ No newline at end of file
+    mock_table.scan.assert_called_once()
+
+# -------------------------------
+# Test for the NDJSON export
+# -------------------------------
+
+@patch('get_stocks.app.boto3.resource')
+def test_export_stocks_ndjson_pages(mock_boto3_resource):
+    """
+    Test the NDJSON export returns one scan page per response with a cursor to the next.
+    """
+    from get_stocks.app import lambda_handler as get_stocks_handler
+
+    # Mock DynamoDB Table with two scan pages
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+    mock_table.scan.side_effect = [
+        {"Items": [TEST_STOCK_AAPL], "LastEvaluatedKey": {"ticker": "AAPL"}},
+        {"Items": [TEST_STOCK_TSLA]}
+    ]
+
+    event = {
+        "resource": "/stock/export",
+        "httpMethod": "GET",
+        "path": "/stock/export",
+        "queryStringParameters": {"format": "ndjson", "limit": "1"}
+    }
+
+    # First page
+    response = get_stocks_handler(event, None)
+    assert response["statusCode"] == 200
+    assert response["headers"]["Content-Type"] == "application/x-ndjson"
+    assert [json.loads(line) for line in response["body"].splitlines()] == [TEST_STOCK_AAPL]
+    cursor = response["headers"]["X-Next-Cursor"]
+
+    # Second (last) page
+    event["queryStringParameters"]["cursor"] = cursor
+    response = get_stocks_handler(event, None)
+    assert [json.loads(line) for line in response["body"].splitlines()] == [TEST_STOCK_TSLA]
+    assert "X-Next-Cursor" not in response["headers"]
+
+    mock_table.scan.assert_called_with(Limit=1, ExclusiveStartKey={"ticker": "AAPL"})
+
+
+@patch('get_stocks.app.boto3.resource')
+def test_export_stocks_rejects_limit_below_one(mock_boto3_resource):
+    """
+    Test the NDJSON export answers 400 for a limit of 0 or less instead of scanning.
+    """
+    from get_stocks.app import lambda_handler as get_stocks_handler
+
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+
+    for limit in ("0", "-5"):
+        event = {
+            "resource": "/stock/export",
+            "httpMethod": "GET",
+            "path": "/stock/export",
+            "queryStringParameters": {"format": "ndjson", "limit": limit}
+        }
+        response = get_stocks_handler(event, None)
+        assert response["statusCode"] == 400
+
+    mock_table.scan.assert_not_called()
+
+
+@patch('get_stocks.app.boto3.resource')
+def test_export_stocks_stream(mock_boto3_resource):
+    """
+    Test streaming the export writes one chunk per scan page.
+    """
+    from get_stocks.app import stream_stocks_ndjson
+
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+    mock_table.scan.side_effect = [
+        {"Items": [TEST_STOCK_AAPL], "LastEvaluatedKey": {"ticker": "AAPL"}},
+        {"Items": [TEST_STOCK_TSLA]}
+    ]
+
+    stream = MagicMock()
+    stream_stocks_ndjson(stream)
+
+    chunks = [call[0][0] for call in stream.write.call_args_list]
+    assert len(chunks) == 2
+    assert json.loads(chunks[1]) == TEST_STOCK_TSLA
@@ -0,0 +1,159 @@
+# tests/unit/test_history.py
+
+import datetime
+import io
+import json
+from contextlib import contextmanager
+from decimal import Decimal
+from unittest.mock import patch
+
+import pytest
+
+from devtools.memory_table import MemoryResource
+from devtools.server import load_template, memory_backend
+from stock_common import dynamo
+from stock_common.dynamo import get_table
+from stock_common.history import backfill_ticker, iter_daily_bars
+from stock_common.quotes import NotFoundError, RateLimitError
+
+
+def daily_response(days):
+    """TIME_SERIES_DAILY payload for consecutive days ending the day before 2024-05-01, newest first"""
+    start = datetime.date(2024, 5, 1)
+    series = {}
+    for i in range(1, days + 1):
+        price = f'{100 + i * 0.25:.4f}'
+        series[(start - datetime.timedelta(days=i)).isoformat()] = {
+            '1. open': price, '2. high': price, '3. low': price, '4. close': price, '5. volume': str(1000 + i),
+        }
+    return {
+        'Meta Data': {'1. Information': 'Daily Prices (open, high, low, close) and Volumes – ünicode', '2. Symbol': 'AAPL'},
+        'Time Series (Daily)': series,
+    }
+
+
+class StreamProvider:
+    """Quote provider stand-in serving one payload through stream()"""
+
+    def __init__(self, payloads):
+        self.payloads = payloads
+        self.calls = []
+
+    @contextmanager
+    def stream(self, function, symbol, **params):
+        self.calls.append((function, symbol, params))
+        yield io.BytesIO(json.dumps(self.payloads[symbol], indent=1).encode('utf-8'))
+
+
+def test_iter_daily_bars_across_chunk_boundaries():
+    """
+    Bars parse identically whatever the chunking, including multi-byte characters split across chunks.
+    """
+    payload = daily_response(50)
+    raw = json.dumps(payload, indent=2).encode('utf-8')
+
+    for chunk_size in (1, 7, 64, 1 << 16):
+        bars = list(iter_daily_bars(io.BytesIO(raw), chunk_size=chunk_size))
+        assert bars == list(payload['Time Series (Daily)'].items())
+
+
+def test_iter_daily_bars_errors():
+    """
+    Rate-limit notes and unknown tickers raise like quote calls do.
+    """
+    with pytest.raises(RateLimitError):
+        list(iter_daily_bars(io.BytesIO(b'{"Note": "Thank you for using Alpha Vantage!"}')))
+    with pytest.raises(NotFoundError):
+        list(iter_daily_bars(io.BytesIO(b'{"Error Message": "Invalid API call."}')))
+    with pytest.raises(NotFoundError):
+        list(iter_daily_bars(io.BytesIO(b'{}')))
+
+
+def test_backfill_ticker_writes_daily_candles():
+    """
+    Bars become 1d candles; days from `before` on and before `since` are skipped.
+    """
+    table = MemoryResource().add_table('stock-candles-table', 'series', 'bucket_start')
+    provider = StreamProvider({'AAPL': daily_response(10)})
+
+    written, oldest = backfill_ticker(provider, table, 'AAPL', before='2024-04-30', since='2024-04-25')
+
+    assert (written, oldest) == (5, '2024-04-25')
+    assert provider.calls == [('TIME_SERIES_DAILY', 'AAPL', {'outputsize': 'full'})]
+    candle = table.get_item(Key={'series': 'AAPL#1d', 'bucket_start': 1714003200})['Item']
+    assert candle['close'] == Decimal('101.5000') and candle['volume'] == Decimal(1006)
+    assert candle['last_quote_at'] == 1714003200 + 86399
+    # April is also packed into one monthly item
+    month = table.get_item(Key={'series': 'AAPL#1d-packed', 'bucket_start': 1711929600})['Item']
+    assert month['count'] == 5
+
+
+def test_backfill_run_resumes_from_checkpoints():
+    """
+    The scheduled run backfills new tickers in full, catches up recent ones and skips finished ones.
+    """
+    from backfill_history import app
+
+    today = datetime.date(2024, 5, 1)
+    assert app.plan(['AAPL', 'MSFT', 'DONE', 'GONE'], {
+        'MSFT': {'status': 'done', 'through': '2024-04-25'},
+        'DONE': {'status': 'done', 'through': '2024-04-30'},
+        'GONE': {'status': 'missing'},
+    }, today) == [('AAPL', 'full', None), ('MSFT', 'compact', '2024-04-25')]
+
+    provider = StreamProvider({
+        'AAPL': daily_response(30),
+        'MSFT': daily_response(30),
+        'NOPE': {'Error Message': 'Invalid API call.'},
+    })
+    dynamo.use_backend(memory_backend(load_template()))
+    try:
+        checkpoints = get_table(None, app.BACKFILL_TABLE)
+        checkpoints.put_item(Item={'ticker': 'MSFT', 'status': 'done', 'through': '2024-04-25'})
+        checkpoints.put_item(Item={'ticker': 'DONE', 'status': 'done', 'through': '2024-04-30'})
+        for ticker in ('AAPL', 'MSFT', 'DONE', 'NOPE'):
+            get_table(None).put_item(Item={'ticker': ticker})
+
+        with patch.object(app, 'quote_provider', provider), patch.object(app, 'utc_today', return_value=today):
+            result = app.lambda_handler({}, None)
+            assert app.plan(['AAPL', 'MSFT', 'DONE', 'NOPE'], app.load_checkpoints(), today) == []
+
+        assert result == {'considered': 4, 'backfilled': 2, 'days': 36, 'failed': ['NOPE'], 'deferred': 0}
+        assert ('TIME_SERIES_DAILY', 'MSFT', {'outputsize': 'compact'}) in provider.calls
+        assert checkpoints.get_item(Key={'ticker': 'AAPL'})['Item']['through'] == '2024-04-30'
+        assert checkpoints.get_item(Key={'ticker': 'NOPE'})['Item']['status'] == 'missing'
+    finally:
+        dynamo.use_backend(None)
+
+
+def test_backfill_failure_backs_off():
+    """
+    A ticker failing with an Information response is checkpointed as failed and retried after a growing wait.
+    """
+    from backfill_history import app
+
+    today = datetime.date(2024, 5, 1)
+    provider = StreamProvider({'AAPL': {'Information': 'Premium endpoint.'}})
+    dynamo.use_backend(memory_backend(load_template()))
+    try:
+        checkpoints = get_table(None, app.BACKFILL_TABLE)
+        checkpoints.put_item(Item={'ticker': 'AAPL', 'status': 'done', 'through': '2024-04-25'})
+
+        with patch.object(app, 'quote_provider', provider), patch.object(app, 'utc_today', return_value=today):
+            assert app.lambda_handler({'tickers': ['AAPL']}, None)['failed'] == ['AAPL']
+            first = checkpoints.get_item(Key={'ticker': 'AAPL'})['Item']
+            assert (first['status'], first['attempts'], first['through']) == ('failed', 1, '2024-04-25')
+            assert first['retry_after'] - first['updated_at'] == app.RETRY_SECONDS
+
+            # Skipped until retry_after, then retried with the wait doubled
+            assert app.lambda_handler({'tickers': ['AAPL']}, None)['failed'] == []
+            assert app.plan(['AAPL'], app.load_checkpoints(), today, now=int(first['retry_after'])) == [
+                ('AAPL', 'compact', '2024-04-25')]
+            with patch.object(app, 'plan', return_value=[('AAPL', 'compact', '2024-04-25')]):
+                app.lambda_handler({'tickers': ['AAPL']}, None)
+            second = checkpoints.get_item(Key={'ticker': 'AAPL'})['Item']
+            assert second['attempts'] == 2
+            assert second['retry_after'] - second['updated_at'] == 2 * app.RETRY_SECONDS
+        assert len(provider.calls) == 2
+    finally:
+        dynamo.use_backend(None)
@@ -0,0 +1,74 @@
+# tests/unit/test_metrics.py
+
+import json
+import boto3
+import pytest
+from botocore.stub import Stubber
+from types import SimpleNamespace
+
+from stock_common import metrics
+
+
+@pytest.fixture()
+def dynamodb_client():
+    """Generates a stubbed DynamoDB client with the metrics hooks installed"""
+    client = boto3.client('dynamodb', region_name='us-east-1',
+                          aws_access_key_id='testing', aws_secret_access_key='testing')
+    metrics.instrument_client(client)
+    with Stubber(client) as stubber:
+        yield client, stubber
+    metrics.flush()
+
+
+def emf_lines(output):
+    return [json.loads(line) for line in output.strip().splitlines() if line.startswith('{"_aws"')]
+
+
+def test_backend_calls_are_buffered_until_flush(dynamodb_client, capsys):
+    """
+    DynamoDB calls request consumed capacity and are emitted as one EMF line per operation.
+    """
+    client, stubber = dynamodb_client
+    expected_params = {'TableName': 'stocks-table', 'Key': {'ticker': {'S': 'AAPL'}},
+                       'ReturnConsumedCapacity': 'TOTAL'}
+    for _ in range(2):
+        stubber.add_response('get_item', {
+            'Item': {'ticker': {'S': 'AAPL'}},
+            'ConsumedCapacity': {'TableName': 'stocks-table', 'CapacityUnits': 0.5}
+        }, expected_params)
+
+    @metrics.metered
+    def handler(event, context):
+        for _ in range(2):
+            client.get_item(TableName='stocks-table', Key={'ticker': {'S': 'AAPL'}})
+        metrics.cache_result('compare', hit=False)
+        # Nothing is printed until the invocation ends
+        assert emf_lines(capsys.readouterr().out) == []
+
+    handler({}, SimpleNamespace(function_name='GetStockFunction'))
+
+    lines = {line['Operation']: line for line in emf_lines(capsys.readouterr().out)}
+    assert set(lines) == {'dynamodb.GetItem', 'compare'}
+
+    get_item = lines['dynamodb.GetItem']
+    assert get_item['Function'] == 'GetStockFunction'
+    assert get_item['_aws']['CloudWatchMetrics'][0]['Dimensions'] == [['Function', 'Operation']]
+    assert get_item['ConsumedCapacity'] == [0.5, 0.5]
+    assert len(get_item['Latency']) == 2
+    assert get_item['Retries'] == [0, 0]
+    assert lines['compare']['CacheMiss'] == 1
+
+
+def test_timed_records_errors(capsys):
+    """
+    A timed block that raises records both its latency and an error count.
+    """
+    with pytest.raises(ValueError):
+        with metrics.timed('alphavantage.GLOBAL_QUOTE'):
+            raise ValueError('upstream failed')
+    metrics.flush()
+
+    line = emf_lines(capsys.readouterr().out)[0]
+    assert line['Operation'] == 'alphavantage.GLOBAL_QUOTE'
+    assert line['Errors'] == 1
+    assert {'Name': 'Latency', 'Unit': 'Milliseconds'} in line['_aws']['CloudWatchMetrics'][0]['Metrics']
@@ -0,0 +1,174 @@
+# tests/unit/test_mmapsnap.py
+
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+from devtools.server import load_template, memory_backend
+from stock_common import dynamo, mmapsnap
+from stock_common.resultcache import ResultCache
+
+ITEMS = [
+    {"ticker": "MSFT", "price": Decimal("410.25"), "volume": Decimal("1200"), "updated_seq": Decimal("3")},
+    {"ticker": "AAPL", "price": Decimal("150"), "volume": Decimal("1000"), "updated_seq": Decimal("1")},
+    {"ticker": "AMZN", "price": Decimal("180.5"), "volume": Decimal("900"), "updated_seq": Decimal("2")},
+    {"ticker": "AMD", "price": Decimal("160"), "volume": Decimal("800"), "updated_seq": Decimal("4")},
+]
+
+
+class Clock:
+
+    def __init__(self, now):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def write_snapshot(path, items=ITEMS, seq=4, created_at=1_000_000):
+    path.write_bytes(mmapsnap.build(items, seq, created_at))
+    return str(path)
+
+
+def test_snapshot_lookups(tmp_path):
+    """
+    Test a built snapshot answers gets, prefix ranges and listings from the mapped file.
+    """
+    snapshot = mmapsnap.StockSnapshot(write_snapshot(tmp_path / "stocks.snap"))
+
+    assert len(snapshot) == 4
+    assert (snapshot.seq, snapshot.created_at) == (4, 1_000_000)
+    assert [snapshot.ticker_at(i) for i in range(len(snapshot))] == ["AAPL", "AMD", "AMZN", "MSFT"]
+
+    assert snapshot.get("AMZN") == ITEMS[2]
+    assert snapshot.get("AM") is None
+    assert snapshot.get("ZZZZ") is None
+    assert snapshot.get("A" * 20) is None
+
+    assert [snapshot.ticker_at(i) for i in range(*snapshot.prefix_range("AM"))] == ["AMD", "AMZN"]
+    assert snapshot.prefix_range("Z") == (4, 4)
+    assert snapshot.prefix_range("") == (0, 4)
+
+    listed = json.loads(snapshot.items_json(*snapshot.prefix_range("A")))
+    assert [item["ticker"] for item in listed] == ["AAPL", "AMD", "AMZN"]
+    assert listed[1]["price"] == 160
+    assert json.loads(mmapsnap.StockSnapshot(write_snapshot(tmp_path / "empty.snap", [])).items_json()) == []
+
+
+def test_snapshot_source_falls_back_when_stale(tmp_path):
+    """
+    Test a snapshot older than max_age is not served, and a newer one is picked up on the next check.
+    """
+    path = tmp_path / "stocks.snap"
+    clock = Clock(1_000_100)
+    source = mmapsnap.SnapshotSource(write_snapshot(path), max_age=300, check_seconds=60, clock=clock)
+
+    assert source.current().seq == 4
+
+    clock.now = 1_000_500
+    assert source.current() is None
+
+    # Not checked again within check_seconds, then the rewritten file is mapped
+    write_snapshot(path, seq=9, created_at=1_000_450)
+    clock.now = 1_000_520
+    assert source.current() is None
+    clock.now = 1_000_600
+    assert source.current().seq == 9
+
+    assert mmapsnap.SnapshotSource(str(tmp_path / "missing.snap")).current() is None
+
+
+def test_list_reads_the_snapshot_and_compare_does_not(tmp_path):
+    """
+    Test get_stocks answers from a fresh snapshot without reading the stocks table, while compare_stocks reads DynamoDB.
+    """
+    from compare_stocks import app as compare_app
+    from get_stocks import app as get_stocks_app
+
+    backend = memory_backend(load_template())
+    stocks = backend.Table("stocks-table")
+    for item in ITEMS:
+        stocks.put_item(Item=item)
+    source = mmapsnap.SnapshotSource(write_snapshot(tmp_path / "stocks.snap"), clock=Clock(1_000_100))
+
+    dynamo.use_backend(backend)
+    try:
+        with patch.object(mmapsnap, "default_source", return_value=source), \
+                patch.object(type(stocks), "scan", side_effect=AssertionError("scanned")):
+            listed = get_stocks_app.lambda_handler({"queryStringParameters": {"prefix": "AM"}}, None)
+            assert [item["ticker"] for item in json.loads(listed["body"])] == ["AMD", "AMZN"]
+
+            projected = get_stocks_app.lambda_handler({"queryStringParameters": {"fields": "price"}}, None)
+            assert json.loads(projected["body"])[0] == {"ticker": "AAPL", "price": 150}
+
+        # A price written after the snapshot was built is compared at once
+        stocks.put_item(Item=dict(ITEMS[0], price=Decimal("420")))
+        with patch.object(mmapsnap, "default_source", return_value=source), \
+                patch.object(compare_app, "result_cache", ResultCache("compare_stocks.cache", maxsize=0)):
+            compared = compare_app.lambda_handler(
+                {"httpMethod": "GET", "queryStringParameters": {"ticker1": "MSFT", "ticker2": "AAPL"}}, None)
+        assert compared["statusCode"] == 200
+        assert json.loads(compared["body"])["stock1"] == {"ticker": "MSFT", "price": 420, "volume": 1200}
+
+        # Once stale, the same search scans DynamoDB
+        source.clock.now = 1_000_000 + source.max_age + 1
+        with patch.object(mmapsnap, "default_source", return_value=source):
+            listed = get_stocks_app.lambda_handler({"queryStringParameters": {"prefix": "MS"}}, None)
+        assert [item["ticker"] for item in json.loads(listed["body"])] == ["MSFT"]
+    finally:
+        dynamo.use_backend(None)
+
+
+def test_export_writes_read_snapshot(tmp_path):
+    """
+    Test the snapshot job's mmap format writes a snapshot stamped with the sequence counter.
+    """
+    from export_snapshot.app import lambda_handler as export_snapshot_handler
+
+    backend = memory_backend(load_template())
+    for item in ITEMS:
+        backend.Table("stocks-table").put_item(Item=dict(item, refresh_lease_owner="abc"))
+    backend.Table("stock-sequence-table").put_item(Item={"name": "stocks", "value": Decimal("7")})
+
+    dynamo.use_backend(backend)
+    try:
+        manifest = export_snapshot_handler({"destination": str(tmp_path), "format": "mmap", "segments": 2}, None)
+    finally:
+        dynamo.use_backend(None)
+
+    assert (manifest["rows"], manifest["seq"]) == (4, 7)
+    snapshot = mmapsnap.StockSnapshot(str(tmp_path / mmapsnap.SNAPSHOT_NAME))
+    assert snapshot.seq == 7
+    assert snapshot.get("AAPL") == ITEMS[1]
+
+
+def test_hourly_export_writes_both_snapshots_from_one_paced_scan(tmp_path):
+    """
+    Test the hourly columnar run also writes the read snapshot, scanning once and pausing for the capacity each page used.
+    """
+    from export_snapshot import app
+
+    backend = memory_backend(load_template())
+    stocks = backend.Table("stocks-table")
+    for item in ITEMS:
+        stocks.put_item(Item=item)
+    scan = stocks.scan
+    pages = []
+
+    def paged_scan(**kwargs):
+        pages.append(kwargs)
+        return dict(scan(**dict(kwargs, Limit=1)), ConsumedCapacity={"CapacityUnits": 0.5})
+
+    dynamo.use_backend(backend)
+    try:
+        with patch.object(stocks, "scan", side_effect=paged_scan), patch.object(app.time, "sleep") as sleep:
+            manifest = app.lambda_handler({"destination": str(tmp_path), "format": "csv", "segments": 1}, None)
+    finally:
+        dynamo.use_backend(None)
+
+    assert manifest["rows"] == 4
+    assert len(pages) == 4 and all(page["ReturnConsumedCapacity"] == "TOTAL" for page in pages)
+    # 0.5 units per page at 2 units a second, after every page but the last
+    assert [call.args[0] for call in sleep.call_args_list] == [0.25] * 3
+    snapshot = mmapsnap.StockSnapshot(str(tmp_path / mmapsnap.SNAPSHOT_NAME))
+    assert len(snapshot) == 4 and snapshot.get("AMD") == ITEMS[3]
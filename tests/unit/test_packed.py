@@ -0,0 +1,183 @@
+# tests/unit/test_packed.py
+
+import datetime
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+import numpy as np
+
+from devtools.memory_table import MemoryResource
+from stock_common import packed
+from stock_common.candles import query_series
+
+
+def daily_candles(ticker, first, days):
+    """One 1d candle per weekday from `first`, with four-decimal prices"""
+    candles = []
+    day = first
+    while len(candles) < days:
+        if day.weekday() < 5:
+            start = int(datetime.datetime(day.year, day.month, day.day, tzinfo=datetime.timezone.utc).timestamp())
+            price = Decimal('150.0000') + Decimal(len(candles) % 37) / 8 - Decimal('0.0001')
+            candles.append({
+                'series': f'{ticker}#1d', 'bucket_start': start, 'open': price, 'high': price + 1,
+                'low': price - 1, 'close': price + Decimal('0.25'), 'volume': 40_000_000 + len(candles) * 977,
+            })
+        day += datetime.timedelta(days=1)
+    return candles
+
+
+class CountingTable:
+    """Wraps a table to count its queries and the items they return"""
+
+    def __init__(self, table):
+        self.table = table
+        self.queries = 0
+        self.items_read = 0
+
+    def query(self, **kwargs):
+        self.queries += 1
+        response = self.table.query(**kwargs)
+        self.items_read += len(response.get('Items', []))
+        return response
+
+    def __getattr__(self, name):
+        return getattr(self.table, name)
+
+
+def test_pack_round_trip():
+    """
+    A packed month decodes to exactly the stored candles, as NumPy arrays.
+    """
+    candles = daily_candles('AAPL', datetime.date(2024, 1, 1), 23)
+    item = packed.pack_month('AAPL', candles)
+
+    assert item['series'] == 'AAPL#1d-packed' and item['bucket_start'] == 1704067200
+    assert len(item['close']) == 8 * 23
+
+    columns = packed.unpack(item)
+    assert columns['bucket_start'].dtype == np.int64 and columns['close'].dtype == np.float64
+    assert columns['bucket_start'].tolist() == [c['bucket_start'] for c in candles]
+    assert columns['volume'].tolist() == [c['volume'] for c in candles]
+    assert columns['low'].tolist() == [float(c['low']) for c in candles]
+
+
+def test_year_read_uses_packed_months():
+    """
+    A year of daily candles is read from about 12 packed items, topped up with newer 1d candles.
+    """
+    table = MemoryResource().add_table('stock-candles-table', 'series', 'bucket_start')
+    candles = daily_candles('AAPL', datetime.date(2023, 1, 2), 300)
+    packed_days, recent = candles[:-5], candles[-5:]
+    for candle in candles:
+        table.put_item(Item=candle)
+    packed.write_months(table, 'AAPL', packed_days)
+
+    counting = CountingTable(table)
+    start, end = candles[40]['bucket_start'], candles[-1]['bucket_start']
+    columns = packed.read_daily(counting, 'AAPL', start, end, limit=1000)
+
+    expected = query_series(table, 'AAPL#1d', start, end, 1000)
+    assert columns['bucket_start'].tolist() == [int(c['bucket_start']) for c in expected]
+    assert columns['close'].tolist() == [float(c['close']) for c in expected]
+    # 13 months plus the unpacked days, instead of one item per day
+    assert counting.items_read == 13 + len(recent) < len(expected)
+
+    # Without `from`, the newest days come back, including the unpacked ones
+    newest = packed.read_daily(table, 'AAPL', limit=30)
+    assert newest['bucket_start'].tolist() == [c['bucket_start'] for c in candles[-30:]]
+
+
+def test_get_candles_daily_from_packed_history():
+    """
+    GET /stock/{ticker}/candles?res=1d serves the same candles from packed months.
+    """
+    from get_candles.app import lambda_handler as get_candles_handler
+
+    resource = MemoryResource()
+    table = resource.add_table('stock-candles-table', 'series', 'bucket_start')
+    candles = daily_candles('MSFT', datetime.date(2024, 1, 1), 60)
+    for candle in candles:
+        table.put_item(Item=candle)
+    packed.write_months(table, 'MSFT', candles[:50])
+
+    with patch('stock_common.dynamo._backend', resource), patch('stock_common.dynamo._tables', {}):
+        response = get_candles_handler({
+            "httpMethod": "GET",
+            "pathParameters": {"ticker": "MSFT"},
+            "queryStringParameters": {"res": "1d", "limit": "45"}
+        }, None)
+
+    assert response["statusCode"] == 200
+    body = json.loads(response["body"])
+    assert [c["bucket_start"] for c in body["candles"]] == [c['bucket_start'] for c in candles[-45:]]
+    assert body["candles"][-1]["close"] == float(candles[-1]['close'])
+
+
+def test_range_read_skips_tail_when_packed_covers_limit():
+    """
+    A read from `from` that packed months already fill reads no 1d candles, and a short one reads only the shortfall.
+    """
+    table = MemoryResource().add_table('stock-candles-table', 'series', 'bucket_start')
+    candles = daily_candles('AAPL', datetime.date(2023, 1, 2), 300)
+    for candle in candles:
+        table.put_item(Item=candle)
+    packed.write_months(table, 'AAPL', candles[:-5])
+
+    counting = CountingTable(table)
+    columns = packed.read_daily(counting, 'AAPL', candles[10]['bucket_start'], None, limit=50)
+    assert columns['bucket_start'].tolist() == [c['bucket_start'] for c in candles[10:60]]
+    months_read = counting.items_read
+    assert months_read <= (50 + packed.MAX_MONTH_DAYS - 1) // packed.MAX_MONTH_DAYS + 2
+
+    counting.items_read = 0
+    columns = packed.read_daily(counting, 'AAPL', candles[-20]['bucket_start'], None, limit=18)
+    assert columns['bucket_start'].tolist() == [c['bucket_start'] for c in candles[-20:-2]]
+    assert counting.items_read == 2 + 3
+
+
+def test_range_read_ending_inside_a_packed_month():
+    """
+    A read whose `to` falls inside a packed month queries no 1d candles after the month.
+    """
+    table = MemoryResource().add_table('stock-candles-table', 'series', 'bucket_start')
+    candles = daily_candles('AAPL', datetime.date(2024, 1, 1), 60)
+    for candle in candles:
+        table.put_item(Item=candle)
+    packed.write_months(table, 'AAPL', candles[:-5])
+
+    # 2024-02-14, mid-February
+    end = candles[32]['bucket_start']
+    for start in (None, candles[5]['bucket_start']):
+        counting = CountingTable(table)
+        columns = packed.read_daily(counting, 'AAPL', start, end, limit=100)
+        expected = query_series(table, 'AAPL#1d', start, end, 100)
+        assert columns['bucket_start'].tolist() == [int(c['bucket_start']) for c in expected]
+        # Only the packed months: a tail from after February to mid-February is no range at all
+        assert counting.queries == 1 and counting.items_read == 2
+
+
+def test_get_candles_packed_keeps_ticks():
+    """
+    Daily candles have the same shape with and without packed history: ticks only on days quotes were folded into.
+    """
+    from get_candles.app import lambda_handler as get_candles_handler
+
+    resource = MemoryResource()
+    table = resource.add_table('stock-candles-table', 'series', 'bucket_start')
+    candles = daily_candles('MSFT', datetime.date(2024, 1, 1), 30)
+    candles[-3]['ticks'] = 12
+    for candle in candles:
+        table.put_item(Item=candle)
+    packed.write_months(table, 'MSFT', candles[:-1])
+    event = {"httpMethod": "GET", "pathParameters": {"ticker": "MSFT"}, "queryStringParameters": {"res": "1d"}}
+
+    bodies = []
+    for enabled in (True, False):
+        with patch('stock_common.dynamo._backend', resource), patch('stock_common.dynamo._tables', {}), \
+                patch.object(packed, 'ENABLED', enabled):
+            bodies.append(json.loads(get_candles_handler(event, None)["body"]))
+    assert bodies[0] == bodies[1]
+    assert bodies[0]["candles"][-3]["ticks"] == 12
+    assert "ticks" not in bodies[0]["candles"][0]
@@ -0,0 +1,85 @@
+# tests/unit/test_portfolio.py
+
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+
+def stock_item(ticker, price, previous_close, sector):
+    return {"ticker": ticker, "price": Decimal(price), "previous_close": Decimal(previous_close), "sector": sector}
+
+
+@patch('portfolio_value.app.boto3.resource')
+def test_portfolio_value(mock_boto3_resource):
+    """
+    Holdings are valued from one BatchGetItem per 100 tickers, retrying unprocessed keys.
+    """
+    from portfolio_value.app import lambda_handler as portfolio_value_handler
+
+    holdings = {f"T{i}": 1 for i in range(150)}
+    holdings.update({"AAPL": 10, "MSFT": 2.5, "ZZZZ": 3})
+
+    def batch_get_item(RequestItems):
+        keys = [key["ticker"] for key in RequestItems["stocks-table"]["Keys"]]
+        items = [stock_item(t, "10", "10", "Other") for t in keys if t.startswith("T")]
+        if "AAPL" in keys:
+            # MSFT is throttled on the first request and returned on the retry
+            items.append(stock_item("AAPL", "150.00", "140.00", "Technology"))
+            return {"Responses": {"stocks-table": items},
+                    "UnprocessedKeys": {"stocks-table": {"Keys": [{"ticker": "MSFT"}]}}}
+        if "MSFT" in keys:
+            items.append(stock_item("MSFT", "400.00", "410.00", "Technology"))
+        return {"Responses": {"stocks-table": items}}
+
+    mock_boto3_resource.return_value.batch_get_item.side_effect = batch_get_item
+
+    response = portfolio_value_handler({"httpMethod": "POST", "body": json.dumps(holdings)}, None)
+
+    assert response["statusCode"] == 200
+    body = json.loads(response["body"])
+    assert mock_boto3_resource.return_value.batch_get_item.call_count == 3
+    assert body["total_value"] == 1500 + 1000 + 1500
+    assert body["daily_pnl"] == 100 - 25
+    assert body["missing"] == ["ZZZZ"]
+    assert body["sector_exposure"] == {
+        "Other": {"value": 1500, "weight": 0.375},
+        "Technology": {"value": 2500, "weight": 0.625},
+    }
+    aapl = next(p for p in body["positions"] if p["ticker"] == "AAPL")
+    assert aapl == {"ticker": "AAPL", "quantity": 10, "price": 150, "market_value": 1500,
+                    "daily_pnl": 100, "weight": 0.375, "sector": "Technology"}
+
+
+def test_portfolio_value_rejects_bad_quantities():
+    """
+    Non-numeric quantities are rejected before any table access.
+    """
+    from portfolio_value.app import lambda_handler as portfolio_value_handler
+
+    response = portfolio_value_handler({"httpMethod": "POST", "body": json.dumps({"AAPL": "ten"})}, None)
+
+    assert response["statusCode"] == 400
+
+    for quantity in ("NaN", "Infinity", "-Infinity", "1e400", "-1e400"):
+        body = '{"AAPL": %s}' % quantity
+        response = portfolio_value_handler({"httpMethod": "POST", "body": body}, None)
+        assert response["statusCode"] == 400
+
+
+@patch('portfolio_value.app.time.sleep')
+@patch('portfolio_value.app.boto3.resource')
+def test_portfolio_value_throttled(mock_boto3_resource, mock_sleep):
+    """
+    Keys left unprocessed after every retry return a 503 rather than failing the invocation.
+    """
+    from portfolio_value.app import lambda_handler as portfolio_value_handler
+
+    mock_boto3_resource.return_value.batch_get_item.return_value = {
+        "Responses": {"stocks-table": []},
+        "UnprocessedKeys": {"stocks-table": {"Keys": [{"ticker": "AAPL"}]}},
+    }
+
+    response = portfolio_value_handler({"httpMethod": "POST", "body": json.dumps({"AAPL": 1})}, None)
+
+    assert response["statusCode"] == 503
+    assert "message" in json.loads(response["body"])
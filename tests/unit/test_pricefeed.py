@@ -0,0 +1,138 @@
+# tests/unit/test_pricefeed.py
+
+import http.client
+import json
+import threading
+import time
+from decimal import Decimal
+from unittest.mock import MagicMock
+from wsgiref.simple_server import make_server
+
+from botocore.exceptions import ClientError
+
+from stock_common.pricefeed import PriceHub
+
+
+def quote(price, refreshed_at):
+    return {"ticker": "AAPL", "price": Decimal(price), "refreshed_at": refreshed_at}
+
+
+def test_slow_subscriber_gets_latest_quote_per_ticker():
+    """
+    Identical updates are dropped and unsent updates coalesce to the latest per ticker.
+    """
+    hub = PriceHub()
+    subscription = hub.subscribe(["AAPL", "MSFT"])
+
+    assert hub.publish("AAPL", quote("150.00", 1)) == 1
+    assert hub.publish("AAPL", quote("150.00", 1)) == 0
+    hub.publish("MSFT", {"ticker": "MSFT", "price": Decimal("400")})
+    hub.publish("AAPL", quote("151.00", 2))
+    hub.publish("TSLA", {"ticker": "TSLA", "price": Decimal("200")})
+
+    batch = subscription.next_batch(timeout=0)
+    assert batch == [("MSFT", {"ticker": "MSFT", "price": Decimal("400")}), ("AAPL", quote("151.00", 2))]
+    assert subscription.next_batch(timeout=0) == []
+
+    # A late subscriber starts from the latest known quote
+    assert hub.subscribe(["AAPL"]).next_batch(timeout=0) == [("AAPL", quote("151.00", 2))]
+
+    hub.unsubscribe(subscription)
+    assert hub.subscriber_count() == 1
+
+
+def test_sse_endpoint_pushes_published_quotes():
+    """
+    A client connected to /stream receives quotes published after it subscribed.
+    """
+    from stream_prices import app
+
+    server = make_server("127.0.0.1", 0, app.sse_app, server_class=app.ThreadingWSGIServer)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    try:
+        connection = http.client.HTTPConnection("127.0.0.1", server.server_port, timeout=5)
+        connection.request("GET", "/stream?tickers=aapl")
+        response = connection.getresponse()
+        assert response.status == 200
+        assert response.getheader("Content-Type") == "text/event-stream"
+        assert response.readline() == b"retry: 3000\n"
+        response.readline()
+
+        while app.hub.subscriber_count() == 0:
+            time.sleep(0.01)
+        app.hub.publish("AAPL", quote("152.50", 3))
+
+        lines = [response.readline() for _ in range(3)]
+        assert lines[0] == b"event: quote\n"
+        assert lines[1] == b"id: AAPL:3\n"
+        assert json.loads(lines[2][len(b"data: "):]) == {"ticker": "AAPL", "price": 152.5, "refreshed_at": 3}
+        connection.close()
+    finally:
+        server.shutdown()
+
+
+def stream_record(ticker, price, sequence_number):
+    return {"dynamodb": {"SequenceNumber": sequence_number,
+                         "NewImage": {"ticker": {"S": ticker}, "price": {"N": price}}}}
+
+
+def test_stream_feed_discovers_shards_across_pages():
+    """
+    Shards listed on later DescribeStream pages are read too.
+    """
+    from stream_prices.app import DynamoStreamFeed
+
+    client = MagicMock()
+    client.describe_stream.side_effect = [
+        {"StreamDescription": {"Shards": [{"ShardId": "shard-1", "SequenceNumberRange": {}}],
+                               "LastEvaluatedShardId": "shard-1"}},
+        {"StreamDescription": {"Shards": [{"ShardId": "shard-2", "SequenceNumberRange": {}}]}},
+    ]
+    client.get_shard_iterator.side_effect = lambda ShardId, **kwargs: {"ShardIterator": f"{ShardId}-it"}
+
+    feed = DynamoStreamFeed("arn:stream", price_hub=PriceHub(), client=client)
+    feed.discover_shards(initial=True)
+
+    assert feed.iterators == {"shard-1": "shard-1-it", "shard-2": "shard-2-it"}
+    assert client.describe_stream.call_args_list[1][1] == {"StreamArn": "arn:stream",
+                                                           "ExclusiveStartShardId": "shard-1"}
+
+
+def test_stream_feed_reopens_a_shard_whose_iterator_expired():
+    """
+    An expired iterator is fetched again after the last record read, without stopping the other shards.
+    """
+    from stream_prices.app import DynamoStreamFeed
+
+    hub = PriceHub()
+    subscription = hub.subscribe(["AAPL", "MSFT"])
+    client = MagicMock()
+    expired = ClientError({"Error": {"Code": "ExpiredIteratorException", "Message": "Iterator expired"}},
+                          "GetRecords")
+    records = {
+        "a-1": {"Records": [stream_record("AAPL", "150", "100")], "NextShardIterator": "a-2"},
+        "a-2": expired,
+        "b-1": {"Records": [stream_record("MSFT", "400", "200")], "NextShardIterator": "b-2"},
+        "b-2": {"Records": [], "NextShardIterator": "b-3"},
+    }
+
+    def get_records(ShardIterator):
+        response = records[ShardIterator]
+        if isinstance(response, Exception):
+            raise response
+        return response
+
+    client.get_records.side_effect = get_records
+    client.get_shard_iterator.return_value = {"ShardIterator": "a-3"}
+
+    feed = DynamoStreamFeed("arn:stream", price_hub=hub, client=client)
+    feed.iterators = {"shard-a": "a-1", "shard-b": "b-1"}
+    feed.poll()
+    feed.poll()
+
+    assert feed.iterators == {"shard-a": "a-3", "shard-b": "b-3"}
+    client.get_shard_iterator.assert_called_once_with(StreamArn="arn:stream", ShardId="shard-a",
+                                                      ShardIteratorType="AFTER_SEQUENCE_NUMBER",
+                                                      SequenceNumber="100")
+    assert [ticker for ticker, _ in subscription.next_batch(timeout=0)] == ["AAPL", "MSFT"]
@@ -0,0 +1,96 @@
+# tests/unit/test_profiling.py
+
+import json
+import pytest
+import threading
+from types import SimpleNamespace
+
+from stock_common import profiling
+
+
+@pytest.fixture()
+def profiling_config(monkeypatch):
+    """Enables profiling for every invocation"""
+    config = dict(profiling._config, sample_rate=1.0, mode='spans', output='log')
+    monkeypatch.setattr(profiling, '_config', config)
+    return config
+
+
+def test_profiling_disabled_is_free(monkeypatch):
+    """
+    With profiling disabled the handler is returned unwrapped and spans are no-ops.
+    """
+    monkeypatch.setattr(profiling, '_config', dict(profiling._config, sample_rate=0.0))
+
+    def handler(event, context):
+        return event
+
+    assert profiling.profiled(handler) is handler
+    assert profiling.span('parse') is profiling.span('serialize')
+
+
+def test_profiled_handler_logs_spans(profiling_config, capsys):
+    """
+    A sampled invocation prints a single profile log line with the recorded spans.
+    """
+    @profiling.profiled
+    def handler(event, context):
+        with profiling.span('parse'):
+            pass
+        with profiling.span('parse'):
+            pass
+        profiling.record('dynamodb.GetItem', 0.002)
+        return {'statusCode': 200}
+
+    context = SimpleNamespace(function_name='GetStockFunction', aws_request_id='req-1')
+    assert handler({}, context) == {'statusCode': 200}
+
+    line = json.loads(capsys.readouterr().out.strip())
+    profile = line['profile']
+    assert profile['function'] == 'GetStockFunction'
+    assert profile['request_id'] == 'req-1'
+    assert profile['spans']['parse']['count'] == 2
+    assert profile['spans']['dynamodb.GetItem']['total_ms'] == 2.0
+
+
+def test_cprofile_mode_writes_stats(profiling_config, tmp_path, capsys):
+    """
+    cProfile mode embeds the hottest functions and can dump pstats to a directory.
+    """
+    profiling_config.update(mode='cprofile', output='tmp', directory=str(tmp_path))
+
+    @profiling.profiled
+    def handler(event, context):
+        return sorted(range(1000), reverse=True)[0]
+
+    assert handler({}, None) == 999
+
+    profile = json.loads(capsys.readouterr().out.strip())['profile']
+    assert profile['cprofile']
+    assert profile['stats_file'].startswith(str(tmp_path))
+    assert len(list(tmp_path.iterdir())) == 1
+
+
+def test_spans_from_other_threads_are_not_recorded(profiling_config, capsys):
+    """
+    A span opened on another thread, e.g. a concurrent request on the dev server,
+    stays out of the invocation being profiled on this thread.
+    """
+    def other_request():
+        with profiling.span('other'):
+            pass
+        profiling.record('dynamodb.Query', 0.002)
+
+    @profiling.profiled
+    def handler(event, context):
+        worker = threading.Thread(target=other_request)
+        worker.start()
+        worker.join()
+        with profiling.span('parse'):
+            pass
+        return {'statusCode': 200}
+
+    assert handler({}, None) == {'statusCode': 200}
+
+    profile = json.loads(capsys.readouterr().out.strip())['profile']
+    assert list(profile['spans']) == ['parse']
@@ -0,0 +1,151 @@
+# tests/unit/test_providers.py
+
+import json
+import threading
+import time
+import urllib.parse
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from stock_common.providers import CircuitBreaker, HedgedProvider
+from stock_common.quotes import NotFoundError, QuoteError, QuoteProvider
+
+
+@pytest.fixture()
+def quote_stub():
+    """Starts local GLOBAL_QUOTE stubs; each answers with its price after state['delay'] seconds"""
+    servers = []
+
+    def start(price, delay=0.0, status=200):
+        state = {'price': price, 'delay': delay, 'status': status, 'requests': 0}
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                state['requests'] += 1
+                time.sleep(state['delay'])
+                symbol = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(self.path).query))['symbol']
+                quote = {} if symbol == 'NOPE' else {'01. symbol': symbol, '05. price': state['price']}
+                payload = json.dumps({'Global Quote': quote}).encode('utf-8')
+                self.send_response(state['status'])
+                self.send_header('Content-Length', str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return QuoteProvider(key='test', base_url=f'http://127.0.0.1:{server.server_port}/query'), state
+
+    yield start
+    for server in servers:
+        server.shutdown()
+
+
+def test_slow_primary_is_hedged(quote_stub):
+    """
+    A primary slower than the hedge delay is raced against the secondary and the first answer wins.
+    """
+    primary, _ = quote_stub('100.00', delay=1.0)
+    secondary, secondary_state = quote_stub('101.00')
+    provider = HedgedProvider(primary, secondary, deadline=2, hedge_after=0.1)
+
+    started = time.monotonic()
+    assert provider.get_quote('AAPL')['05. price'] == '101.00'
+    assert time.monotonic() - started < 0.8
+    assert secondary_state['requests'] == 1
+
+
+def test_deadline_and_timeouts_bound_latency(quote_stub):
+    """
+    Per-call timeouts and the overall deadline bound a call however slow the upstreams are.
+    """
+    slow, _ = quote_stub('100.00', delay=1.0)
+    slow.timeout = 0.2
+    with pytest.raises(QuoteError):
+        slow.get_quote('AAPL')
+
+    primary, _ = quote_stub('100.00', delay=1.0)
+    secondary, _ = quote_stub('101.00', delay=1.0)
+    provider = HedgedProvider(primary, secondary, deadline=0.4, hedge_after=0.1)
+
+    started = time.monotonic()
+    with pytest.raises(QuoteError):
+        provider.get_quote('AAPL')
+    assert time.monotonic() - started < 0.7
+
+
+def test_failing_primary_opens_circuit(quote_stub):
+    """
+    Failures fall back to the secondary and open the primary's breaker; a missing ticker is not a failure.
+    """
+    primary, primary_state = quote_stub('100.00', status=500)
+    secondary, _ = quote_stub('101.00')
+    breakers = {'primary': CircuitBreaker(failure_threshold=2), 'secondary': CircuitBreaker()}
+    provider = HedgedProvider(primary, secondary, deadline=2, breakers=breakers)
+
+    for _ in range(4):
+        assert provider.get_quote('AAPL')['05. price'] == '101.00'
+    assert primary_state['requests'] == 2
+    assert breakers['primary'].state == 'open'
+
+    with pytest.raises(NotFoundError):
+        provider.get_quote('NOPE')
+    assert breakers['secondary'].failures == 0
+
+
+def test_circuit_breaker_half_open():
+    """
+    An open breaker lets a single trial call through after the reset period.
+    """
+    now = [0.0]
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=10, clock=lambda: now[0])
+
+    breaker.record_failure()
+    assert not breaker.allow()
+
+    now[0] = 10
+    assert breaker.allow()
+    assert not breaker.allow()
+    breaker.record_failure()
+    assert breaker.state == 'open'
+
+    now[0] = 20
+    assert breaker.allow()
+    breaker.record_success()
+    assert breaker.state == 'closed' and breaker.allow()
+
+
+def test_primary_alone_keeps_breaker_and_deadline(quote_stub, monkeypatch):
+    """
+    Without a fallback configured the primary is still bounded by the deadline and skipped once its breaker opens.
+    """
+    from stock_common import providers
+
+    monkeypatch.delenv('QUOTE_FALLBACK_BASE_URL', raising=False)
+    monkeypatch.delenv('QUOTE_FALLBACK_API_KEY', raising=False)
+    provider = providers.default_provider()
+    assert isinstance(provider, HedgedProvider) and provider.secondary is None
+
+    primary, primary_state = quote_stub('100.00', delay=1.0)
+    breakers = {'primary': CircuitBreaker(failure_threshold=1), 'secondary': CircuitBreaker()}
+    provider = HedgedProvider(primary, deadline=0.3, breakers=breakers)
+
+    started = time.monotonic()
+    with pytest.raises(QuoteError):
+        provider.get_quote('AAPL')
+    assert time.monotonic() - started < 0.8
+
+    # The timed-out call finishes in the background before the primary starts failing
+    time.sleep(1.0)
+    primary_state['status'] = 500
+    primary_state['delay'] = 0.0
+    with pytest.raises(QuoteError):
+        provider.get_quote('AAPL')
+    with pytest.raises(QuoteError, match='No quote provider'):
+        provider.get_quote('AAPL')
+    assert primary_state['requests'] == 2
@@ -0,0 +1,91 @@
+# tests/unit/test_quotes.py
+
+import json
+import threading
+import urllib.parse
+from decimal import Decimal
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import pytest
+
+from stock_common.quotes import QuoteProvider, quote_to_item
+
+
+@pytest.fixture()
+def alphavantage_stub():
+    """Runs a local Alpha Vantage stub; set state['bulk'] to False to reject bulk quotes"""
+    state = {'bulk': True, 'requests': []}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            params = dict(urllib.parse.parse_qsl(urllib.parse.urlparse(self.path).query))
+            state['requests'].append(params)
+            symbols = params['symbol'].split(',')
+
+            if params['function'] == 'REALTIME_BULK_QUOTES' and state['bulk']:
+                body = {'endpoint': 'Realtime Bulk Quotes', 'data': [
+                    {'symbol': s, 'timestamp': '2024-05-14 16:00:00.000', 'close': '101.50',
+                     'volume': '2000', 'previous_close': '100.00', 'change': '1.50',
+                     'change_percent': '1.5'}
+                    for s in symbols if s != 'NOPE'
+                ]}
+            elif params['function'] == 'REALTIME_BULK_QUOTES':
+                body = {'message': 'This is a premium endpoint.', 'data': [{'symbol': 'IBM'}]}
+            elif symbols[0] == 'NOPE':
+                body = {'Global Quote': {}}
+            else:
+                body = {'Global Quote': {'01. symbol': symbols[0], '05. price': '99.00',
+                                         '06. volume': '1000', '07. latest trading day': '2024-05-14'}}
+
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}/query', state
+    server.shutdown()
+
+
+def test_bulk_quotes_use_one_call_per_batch(alphavantage_stub):
+    """
+    Tickers are fetched 100 per call and mapped to the same items as GLOBAL_QUOTE.
+    """
+    base_url, state = alphavantage_stub
+    provider = QuoteProvider(key='test', base_url=base_url)
+    tickers = [f'T{i}' for i in range(150)] + ['NOPE']
+
+    quotes = provider.get_quotes(tickers)
+
+    assert len(state['requests']) == 2
+    assert all(r['function'] == 'REALTIME_BULK_QUOTES' for r in state['requests'])
+    assert len(quotes) == 150 and 'NOPE' not in quotes
+    assert quote_to_item('T0', quotes['T0']) == {
+        'ticker': 'T0', 'price': Decimal('101.50'), 'volume': Decimal('2000'),
+        'latest_trading_day': '2024-05-14', 'previous_close': Decimal('100.00'),
+        'change': Decimal('1.50'), 'change_percent': '1.5%'
+    }
+
+
+def test_falls_back_to_global_quote_without_bulk_access(alphavantage_stub):
+    """
+    A key without bulk access falls back to per-symbol calls and stops probing.
+    """
+    base_url, state = alphavantage_stub
+    state['bulk'] = False
+    provider = QuoteProvider(key='test', base_url=base_url)
+
+    quotes = provider.get_quotes(['AAPL', 'MSFT', 'NOPE'])
+    assert sorted(quotes) == ['AAPL', 'MSFT']
+    assert quote_to_item('AAPL', quotes['AAPL'])['price'] == Decimal('99.00')
+
+    provider.get_quotes(['AAPL', 'MSFT'])
+    functions = [r['function'] for r in state['requests']]
+    assert functions == ['REALTIME_BULK_QUOTES'] + ['GLOBAL_QUOTE'] * 5
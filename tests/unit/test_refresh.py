@@ -0,0 +1,170 @@
+# tests/unit/test_refresh.py
+
+import time
+from collections import deque
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+
+from devtools.server import load_template, memory_backend
+from stock_common import dynamo
+from stock_common.providers import HedgedProvider
+from stock_common.quotes import CallRateLimiter, QuoteProvider
+
+
+class FakeProvider:
+    """Quote provider stand-in that records the shards it was asked for"""
+
+    def __init__(self, bulk):
+        self.bulk = bulk
+        self.shards = []
+
+    def get_quotes(self, tickers, deadline=None):
+        self.shards.append(list(tickers))
+        return {t: {'05. price': '10.00'} for t in tickers if t != 'GONE'}
+
+
+def test_prioritize_by_reads_times_staleness():
+    """
+    Hot stale tickers come first; recently refreshed tickers are skipped.
+    """
+    from refresh_stocks.app import prioritize
+
+    now = 1_000_000
+    candidates = [
+        {'ticker': 'COLD', 'refreshed_at': Decimal(now - 3600), 'read_count': Decimal(0)},
+        {'ticker': 'HOT', 'refreshed_at': Decimal(now - 3600), 'read_count': Decimal(50)},
+        {'ticker': 'FRESH', 'refreshed_at': Decimal(now - 10), 'read_count': Decimal(500)},
+        {'ticker': 'WARM', 'refreshed_at': Decimal(now - 1800), 'read_count': Decimal(20)},
+        {'ticker': 'NEW'},
+    ]
+
+    assert prioritize(candidates, now) == ['NEW', 'HOT', 'WARM', 'COLD']
+
+
+@patch('refresh_stocks.app.boto3.resource')
+def test_refresh_run_shards_by_priority(mock_boto3_resource):
+    """
+    The scheduled run refreshes shards in priority order and reports failures.
+    """
+    from refresh_stocks import app
+
+    mock_table = MagicMock()
+    mock_table.update_item.return_value = {}
+    # Delta-sync sequence numbers and read counts have their own tables
+    sequence_table = MagicMock()
+    sequence_table.update_item.return_value = {'Attributes': {'value': Decimal(1)}}
+    counts_table = MagicMock()
+    tables = {'stock-sequence-table': sequence_table, 'stock-read-counts-table': counts_table}
+    mock_boto3_resource.return_value.Table.side_effect = lambda name: tables.get(name, mock_table)
+    now = time.time()
+    mock_table.scan.return_value = {'Items': [
+        {'ticker': f'T{i}', 'refreshed_at': Decimal(int(now) - 3600)} for i in range(5)
+    ] + [{'ticker': 'GONE'}]}
+    counts_table.scan.return_value = {'Items': [{'ticker': f'T{i}', 'read_count': Decimal(i)} for i in range(5)]}
+    provider = FakeProvider(bulk=True)
+
+    with patch.object(app, 'quote_provider', provider), patch.object(app, 'SHARD_SIZE', 2), \
+            patch.object(app, 'WORKERS', 1):
+        result = app.lambda_handler({}, None)
+
+    assert provider.shards == [['GONE', 'T4'], ['T3', 'T2'], ['T1', 'T0']]
+    assert result == {'considered': 6, 'selected': 6, 'updated': 5, 'failed': ['GONE'], 'deferred': 0}
+    assert mock_table.update_item.call_count == 5
+    # The reads each refresh served come off the counts; T0 had none
+    subtracted = {c[1]['Key']['ticker']: c[1]['ExpressionAttributeValues'][':count']
+                  for c in counts_table.update_item.call_args_list}
+    assert subtracted == {'T4': -4, 'T3': -3, 'T2': -2, 'T1': -1}
+
+
+class ProbedProvider(FakeProvider):
+    """Provider whose key turns out to have no bulk access"""
+
+    def get_quotes(self, tickers, deadline=None):
+        if len(tickers) > 1:
+            self.bulk = False
+        return super().get_quotes(tickers, deadline)
+
+
+@patch('refresh_stocks.app.boto3.resource')
+def test_refresh_run_probes_bulk_before_sharding(mock_boto3_resource):
+    """
+    Bulk access is probed with a two-ticker shard; without it the rest go one ticker at a time.
+    """
+    from refresh_stocks import app
+
+    mock_table = MagicMock()
+    mock_table.update_item.return_value = {'Attributes': {'value': Decimal(1)}}
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+    mock_table.scan.side_effect = lambda **kwargs: {'Items': [
+        {'ticker': f'T{i}', 'refreshed_at': Decimal(0)} for i in range(5)
+    ] if 'refreshed_at' in kwargs['ProjectionExpression'] else []}
+    provider = ProbedProvider(bulk=None)
+
+    with patch.object(app, 'quote_provider', provider), patch.object(app, 'WORKERS', 1):
+        result = app.lambda_handler({}, None)
+
+    assert provider.shards == [['T0', 'T1'], ['T2'], ['T3'], ['T4']]
+    assert result['updated'] == 5
+
+
+def test_rate_limiter_refuses_slots_past_the_deadline():
+    """
+    A slot after the deadline is refused without being reserved, so it stays free for callers with time left.
+    """
+    limiter = CallRateLimiter(60)
+
+    assert limiter.acquire() == 0
+    reserved = limiter.next_at
+    assert limiter.acquire(deadline=time.monotonic() + 0.1) is None
+    assert limiter.next_at == reserved
+
+
+@patch('stock_common.quotes.urllib.request.urlopen')
+@patch('refresh_stocks.app.boto3.resource')
+def test_refresh_run_requeues_when_the_next_slot_is_past_the_deadline(mock_boto3_resource, mock_urlopen):
+    """
+    A worker whose next Alpha Vantage slot lands after the run's deadline requeues the shard and stops instead of sleeping.
+    """
+    from refresh_stocks import app
+
+    limiter = CallRateLimiter(1)
+    limiter.next_at = time.monotonic() + 60
+    provider = HedgedProvider(QuoteProvider(key='test', bulk=False, limiter=limiter), deadline=None, hedge=False)
+    run = app.RefreshRun(deque(['T1', 'T2']), time.monotonic() + 1)
+
+    started = time.monotonic()
+    with patch.object(app, 'quote_provider', provider):
+        run.work()
+
+    assert time.monotonic() - started < 1
+    assert list(run.queue) == ['T1', 'T2']
+    assert run.stopped.is_set() and not run.failed
+    mock_urlopen.assert_not_called()
+
+
+def test_reads_are_counted_off_the_stocks_table():
+    """
+    get_stock counts reads of found stocks in the container and flushes them to the read-counts table.
+    """
+    from get_stock import app
+    from stock_common.readcounts import ReadCounter, load_read_counts
+
+    backend = memory_backend(load_template())
+    stocks = backend.Table('stocks-table')
+    stocks.put_item(Item={'ticker': 'AAPL', 'price': Decimal('150')})
+    clock = [0.0]
+    event = {'httpMethod': 'GET', 'pathParameters': {'ticker': 'AAPL'}}
+
+    dynamo.use_backend(backend)
+    try:
+        with patch.object(app, 'read_counter', ReadCounter(flush_seconds=60, clock=lambda: clock[0])), \
+                patch.object(stocks, 'update_item', side_effect=AssertionError('stock written')):
+            assert app.lambda_handler(event, None)['statusCode'] == 200
+            assert app.lambda_handler(dict(event, pathParameters={'ticker': 'NOPE'}), None)['statusCode'] == 404
+            assert load_read_counts(None) == {}
+
+            clock[0] = 61
+            assert app.lambda_handler(event, None)['statusCode'] == 200
+        assert load_read_counts(None) == {'AAPL': 2}
+    finally:
+        dynamo.use_backend(None)
@@ -0,0 +1,45 @@
+# tests/unit/test_replay.py
+
+import json
+import random
+
+from devtools.replay import api_event_routes, arrivals, load_events, replay
+from devtools.server import load_template
+
+
+def test_arrival_processes():
+    """
+    Constant, bursty and Poisson schedules average the requested rate; recorded keeps the original gaps.
+    """
+    assert arrivals("constant", 4, rate=2) == [0, 0.5, 1.0, 1.5]
+    assert arrivals("bursty", 6, rate=10, burst_size=3) == [0, 0, 0, 0.3, 0.3, 0.3]
+
+    poisson = arrivals("poisson", 2001, rate=100, rng=random.Random(1))
+    assert poisson == arrivals("poisson", 2001, rate=100, rng=random.Random(1))
+    assert 18 < poisson[-1] < 22
+
+    events = [{"requestContext": {"requestTimeEpoch": epoch}} for epoch in (1000, 1500, 4000)]
+    assert arrivals("recorded", 3, events=events, speed=2) == [0, 0.25, 1.5]
+
+
+def test_replay_reports_per_route(tmp_path):
+    """
+    Sample events are completed from the template and every replayed request is reported under its route.
+    """
+    events = load_events("events/event.json", api_event_routes(load_template()))
+    create = next(e for e in events if e.get("body"))
+    assert (create["resource"], create["httpMethod"], create["path"]) == ("/stock", "POST", "/stock")
+
+    capture = tmp_path / "capture.ndjson"
+    capture.write_text("\n".join(json.dumps(e) for e in events[:3]) + "\n")
+    assert load_events(str(capture)) == events[:3]
+
+    def target(event):
+        return 500 if event["httpMethod"] == "DELETE" else 200
+
+    report = replay(target, events, arrivals("constant", len(events), rate=1000), concurrency=2)
+
+    assert report["requests"] == len(events)
+    assert report["routes"]["DELETE /stock/{ticker}"]["errors"] == 1
+    assert report["routes"]["PUT /stock/{ticker}"]["requests"] == 2
+    assert report["routes"]["GET /stock/list"]["status"] == {"200": 1}
@@ -0,0 +1,149 @@
+# tests/unit/test_resultcache.py
+
+import json
+from decimal import Decimal
+from unittest.mock import patch
+
+import boto3
+
+from devtools.server import load_template, memory_backend
+from stock_common import changes, dynamo
+from stock_common.resultcache import ResultCache, SharedCache
+
+
+class Clock:
+
+    def __init__(self):
+        self.now = 1_000_000.0
+
+    def __call__(self):
+        return self.now
+
+
+def compare_event(ticker1, ticker2):
+    return {"httpMethod": "GET", "queryStringParameters": {"ticker1": ticker1, "ticker2": ticker2}}
+
+
+def put_stock(table, ticker, price):
+    table.put_item(Item=dict(changes.stamp(boto3.resource), ticker=ticker, price=Decimal(price),
+                             latest_trading_day='2024-05-01'))
+
+
+def test_compare_results_are_cached_by_version():
+    """
+    Repeated compares skip computation while versions match, and skip the stock reads once settled.
+    """
+    from compare_stocks import app
+
+    backend = memory_backend(load_template())
+    stocks = backend.Table("stocks-table")
+    reads = []
+    get_item = stocks.get_item
+    stocks.get_item = lambda **kwargs: reads.append(kwargs["Key"]["ticker"]) or get_item(**kwargs)
+
+    clock = Clock()
+    cache = ResultCache("compare_stocks.cache", settle_seconds=5, clock=clock)
+    dynamo.use_backend(backend)
+    try:
+        put_stock(stocks, "AAPL", "190.5")
+        put_stock(stocks, "TSLA", "175.25")
+
+        with patch.object(app, "result_cache", cache), patch.object(app, "sequence", changes.CachedSeq(1, clock)), \
+                patch.object(app, "compare_stocks", wraps=app.compare_stocks) as compare:
+            first = app.lambda_handler(compare_event("AAPL", "TSLA"), None)["body"]
+            assert json.loads(first)["comparisons"]["price"] == "AAPL has higher price"
+
+            # Same versions: served from the cache, but read until the write sequence has settled
+            assert app.lambda_handler(compare_event("AAPL", "TSLA"), None)["body"] == first
+            clock.now += 6
+            assert app.lambda_handler(compare_event("AAPL", "TSLA"), None)["body"] == first
+            assert compare.call_count == 1 and len(reads) == 6
+
+            # Settled: no reads at all, in either order
+            assert app.lambda_handler(compare_event("AAPL", "TSLA"), None)["body"] == first
+            reverse = json.loads(app.lambda_handler(compare_event("TSLA", "AAPL"), None)["body"])
+            assert reverse["stock1"]["ticker"] == "TSLA" and reverse["comparisons"]["price"] == "AAPL has higher price"
+            assert len(reads) == 6
+
+            # A quote update moves the sequence and changes TSLA's version, seen once the
+            # counter read in the container expires
+            put_stock(stocks, "TSLA", "200")
+            assert app.lambda_handler(compare_event("AAPL", "TSLA"), None)["body"] == first
+            clock.now += 1
+            body = json.loads(app.lambda_handler(compare_event("AAPL", "TSLA"), None)["body"])
+            assert body["comparisons"]["price"] == "TSLA has higher price"
+            assert compare.call_count == 2 and len(reads) == 8
+    finally:
+        dynamo.use_backend(None)
+
+
+def test_shared_cache_serves_other_containers():
+    """
+    A settled result written to the shared table is served to a container that has not computed it.
+    """
+    backend = memory_backend(load_template())
+    clock = Clock()
+    dynamo.use_backend(backend)
+    try:
+        shared = SharedCache(boto3.resource, "stock-compare-cache-table")
+        writer = ResultCache("test.cache", shared=shared, settle_seconds=5, clock=clock)
+        writer.store("AAPL,TSLA", ["1", "2"], 2, ["body", ""])
+        clock.now += 6
+        assert writer.validate("AAPL,TSLA", ["1", "2"], 2) == ["body", ""]
+
+        reader = ResultCache("test.cache", shared=shared, clock=clock)
+        assert reader.lookup("AAPL,TSLA", 2) == ["body", ""]
+        assert reader.lookup("AAPL,TSLA", 3) is None
+        assert reader.validate("AAPL,TSLA", ["1", "3"], 3) is None
+    finally:
+        dynamo.use_backend(None)
+
+
+def test_shared_cache_read_once_per_request():
+    """
+    A key missing from both caches costs one shared read for the lookup and validate of a request.
+    """
+    backend = memory_backend(load_template())
+    dynamo.use_backend(backend)
+    try:
+        shared = SharedCache(boto3.resource, "stock-compare-cache-table")
+        cache = ResultCache("test.cache", shared=shared)
+        with patch.object(shared, "get", wraps=shared.get) as shared_get:
+            assert cache.lookup("AAPL,TSLA", 1) is None
+            assert cache.validate("AAPL,TSLA", ["1", "2"], 1) is None
+            assert shared_get.call_count == 1
+
+            # The next request asks the shared table again
+            assert cache.lookup("AAPL,TSLA", 1) is None
+            assert shared_get.call_count == 2
+    finally:
+        dynamo.use_backend(None)
+
+
+def test_cached_seq_ttl():
+    """
+    The sequence counter is read once per TTL.
+    """
+    clock = Clock()
+    sequence = changes.CachedSeq(1, clock)
+    with patch.object(changes, "current_seq", side_effect=[4, 5]) as current_seq:
+        assert sequence.get(None) == 4
+        clock.now += 0.5
+        assert sequence.get(None) == 4
+        clock.now += 0.5
+        assert sequence.get(None) == 5
+    assert current_seq.call_count == 2
+
+
+def test_lru_eviction():
+    """
+    The least recently used entry is evicted first.
+    """
+    cache = ResultCache("test.cache", maxsize=2, settle_seconds=0)
+    for key in ("a", "b"):
+        cache.store(key, ["v"], 1, [key])
+    assert cache.validate("a", ["v"], 1) == ["a"]
+    cache.store("c", ["v"], 1, ["c"])
+
+    assert cache.validate("b", ["v"], 1) is None
+    assert cache.lookup("a", 1) == ["a"] and cache.validate("c", ["v"], 1) == ["c"]
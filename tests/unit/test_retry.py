@@ -0,0 +1,99 @@
+# tests/unit/test_retry.py
+
+import json
+import threading
+import boto3
+import pytest
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+from stock_common import retry
+
+THROTTLED = {
+    "__type": "com.amazonaws.dynamodb.v20120810#ProvisionedThroughputExceededException",
+    "message": "The level of configured provisioned throughput for the table was exceeded."
+}
+
+
+@pytest.fixture()
+def dynamodb_stub():
+    """Runs a local DynamoDB stub that throttles the first `throttles` requests"""
+    state = {'throttles': 2, 'requests': 0}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_POST(self):
+            self.rfile.read(int(self.headers['Content-Length']))
+            state['requests'] += 1
+            if state['requests'] <= state['throttles']:
+                status, body = 400, THROTTLED
+            else:
+                status, body = 200, {
+                    "Item": {"ticker": {"S": "AAPL"}},
+                    "ConsumedCapacity": {"TableName": "stocks-table", "CapacityUnits": 0.5}
+                }
+            payload = json.dumps(body).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/x-amz-json-1.0')
+            self.send_header('Content-Length', str(len(payload)))
+            self.end_headers()
+            self.wfile.write(payload)
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(('127.0.0.1', 0), Handler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f'http://127.0.0.1:{server.server_port}', state
+    server.shutdown()
+
+
+def make_client(endpoint_url, policy):
+    client = boto3.client('dynamodb', region_name='us-east-1', endpoint_url=endpoint_url,
+                          aws_access_key_id='testing', aws_secret_access_key='testing',
+                          config=retry.CLIENT_CONFIG)
+    return policy.install(client)
+
+
+def test_throttled_calls_are_retried_with_backoff(dynamodb_stub):
+    """
+    ProvisionedThroughputExceededException is retried until the call succeeds.
+    """
+    endpoint_url, state = dynamodb_stub
+    policy = retry.RetryPolicy(backoff=retry.Backoff(base_delay=0.001, max_delay=0.01))
+    client = make_client(endpoint_url, policy)
+
+    response = client.get_item(TableName='stocks-table', Key={'ticker': {'S': 'AAPL'}})
+
+    assert response['Item'] == {'ticker': {'S': 'AAPL'}}
+    assert response['ResponseMetadata']['RetryAttempts'] == 2
+    assert state['requests'] == 3
+    # Each throttle halved the adaptive rate before the success nudged it back up
+    assert policy.limiter.rate == pytest.approx(10.0 / 4 + policy.limiter.increase)
+
+
+def test_retry_budget_limits_retries(dynamodb_stub):
+    """
+    Once the retry budget is spent, throttles surface to the caller.
+    """
+    endpoint_url, state = dynamodb_stub
+    policy = retry.RetryPolicy(
+        backoff=retry.Backoff(base_delay=0.001, max_delay=0.01),
+        budget=retry.RetryBudget(ratio=0.0, initial=1.0)
+    )
+    client = make_client(endpoint_url, policy)
+
+    with pytest.raises(client.exceptions.ProvisionedThroughputExceededException):
+        client.get_item(TableName='stocks-table', Key={'ticker': {'S': 'AAPL'}})
+    assert state['requests'] == 2
+
+
+def test_non_retryable_errors_fail_fast():
+    """
+    Validation errors are not retried, and delays respect the backoff cap.
+    """
+    policy = retry.RetryPolicy(backoff=retry.Backoff(base_delay=0.05, max_delay=0.2))
+
+    assert policy.next_delay(1, 'ValidationException') is None
+    assert policy.next_delay(1, 'ConditionalCheckFailedException') is None
+    assert all(0 <= policy.backoff.delay(attempt) <= 0.2 for attempt in range(10))
+    assert policy.next_delay(policy.backoff.max_attempts, 'ThrottlingException') is None
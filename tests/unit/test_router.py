@@ -0,0 +1,71 @@
+# tests/unit/test_router.py
+
+import json
+import pytest
+from unittest.mock import patch, MagicMock
+
+from router.app import lambda_handler as router_handler
+
+TEST_STOCK_AAPL = {
+    "ticker": "AAPL",
+    "company_name": "Apple Inc.",
+    "exchange": "NASDAQ",
+    "sector": "Technology"
+}
+
+
+@pytest.fixture()
+def mock_table():
+    """Patches boto3.resource for every handler behind the router"""
+    with patch('boto3.resource') as mock_boto3_resource:
+        table = MagicMock()
+        mock_boto3_resource.return_value.Table.return_value = table
+        table.resource_factory = mock_boto3_resource
+        yield table
+
+
+def test_router_dispatches_on_resource_and_method(mock_table):
+    """
+    The router hands API Gateway events to the matching per-function handler.
+    """
+    mock_table.get_item.return_value = {"Item": TEST_STOCK_AAPL}
+    mock_table.scan.return_value = {"Items": [TEST_STOCK_AAPL]}
+
+    response = router_handler({
+        "resource": "/stock/{ticker}",
+        "path": "/stock/AAPL",
+        "httpMethod": "GET",
+        "pathParameters": {"ticker": "AAPL"}
+    }, None)
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"])["ticker"] == "AAPL"
+
+    response = router_handler({"resource": "/stock/list", "path": "/stock/list", "httpMethod": "GET"}, None)
+    assert response["statusCode"] == 200
+    assert json.loads(response["body"]) == [TEST_STOCK_AAPL]
+
+    # Both routes share the same warm DynamoDB resource
+    mock_table.resource_factory.assert_called_once()
+
+
+def test_router_matches_proxy_paths(mock_table):
+    """
+    Events from a {proxy+} resource are routed on their path with path parameters filled in.
+    """
+    mock_client = mock_table.resource_factory.return_value.meta.client
+    mock_client.transact_write_items.return_value = {}
+
+    response = router_handler({"resource": "/{proxy+}", "path": "/stock/TSLA", "httpMethod": "DELETE"}, None)
+
+    assert response["statusCode"] == 200
+    delete = mock_client.transact_write_items.call_args.kwargs["TransactItems"][0]["Delete"]
+    assert delete["Key"] == {"ticker": {"S": "TSLA"}}
+    assert delete["ConditionExpression"] == "attribute_exists(ticker)"
+
+
+def test_router_rejects_unknown_routes(mock_table):
+    """
+    Unknown paths are 404s and unsupported methods on known resources are 405s.
+    """
+    assert router_handler({"resource": "/{proxy+}", "path": "/portfolio", "httpMethod": "GET"}, None)["statusCode"] == 404
+    assert router_handler({"resource": "/stock/list", "path": "/stock/list", "httpMethod": "POST"}, None)["statusCode"] == 405
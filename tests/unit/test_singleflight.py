@@ -0,0 +1,146 @@
+# tests/unit/test_singleflight.py
+
+import json
+import threading
+import time
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+
+from botocore.exceptions import ClientError
+
+from devtools.memory_table import MemoryTable
+from stock_common.singleflight import SingleFlight, DynamoLease
+
+CONDITIONAL_CHECK_FAILED = ClientError(
+    {'Error': {'Code': 'ConditionalCheckFailedException', 'Message': 'The conditional request failed'}},
+    'UpdateItem'
+)
+
+
+def test_single_flight_shares_one_call():
+    """
+    Concurrent callers for the same key share the leader's single call.
+    """
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def fetch(ticker):
+        calls.append(ticker)
+        started.set()
+        release.wait(5)
+        return {'ticker': ticker}
+
+    leader = threading.Thread(target=lambda: results.append(flight.do('AAPL', fetch, 'AAPL')))
+    leader.start()
+    started.wait(5)
+
+    followers = [threading.Thread(target=lambda: results.append(flight.do('AAPL', fetch, 'AAPL')))
+                 for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    release.set()
+    for thread in [leader] + followers:
+        thread.join(5)
+
+    assert calls == ['AAPL']
+    assert len(results) == 4
+    assert sorted(shared for _, shared in results) == [False, True, True, True]
+    assert all(result == {'ticker': 'AAPL'} for result, _ in results)
+
+
+def test_lease_waits_for_holder_write():
+    """
+    A refresher that loses the lease waits, with backoff, until the holder gives it back.
+    """
+    table = MagicMock()
+    table.put_item.side_effect = CONDITIONAL_CHECK_FAILED
+    table.get_item.side_effect = [
+        {'Item': {'ticker': 'AAPL', 'refresh_lease_until': Decimal('9999999999')}},
+        {},
+    ]
+
+    lease = DynamoLease(table, {'ticker': 'AAPL'}, poll_interval=0)
+
+    assert lease.acquire() is False
+    assert lease.wait_for_holder() is True
+    assert table.get_item.call_count == 2
+
+
+def test_lost_lease_records_holder_start():
+    """
+    A failed acquire learns when the holder took the lease from the conditional put itself.
+    """
+    table = MemoryTable('stock-refresh-lease-table', 'ticker')
+    holder = DynamoLease(table, {'ticker': 'AAPL'}, duration=10.0)
+    waiter = DynamoLease(table, {'ticker': 'AAPL'}, duration=10.0)
+
+    assert holder.acquire() is True
+    assert waiter.acquire() is False
+    assert abs(waiter.acquired_at - holder.acquired_at) < 0.01
+
+
+def test_lease_polls_are_bounded():
+    """
+    A waiter gives up after max_polls reads of a lease that is still held.
+    """
+    table = MagicMock()
+    table.get_item.return_value = {'Item': {'ticker': 'AAPL', 'refresh_lease_until': Decimal('9999999999')}}
+
+    lease = DynamoLease(table, {'ticker': 'AAPL'}, duration=1e9, poll_interval=0, max_polls=3)
+
+    assert lease.wait_for_holder() is False
+    assert table.get_item.call_count == 3
+
+
+@patch('update_stock.app.boto3.resource')
+def test_update_stock_coalesces_with_lease_holder(mock_boto3_resource):
+    """
+    update_stock skips the upstream fetch and write when another container holds the lease.
+    """
+    from update_stock import app
+
+    stocks, leases = MagicMock(), MagicMock()
+    mock_boto3_resource.return_value.Table.side_effect = lambda name: leases if name == app.LEASE_TABLE else stocks
+    leases.put_item.side_effect = CONDITIONAL_CHECK_FAILED
+    leases.get_item.side_effect = [
+        {'Item': {'ticker': 'AAPL', 'refresh_lease_until': Decimal(str(time.time() + 5))}},
+        {},
+    ]
+    stocks.get_item.return_value = {'Item': {'ticker': 'AAPL', 'price': Decimal('150.00'),
+                                             'refreshed_at': Decimal(int(time.time()) + 1)}}
+
+    with patch.object(app, 'LEASE_SECONDS', 10.0), \
+            patch.object(app.quote_provider, 'get_quote', side_effect=AssertionError('fetched')):
+        response = app.lambda_handler({'httpMethod': 'PUT', 'pathParameters': {'ticker': 'AAPL'}}, None)
+
+    assert response['statusCode'] == 200
+    assert json.loads(response['body'])['stock']['price'] == 150
+    # Neither the lease holder's item nor the stock was written
+    stocks.update_item.assert_not_called()
+    leases.delete_item.assert_not_called()
+
+
+@patch('update_stock.app.boto3.resource')
+def test_update_stock_refreshes_when_holder_is_already_gone(mock_boto3_resource):
+    """
+    A holder that releases before the first poll leaves no lease start, so the waiter refreshes itself.
+    """
+    from update_stock import app
+
+    stocks, leases = MagicMock(), MagicMock()
+    mock_boto3_resource.return_value.Table.side_effect = lambda name: leases if name == app.LEASE_TABLE else stocks
+    leases.put_item.side_effect = CONDITIONAL_CHECK_FAILED
+    leases.get_item.return_value = {}
+    quote = {'price': '151.00'}
+
+    with patch.object(app, 'LEASE_SECONDS', 10.0), \
+            patch.object(app.quote_provider, 'get_quote', return_value=quote) as get_quote, \
+            patch.object(app, 'update_stock_in_db', return_value={'ticker': 'AAPL'}) as update:
+        assert app.refresh_stock('AAPL') == {'ticker': 'AAPL'}
+
+    get_quote.assert_called_once_with('AAPL')
+    update.assert_called_once_with('AAPL', quote)
+    stocks.get_item.assert_not_called()
@@ -0,0 +1,52 @@
+# tests/unit/test_snapshot.py
+
+import csv
+import gzip
+import io
+import json
+from decimal import Decimal
+from unittest.mock import patch, MagicMock
+
+from stock_common import mmapsnap
+
+SEGMENT_ITEMS = {
+    0: [{"ticker": "TSLA", "sector": "Automotive", "price": Decimal("800.5"), "volume": Decimal("2500000")}],
+    1: [{"ticker": "AAPL", "sector": "Technology", "price": Decimal("150"), "volume": Decimal("1000000"),
+         "refresh_lease_owner": "abc", "sync_partition": "stocks", "updated_seq": Decimal("7"),
+         "updated_at": Decimal("1700000000")}],
+}
+
+
+@patch('export_snapshot.app.boto3.resource')
+def test_export_snapshot_writes_csv_and_manifest(mock_boto3_resource, tmp_path):
+    """
+    Test the snapshot job scans every segment and writes a typed CSV snapshot with its manifest.
+    """
+    from export_snapshot.app import lambda_handler as export_snapshot_handler
+
+    mock_table = MagicMock()
+    mock_boto3_resource.return_value.Table.return_value = mock_table
+    mock_table.scan.side_effect = lambda Segment, TotalSegments, **kwargs: {"Items": SEGMENT_ITEMS[Segment]}
+
+    manifest = export_snapshot_handler({"destination": str(tmp_path), "format": "csv", "segments": 2}, None)
+
+    assert manifest["rows"] == 2
+    assert manifest["format"] == "csv"
+    assert manifest["schema"][0] == {"name": "ticker", "type": "string"}
+    assert {"name": "volume", "type": "int64"} in manifest["schema"]
+    assert json.loads((tmp_path / "manifest.json").read_text()) == manifest
+
+    with gzip.open(tmp_path / manifest["snapshot"], "rt", newline="") as snapshot:
+        rows = list(csv.reader(snapshot))
+    assert rows[0] == ["ticker:string", "sector:string", "price:double", "volume:int64"]
+    assert rows[1] == ["AAPL", "Technology", "150.0", "1000000"]
+    assert rows[2] == ["TSLA", "Automotive", "800.5", "2500000"]
+
+    # The read snapshot answers like a table scan, so it keeps the sync bookkeeping
+    read_snapshot = mmapsnap.StockSnapshot(str(tmp_path / mmapsnap.SNAPSHOT_NAME))
+    assert read_snapshot.get("AAPL")["updated_seq"] == 7
+    assert "refresh_lease_owner" not in read_snapshot.get("AAPL")
+
+    # The schema hash only depends on the columns and their types
+    second = export_snapshot_handler({"destination": str(tmp_path), "format": "csv", "segments": 2}, None)
+    assert second["schema_hash"] == manifest["schema_hash"]
@@ -1,13 +1,36 @@
 import json
 import boto3
 import os
-import urllib.request
 from decimal import Decimal
+from functools import partial
 from botocore.exceptions import ClientError
+from stock_common import aio, alerts, changes
+from stock_common.dynamo import get_table
+from stock_common.metrics import metered, put as put_metric
+from stock_common.profiling import profiled
+from stock_common.providers import default_provider
+from stock_common.quotes import store_quote
+from stock_common.singleflight import LEASE_TABLE, DynamoLease, SingleFlight
+
+# Seconds a refresher may hold the cross-container refresh lease on a ticker
+LEASE_SECONDS = float(os.environ.get('REFRESH_LEASE_SECONDS', '10'))
+
+# Concurrent refreshes of the same ticker within this container share one fetch
+refresh_flight = SingleFlight()
+
+# Remembers across invocations whether the API key can use bulk quotes;
+# hedged with the fallback provider when one is configured
+quote_provider = default_provider()
 
 # Update a stock's data based on the latest information from Alpha Vantage API
+@profiled
+@metered
 def lambda_handler(event, context):
 
+    # Direct invocations may refresh many tickers at once: {"tickers": ["AAPL", "MSFT"]}
+    if 'tickers' in event:
+        return refresh_stocks(event['tickers'])
+
     # Validate the incoming event
     if 'pathParameters' not in event or event['httpMethod'] != 'PUT':
         return {
@@ -22,9 +45,15 @@ def lambda_handler(event, context):
             'body': json.dumps({'message': 'Bad Request: Missing stock ticker in path parameters'})
         }
 
-    # Fetch the latest stock data from Alpha Vantage API
+    # Refresh the stock, joining any refresh of the same ticker already in flight
     try:
-        stock_data = get_latest_stock_data(ticker)
+        item, shared = refresh_flight.do(ticker, refresh_stock, ticker)
+    except ClientError as e:
+        print(e.response['Error']['Message'])
+        return {
+            'statusCode': 500,
+            'body': json.dumps({'message': 'Error updating stock data in DynamoDB', 'error': e.response['Error']['Message']})
+        }
     except Exception as e:
         print(f"Error fetching data for ticker {ticker}: {str(e)}")
         return {
@@ -32,87 +61,86 @@ def lambda_handler(event, context):
             'body': json.dumps({'message': 'Error fetching data from Alpha Vantage API', 'error': str(e)})
         }
 
-    # Update the stock data in DynamoDB
-    try:
-        response = update_stock_in_db(ticker, stock_data)
-    except ClientError as e:
-        print(e.response['Error']['Message'])
-        return {
-            'statusCode': 500,
-            'body': json.dumps({'message': 'Error updating stock data in DynamoDB', 'error': e.response['Error']['Message']})
-        }
+    if shared:
+        put_metric('update_stock.refresh', 'Coalesced', 1)
 
     return {
         'statusCode': 200,
-        'body': json.dumps({'message': 'Stock data was updated successfully in the database'})
+        'body': json.dumps({
+            'message': 'Stock data was updated successfully in the database',
+            'stock': item
+        }, default=handle_decimal_type)
     }
 
-# Fetch the latest stock data from Alpha Vantage API
-def get_latest_stock_data(ticker):
+# Fetch and store the latest quote, unless another container is already doing so
+def refresh_stock(ticker):
 
-    # Get the Alpha Vantage API key from environment variables
-    api_key = os.environ.get('ALPHAVANTAGE_API_KEY')
-    if not api_key:
-        raise Exception('Alpha Vantage API key is not set in environment variables')
+    table = get_table(boto3.resource)
+    lease = DynamoLease(get_table(boto3.resource, LEASE_TABLE), {'ticker': ticker}, duration=LEASE_SECONDS)
 
-    # Build the Alpha Vantage API URL
-    url = f'https://www.alphavantage.co/query?function=GLOBAL_QUOTE&symbol={ticker}&apikey={api_key}'
+    # Another refresher holds the lease: return the value it wrote
+    if not lease.acquire():
+        # Without the holder's lease start no write can be attributed to it
+        if lease.wait_for_holder() and lease.acquired_at is not None:
+            item = table.get_item(Key={'ticker': ticker}, ConsistentRead=True).get('Item')
+            # Only a write made under the holder's lease counts; it may have given up instead
+            if item is not None and item.get('refreshed_at', 0) >= int(lease.acquired_at):
+                put_metric('update_stock.refresh', 'Coalesced', 1)
+                return item
+        # The holder's lease lapsed or ended without a write, so refresh without one
+        lease = None
 
-    # Fetch data from the Alpha Vantage API
     try:
-        with urllib.request.urlopen(url) as response:
-            if response.status != 200:
-                raise Exception(f'HTTP Error {response.status}')
-            data = response.read().decode('utf-8')
-    except urllib.error.HTTPError as e:
-        raise Exception(f'HTTP Error: {e.code} {e.reason}')
-    except urllib.error.URLError as e:
-        raise Exception(f'URL Error: {e.reason}')
+        stock_data = get_latest_stock_data(ticker)
+        return update_stock_in_db(ticker, stock_data)
+    finally:
+        if lease is not None:
+            lease.release()
+
+# Fetch the latest stock data from Alpha Vantage API
+def get_latest_stock_data(ticker):
+    return quote_provider.get_quote(ticker)
 
-    # Parse the JSON response
-    data_json = json.loads(data)
+# Refresh many tickers using as few Alpha Vantage calls as the API key allows
+def refresh_stocks(tickers):
 
-    # Check for API call frequency limit exceeded
-    if 'Note' in data_json:
-        raise Exception('API call frequency exceeded. Please wait a minute and try again.')
+    quotes = quote_provider.get_quotes(tickers)
 
-    # Extract the 'Global Quote' data
-    if 'Global Quote' not in data_json or not data_json['Global Quote']:
-        raise Exception('Invalid response from Alpha Vantage API or stock ticker not found')
+    updated = []
+    failed = [ticker for ticker in dict.fromkeys(tickers) if ticker not in quotes]
+    found = [ticker for ticker in dict.fromkeys(tickers) if ticker in quotes]
 
-    stock_data = data_json['Global Quote']
+    # The writes are independent, so they go out together
+    results = aio.gather(*(partial(update_stock_in_db, ticker, quotes[ticker]) for ticker in found),
+                         return_exceptions=True)
+    for ticker, result in zip(found, results):
+        if isinstance(result, ClientError):
+            print(result.response['Error']['Message'])
+            failed.append(ticker)
+        elif isinstance(result, Exception):
+            raise result
+        else:
+            updated.append(ticker)
 
-    return stock_data
+    return {'updated': updated, 'failed': failed}
 
 # Update the stock data in DynamoDB
 def update_stock_in_db(ticker, stock_data):
 
-    dynamodb = boto3.resource('dynamodb')
-    table = dynamodb.Table('stocks-table')  # Replace with your actual table name
-
-    # Map the Alpha Vantage data to DynamoDB item attributes
-    item = {
-        'ticker': ticker,
-        'price': stock_data.get('05. price'),
-        'volume': stock_data.get('06. volume'),
-        'latest_trading_day': stock_data.get('07. latest trading day'),
-        'previous_close': stock_data.get('08. previous close'),
-        'change': stock_data.get('09. change'),
-        'change_percent': stock_data.get('10. change percent'),
-        # Add other fields as needed
-    }
+    table = get_table(boto3.resource)
 
-    # Remove any None values from the item
-    item = {k: v for k, v in item.items() if v is not None}
+    previous, item = store_quote(table, ticker, stock_data, changes.stamp(boto3.resource))
 
-    # Convert numeric string values to Decimal
-    numeric_fields = ['price', 'volume', 'previous_close', 'change']
-    for key in numeric_fields:
-        if key in item and item[key]:
-            # Convert string to Decimal
-            item[key] = Decimal(item[key])
+    # Fire any price alerts this write crossed
+    alerts.evaluate_write(boto3.resource, previous, item)
 
-    # Update the item in DynamoDB
-    response = table.put_item(Item=item)
+    return item
 
-    return response
\ No newline at end of file
+# Handle Decimal types for JSON serialization
+def handle_decimal_type(obj):
+    if isinstance(obj, Decimal):
+        if obj % 1 == 0:
+            return int(obj)
+        else:
+            return float(obj)
+    raise TypeError
\ No newline at end of file